@@ -1,15 +1,128 @@
-from flask import Flask, request, jsonify
-from nlp.ollama_runner import run_tinyllama_json
-from nlp.regex_parser import regex_parse
+import os
+import threading
+import time
+
+from flask import Flask, Response, g, request, jsonify
+from nlp import metrics
+from nlp.admission import deadline_after, get_gate
+from nlp.bookings import execute
+from nlp.cache import get_cache
+from nlp.capture import get_capture
+from nlp.normalize import get_zone
+from nlp.ollama_client import get_client
+from nlp.pipeline import batch_concurrency, flatten, flatten_item, parse_batch, parse_utterance
+from nlp.router import backend_health
+from nlp.skeleton_cache import get_skeleton_cache
+from nlp.warmup import Warmup, warmup_from_env
 
 
 app = Flask(__name__)
+APP_CREATED = time.perf_counter()
+
+BATCH_MAX_ITEMS = int(os.environ.get("PARSE_BATCH_MAX_ITEMS", "1000"))
+# PARSE_CAPTURE_PATH: log /parse traffic for bench.replay (see nlp.capture)
+CAPTURED = ("/parse", "/parse/batch")
+
+_warmup: Warmup | None = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup() -> Warmup:
+    """
+    Loads the models in the background; /healthz stays 503 until they answer.
+    Started by the first request (or `__main__`), not at import, so tests,
+    tooling and workers imported before a fork send no model calls.
+    """
+    global _warmup
+    if _warmup is None:
+        with _warmup_lock:
+            if _warmup is None:
+                _warmup = warmup_from_env(get_client(), imported=APP_CREATED).start()
+    return _warmup
+
+
+def _timezone(data: dict) -> str | None:
+    """Optional "timezone" (IANA name) relative dates resolve in; ValueError if unknown."""
+    tz = data.get("timezone")
+    if tz is not None and not isinstance(tz, str):
+        raise ValueError("timezone must be a string")
+    get_zone(tz)
+    return tz
+
+
+def _deadline(data: dict) -> float:
+    """Client time budget: "timeout_ms" in the body, else the X-Request-Timeout-Ms header."""
+    return deadline_after(data.get("timeout_ms", request.headers.get("X-Request-Timeout-Ms")))
+
+
+@app.before_request
+def _start_timer():
+    get_warmup()
+    g.t0 = time.perf_counter()
+    g.endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_INFLIGHT.inc(endpoint=g.endpoint)
+
+
+@app.teardown_request
+def _record_request(exc=None):
+    if "t0" in g:
+        metrics.HTTP_INFLIGHT.dec(endpoint=g.endpoint)
+        elapsed = time.perf_counter() - g.t0
+        metrics.HTTP_SECONDS.observe(elapsed, endpoint=g.endpoint)
+        if g.endpoint == "/parse":
+            get_warmup().observe_request(elapsed)
+
+
+@app.after_request
+def _count_status(response):
+    if "endpoint" in g:
+        metrics.HTTP_REQUESTS.inc(endpoint=g.endpoint, status=response.status_code)
+        capture = get_capture()
+        if capture is not None and g.endpoint in CAPTURED:
+            capture.record(g.endpoint, request.get_json(silent=True), response.get_data(),
+                           response.status_code, time.perf_counter() - g.t0)
+    return response
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of nlp.metrics.REGISTRY."""
+    metrics.export_cache_stats(get_cache())
+    metrics.export_skeleton_stats(get_skeleton_cache())
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/healthz")
 def health_check():
-    """Simple health endpoint."""
-    return jsonify({"status": "ok"}), 200
+    """
+    Simple health endpoint, with model-gate state, per-replica state when
+    OLLAMA_HOSTS routes over several servers, result-cache counters and
+    skeleton-cache counters with the busiest skeletons, and traffic-capture
+    counters when PARSE_CAPTURE_PATH is set.
+    "degraded" means no replica is currently healthy. Answers 503 with
+    status "warming" until the startup warm-up has loaded the models;
+    "startup" carries the warm-up state and startup timings.
+    """
+    warmup = get_warmup()
+    body = {"status": "ok", "model_gate": get_gate().snapshot(), "startup": warmup.snapshot()}
+    backend = backend_health(get_client())
+    if backend is not None:
+        body["backend"] = backend
+        if not backend["healthy"]:
+            body["status"] = "degraded"
+    cache = get_cache()
+    if cache is not None:
+        body["cache"] = cache.snapshot()
+    skeletons = get_skeleton_cache()
+    if skeletons is not None:
+        body["skeleton_cache"] = skeletons.snapshot()
+    capture = get_capture()
+    if capture is not None:
+        body["capture"] = capture.snapshot()
+    if not warmup.ready:
+        body["status"] = "warming"
+        return jsonify(body), 503
+    return jsonify(body), 200
 
 
 @app.post("/parse")
@@ -18,8 +131,19 @@ def parse_text():
     POST /parse
     {
       "utterance": "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed",
-      "model": "room-nlu"  # optional, defaults to room-nlu
+      "model": "room-nlu",  # optional, defaults to room-nlu
+      "force_model": false, # optional, skip the regex bypass
+      "timeout_ms": 5000,   # optional, or the X-Request-Timeout-Ms header
+      "timezone": "Asia/Kolkata",  # optional, for "today"; default PARSE_TIMEZONE
+      "execute": false      # optional, run param_json against the booking index
     }
+
+    Returns the extracted fields plus "tier" ("regex", "learned", "cache", "skeleton" or "model"), the
+    regex "confidence" that decided it, and "param_json" with the date and
+    times normalized. With "execute", "execution" holds the booking index's
+    answer (see nlp.bookings.execute). If the model queue is full or the
+    timeout runs out first, the regex answer comes back with "degraded": true
+    and "degraded_reason" ("queue_full" or "deadline").
     """
     data = request.get_json(silent=True) or {}
     utterance = (data.get("utterance") or "").strip()
@@ -27,13 +151,69 @@ def parse_text():
 
     if not utterance:
         return jsonify({"error": "utterance is required"}), 400
+    try:
+        deadline = _deadline(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout_ms must be a positive number"}), 400
+    try:
+        tz = _timezone(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        result = run_tinyllama_json(utterance, model_name=model)
-        return jsonify(result), 200
+        out = parse_utterance(utterance, model_name=model, force_model=bool(data.get("force_model")),
+                              deadline=deadline)
+        body = flatten(out, tz)
+        if data.get("execute") and "param_json" in body:
+            body["execution"] = execute(body["param_json"])
+        return jsonify(body), 200
     except Exception as e:
         return jsonify({"error": f"{type(e).__name__}: {e}"}), 500
 
 
+@app.post("/parse/batch")
+def parse_batch_text():
+    """
+    POST /parse/batch
+    {
+      "utterances": ["Reserve SJT 315 11 Sept 14:00 to 16:00", "..."],
+      "model": "room-nlu",   # optional
+      "concurrency": 4,      # optional, capped at PARSE_BATCH_CONCURRENCY
+      "timeout_ms": 30000,   # optional, for the whole batch
+      "timezone": "UTC"      # optional
+    }
+
+    Returns {"results": [...]} in input order; each item is shaped like a
+    /parse response, or {"error": ...} if that utterance failed.
+    """
+    data = request.get_json(silent=True) or {}
+    utterances = data.get("utterances")
+    model = data.get("model", "room-nlu")
+
+    if not isinstance(utterances, list) or not all(isinstance(u, str) for u in utterances):
+        return jsonify({"error": "utterances must be a list of strings"}), 400
+    if len(utterances) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"at most {BATCH_MAX_ITEMS} utterances per batch"}), 413
+
+    limit = batch_concurrency()
+    try:
+        workers = max(1, min(int(data.get("concurrency") or limit), limit))
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    try:
+        deadline = _deadline(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout_ms must be a positive number"}), 400
+    try:
+        tz = _timezone(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = parse_batch(utterances, model_name=model, max_workers=workers,
+                          force_model=bool(data.get("force_model")), deadline=deadline)
+    return jsonify({"results": [flatten_item(r, tz) for r in results]}), 200
+
+
 if __name__ == "__main__":
+    get_warmup()
     app.run(host="127.0.0.1", port=8000, debug=False)
@@ -0,0 +1,224 @@
+"""
+asyncio (ASGI) variant of the parse API: same /parse and /healthz contract
+as api.app, but each request awaits the model instead of holding a worker.
+
+    uvicorn api.asgi:app --host 127.0.0.1 --port 8000
+
+Model warm-up starts with the lifespan startup (see nlp.warmup); /healthz
+answers 503 "warming" until it is done. With PARSE_CAPTURE_PATH set, /parse
+traffic is logged for bench.replay (see nlp.capture). On shutdown new requests get 503 while in-flight ones are drained for up to
+ASGI_DRAIN_TIMEOUT seconds (default 30).
+"""
+import asyncio
+import json
+import os
+import time
+
+from nlp import metrics
+from nlp.admission import deadline_after
+from nlp.async_pipeline import AsyncParser
+from nlp.bookings import execute
+from nlp.cache import get_cache
+from nlp.capture import TrafficCapture, get_capture
+from nlp.normalize import get_zone
+from nlp.pipeline import flatten
+from nlp.router import backend_health
+from nlp.skeleton_cache import get_skeleton_cache
+from nlp.warmup import Warmup, warmup_from_env
+
+DRAIN_TIMEOUT = float(os.environ.get("ASGI_DRAIN_TIMEOUT", "30"))
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ParseApp:
+    def __init__(self):
+        self.parser: AsyncParser | None = None
+        self.warmup: Warmup | None = None
+        self.capture: TrafficCapture | None = None
+        self.inflight = 0
+        self.draining = False
+        self._idle: asyncio.Event | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    # -------------------
+    # Lifespan: startup / graceful shutdown
+    # -------------------
+    async def _startup(self) -> None:
+        if self.parser is None:
+            self.parser = AsyncParser()
+            self.warmup = warmup_from_env(self.parser.client).start()
+            self.capture = get_capture()
+            self._idle = asyncio.Event()
+            self._idle.set()
+
+    async def _shutdown(self) -> None:
+        self.draining = True
+        if self.warmup is not None:
+            self.warmup.stop()
+        if self._idle is not None:
+            try:
+                await asyncio.wait_for(self._idle.wait(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        if self.parser is not None:
+            await self.parser.close()
+        if self.capture is not None:
+            self.capture.close()
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self._startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self._shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # -------------------
+    # HTTP
+    # -------------------
+    async def _http(self, scope, receive, send) -> None:
+        await self._startup()  # servers without lifespan support
+        method, path = scope["method"], scope["path"]
+        if path == "/metrics" and method == "GET":
+            metrics.export_cache_stats(get_cache())
+            metrics.export_skeleton_stats(get_skeleton_cache())
+            await _send_text(send, 200, metrics.REGISTRY.render(), metrics.CONTENT_TYPE)
+            return
+        endpoint = path if path in ("/healthz", "/parse") else "unmatched"
+        t0 = time.perf_counter()
+        metrics.HTTP_INFLIGHT.inc(endpoint=endpoint)
+        try:
+            status, body = await self._route(method, path, receive, scope)
+        finally:
+            metrics.HTTP_INFLIGHT.dec(endpoint=endpoint)
+        elapsed = time.perf_counter() - t0
+        metrics.HTTP_SECONDS.observe(elapsed, endpoint=endpoint)
+        if endpoint == "/parse":
+            self.warmup.observe_request(elapsed)
+            if self.capture is not None and "nlu.request" in scope:
+                self.capture.record(endpoint, scope["nlu.request"], body, status, elapsed)
+        metrics.HTTP_REQUESTS.inc(endpoint=endpoint, status=status)
+        await _send_json(send, status, body)
+
+    async def _route(self, method: str, path: str, receive, scope: dict) -> tuple[int, dict]:
+        if path == "/healthz" and method == "GET":
+            status, body = self.health_check()
+        elif path == "/parse" and method == "POST":
+            if self.draining:
+                status, body = 503, {"error": "server is shutting down"}
+            else:
+                self.inflight += 1
+                self._idle.clear()
+                try:
+                    data = await _read_json(receive)
+                    if data is None:
+                        status, body = 413, {"error": f"request body over {MAX_BODY_BYTES} bytes"}
+                    else:
+                        scope["nlu.request"] = data
+                        status, body = await self.parse_text(data, _headers(scope))
+                finally:
+                    self.inflight -= 1
+                    if self.inflight == 0:
+                        self._idle.set()
+        else:
+            status, body = 404, {"error": "not found"}
+        return status, body
+
+    def health_check(self) -> tuple[int, dict]:
+        body = {
+            "status": "draining" if self.draining else "ok",
+            "inflight": self.inflight,
+            "singleflight": {**self.parser.flights.stats, "active": len(self.parser.flights)},
+            "model_gate": self.parser.gate.snapshot(),
+            "startup": self.warmup.snapshot(),
+        }
+        backend = backend_health(self.parser.client)
+        if backend is not None:
+            body["backend"] = backend
+            if not backend["healthy"] and not self.draining:
+                body["status"] = "degraded"
+        cache = get_cache()
+        if cache is not None:
+            body["cache"] = cache.snapshot()
+        skeletons = get_skeleton_cache()
+        if skeletons is not None:
+            body["skeleton_cache"] = skeletons.snapshot()
+        if self.capture is not None:
+            body["capture"] = self.capture.snapshot()
+        if not self.warmup.ready and not self.draining:
+            body["status"] = "warming"
+        return (503 if self.draining or not self.warmup.ready else 200), body
+
+    async def parse_text(self, data: dict, headers: dict | None = None) -> tuple[int, dict]:
+        """Mirrors api.app.parse_text."""
+        utterance = (data.get("utterance") or "").strip()
+        model = data.get("model", "room-nlu")
+        if not utterance:
+            return 400, {"error": "utterance is required"}
+        try:
+            deadline = deadline_after(data.get("timeout_ms", (headers or {}).get("x-request-timeout-ms")))
+        except (TypeError, ValueError):
+            return 400, {"error": "timeout_ms must be a positive number"}
+        tz = data.get("timezone")
+        try:
+            if tz is not None and not isinstance(tz, str):
+                raise ValueError("timezone must be a string")
+            get_zone(tz)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        try:
+            out = await self.parser.parse(utterance, model_name=model,
+                                          force_model=bool(data.get("force_model")), deadline=deadline)
+            body = flatten(out, tz)
+            if data.get("execute") and "param_json" in body:
+                body["execution"] = execute(body["param_json"])
+            return 200, body
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+
+def _headers(scope: dict) -> dict:
+    return {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+
+async def _read_json(receive) -> dict | None:
+    """The request body as a JSON object ({} if it is not one); None when over MAX_BODY_BYTES."""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            return None
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def _send_json(send, status: int, obj: dict) -> None:
+    await _send_text(send, status, json.dumps(obj, ensure_ascii=False), "application/json")
+
+
+async def _send_text(send, status: int, text: str, content_type: str) -> None:
+    body = text.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()),
+                    (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+app = ParseApp()
@@ -0,0 +1,107 @@
+"""
+`BookingIndex` at scale: bulk load, point conflict checks, free-room sweeps,
+book and cancel, with a linear scan over the same bookings as the baseline.
+
+    python -m bench.booking_bench --bookings 1000000 --rooms 2000 --days 90
+
+Bookings are random non-overlapping slots between 08:00 and 20:00 on
+30-minute boundaries. Answers from the index are checked against the scan
+before anything is timed.
+"""
+import argparse
+import json
+import random
+import time
+
+from bench.stats import latency_summary
+from nlp.bookings import BookingIndex
+
+SLOT = 30
+DAY_START, DAY_END = 8 * 60, 20 * 60
+
+
+def generate(n: int, rooms: list[str], dates: list[str], rng: random.Random) -> list[tuple]:
+    """About `n` non-overlapping (room, date, start, end) bookings."""
+    per_day = max(1, round(n / (len(rooms) * len(dates))))
+    slots = (DAY_END - DAY_START) // SLOT
+    rows = []
+    for date in dates:
+        for room in rooms:
+            taken = sorted(rng.sample(range(slots), min(slots, per_day * 2)))[::2]
+            for s in taken:
+                start = DAY_START + s * SLOT
+                rows.append((room, date, start, start + SLOT * rng.randint(1, 2)))
+                if len(rows) >= n:
+                    return rows
+    return rows
+
+
+def scan_free_rooms(rows: list[tuple], rooms: list[str], date: str, s: int, e: int) -> list[str]:
+    busy = {room for room, d, bs, be in rows if d == date and bs < e and s < be}
+    return [r for r in rooms if r not in busy]
+
+
+def _time(fn, args: list[tuple]) -> list[float]:
+    samples = []
+    for a in args:
+        t0 = time.perf_counter()
+        fn(*a)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--bookings", type=int, default=1_000_000)
+    ap.add_argument("--rooms", type=int, default=2000)
+    ap.add_argument("--days", type=int, default=90)
+    ap.add_argument("-n", type=int, default=2000, help="queries per operation")
+    ap.add_argument("--scan-queries", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    rooms = [f"room-{i}" for i in range(args.rooms)]
+    dates = [f"2025-{1 + d // 28:02d}-{1 + d % 28:02d}" for d in range(args.days)]
+    rows = generate(args.bookings, rooms, dates, rng)
+
+    index = BookingIndex(rooms)
+    t0 = time.perf_counter()
+    skipped = index.bulk_load(rows)
+    load_s = time.perf_counter() - t0
+
+    def window():
+        s = DAY_START + rng.randrange((DAY_END - DAY_START) // SLOT) * SLOT
+        return s, s + SLOT * rng.randint(1, 4)
+
+    point = [(rng.choice(rooms), rng.choice(dates), *window()) for _ in range(args.n)]
+    sweeps = [(rng.choice(dates), *window()) for _ in range(max(1, args.n // 20))]
+
+    # correctness against the scan before timing
+    for date, s, e in sweeps[:args.scan_queries]:
+        assert index.free_rooms(date, s, e) == scan_free_rooms(rows, rooms, date, s, e)
+
+    report = {
+        "bookings": len(index), "skipped": skipped, "rooms": args.rooms, "dates": args.days,
+        "bulk_load_s": round(load_s, 3),
+        "is_free": latency_summary(_time(index.is_free, point), 1e6, "us"),
+        "conflicts": latency_summary(_time(index.conflicts, point), 1e6, "us"),
+        "free_rooms": latency_summary(_time(index.free_rooms, sweeps), 1e3, "ms"),
+        "scan_free_rooms": latency_summary(
+            _time(lambda *a: scan_free_rooms(rows, rooms, *a), sweeps[:args.scan_queries]), 1e3, "ms"),
+    }
+
+    booked, book_samples = [], []
+    for room, date, s, e in point:
+        t0 = time.perf_counter()
+        if index.is_free(room, date, s, e):
+            booked.append(index.book(room, date, s, e))
+        book_samples.append(time.perf_counter() - t0)
+    report["check_and_book"] = latency_summary(book_samples, 1e6, "us")
+    report["cancel"] = latency_summary(_time(index.cancel, [(b,) for b in booked]), 1e6, "us")
+    report["cancelled"] = len(booked)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare per-call latency of the model transports against a stand-in server.
+
+    python -m bench.client_latency -n 200
+
+Paths measured:
+  pooled      shared OllamaClient, keep-alive connections (what /parse uses)
+  fresh       new TCP connection per call (pool_size=0)
+  subprocess  one child process per call, like the old `ollama run` path.
+              Without --ollama this spawns a Python child that makes the same
+              HTTP call, i.e. process start + connect + request.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from bench.fake_ollama import serve, server_url
+from bench.stats import latency_summary
+from nlp.ollama_client import OllamaClient
+from nlp.prompt import build_prompt
+
+_CHILD = """
+import json, sys, urllib.request
+req = urllib.request.Request(sys.argv[1] + "/api/generate", data=sys.stdin.buffer.read(),
+                             headers={"Content-Type": "application/json"})
+sys.stdout.write(json.loads(urllib.request.urlopen(req).read())["response"])
+"""
+
+
+def summarize(name: str, samples: list[float]) -> dict:
+    return {"path": name, **latency_summary(samples)}
+
+
+def time_calls(fn, n: int) -> list[float]:
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=100)
+    ap.add_argument("--latency", type=float, default=0.0, help="stand-in model latency (s)")
+    ap.add_argument("--model", default="room-nlu")
+    ap.add_argument("--ollama", action="store_true",
+                    help="subprocess path runs the real `ollama run` CLI (needs a real server)")
+    args = ap.parse_args()
+
+    server = serve(latency=args.latency)
+    url = server_url(server)
+    prompt = build_prompt("Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed")
+
+    pooled = OllamaClient(url, pool_size=4)
+    fresh = OllamaClient(url, pool_size=0)
+    payload = json.dumps({"model": args.model, "prompt": prompt, "stream": False}).encode()
+
+    def run_subprocess():
+        if args.ollama:
+            subprocess.run(["ollama", "run", args.model], input=prompt.encode(),
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        else:
+            subprocess.run([sys.executable, "-c", _CHILD, url], input=payload,
+                           stdout=subprocess.PIPE, check=True)
+
+    pooled.generate(prompt, args.model)  # open the first connection outside the timing
+    results = [
+        summarize("pooled", time_calls(lambda: pooled.generate(prompt, args.model), args.n)),
+        summarize("fresh", time_calls(lambda: fresh.generate(prompt, args.model), args.n)),
+        summarize("subprocess", time_calls(run_subprocess, max(1, args.n // 10))),
+    ]
+    for r in results:
+        print(json.dumps(r))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold-start costs: module import time, and the first model call with and
+without the startup warm-up, against a stand-in that takes --load-time to
+load the model.
+
+    python -m bench.cold_start --load-time 2.0
+
+Imports are timed in fresh interpreters (best of --runs), so they include
+everything each entry point pulls in but not the interpreter itself.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from bench.fake_ollama import serve, server_url
+from nlp.ollama_client import OllamaClient
+from nlp.ollama_runner import run_tinyllama_json
+from nlp.warmup import Warmup
+
+MODULES = ("nlp.run_tinyllama", "nlp.pipeline", "nlp.bulk_parse", "api.asgi")
+UTTERANCE = "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed"
+
+
+def import_seconds(module: str, runs: int) -> float | None:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None  # optional dependency missing here
+        took = float(proc.stdout)
+        best = took if best is None else min(best, took)
+    return round(best, 4)
+
+
+def first_calls(load_time: float, warm: bool) -> dict:
+    server = serve(load_time=load_time)
+    client = OllamaClient(server_url(server))
+    report = {"warmup": warm}
+    if warm:
+        w = Warmup(client, ["room-nlu"], retry=0.1).start()
+        w.wait()
+        report["warmup_seconds"] = w.timings["warmup_seconds"]
+    for name in ("first_call_seconds", "second_call_seconds"):
+        t0 = time.perf_counter()
+        run_tinyllama_json(UTTERANCE, client=client)
+        report[name] = round(time.perf_counter() - t0, 4)
+    report["model_loads"] = server.loads
+    client.close()
+    server.shutdown()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--load-time", type=float, default=2.0)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    report = {
+        "import_seconds": {m: import_seconds(m, args.runs) for m in MODULES},
+        "first_request": [first_calls(args.load_time, warm) for warm in (False, True)],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
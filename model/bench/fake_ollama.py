@@ -0,0 +1,244 @@
+"""
+Local stand-in for the Ollama server.
+
+Implements just enough of the REST API (`/api/generate`, streaming or not,
+`/api/version`, `/api/tags`) to drive the parse path without a model. With
+--load-time the first call for a model, and the first after its keep_alive
+ran out, pays that long to "load" it; a call with an empty prompt only loads.
+
+    python -m bench.fake_ollama --port 11555 --latency 0.05 \\
+        --token-delay 0.02 --junk " Sure! Let me explain each field..."
+    OLLAMA_HOST=http://127.0.0.1:11555 python -m api.app
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = '{"intent":"book","room":"SJT 315","date":"11 Sept","start":"14:00","end":"16:00"}'
+
+# Rough stand-in for model tokens: words, punctuation runs and whitespace.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]+|\s+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text)
+
+
+def _as_kv(answer: str) -> str:
+    fields = json.loads(answer)
+    return "\n".join(f"{k.replace('_', ' ').title()}: {v}" for k, v in fields.items())
+
+
+# Output shapes TinyLlama produces in practice, rendered from the JSON answer.
+SHAPES = {
+    "clean": lambda a: a,
+    "fenced": lambda a: f"```json\n{a}\n```",
+    "chatter": lambda a: f"Sure! Here is the extracted JSON:\n{a}\nLet me know if you need anything else.",
+    "kv": _as_kv,
+    "garbage": lambda a: "I'm sorry, I can only help with room bookings.",
+}
+
+
+def keep_alive_seconds(value) -> float:
+    """Ollama keep_alive (seconds, or "30s" / "5m" / "1h") in seconds; negative is forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        m = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", str(value).strip())
+        seconds = float(m[1]) * {"": 1, "s": 1, "m": 60, "h": 3600}[m[2]] if m else 300.0
+    return float("inf") if seconds < 0 else seconds
+
+
+def parse_shapes(spec: str) -> dict[str, float]:
+    """'clean=0.6,fenced=0.2,kv=0.2' -> weights (bare names weigh 1)."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, w = part.partition("=")
+        if name not in SHAPES:
+            raise ValueError(f"unknown shape {name!r}; choose from {sorted(SHAPES)}")
+        weights[name] = float(w or 1)
+    return weights
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, obj: dict, status: int = 200) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            version = "0.6.0-fake" if self.server.config["structured"] else "0.0.0-fake"
+            self._send_json({"version": version})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": "room-nlu:latest"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+        req = self._read_json()
+        cfg = self.server.config
+        with self.server.lock:
+            self.server.calls += 1
+            failing = self.server.rng.random() < cfg["fail_rate"]
+        if failing:
+            time.sleep(cfg["latency"])
+            self._send_json({"error": "simulated failure"}, 503)
+            return
+        load = self._load(req)
+        if not req.get("prompt"):
+            self._send_json({"model": req.get("model", ""), "response": "", "done": True,
+                             "done_reason": "load", "load_duration": int(load * 1e9)})
+            return
+        text = cfg["response"]
+        schema = req.get("format")
+        if isinstance(schema, dict):
+            if not cfg["structured"]:
+                self._send_json({"error": "invalid format: expected \"json\""}, 400)
+                return
+            # constrained decoding: exactly the schema's keys, no prose
+            props = schema.get("properties", {})
+            tokens = tokenize(json.dumps({k: v for k, v in json.loads(text).items() if k in props}))
+        else:
+            if cfg["shapes"]:
+                with self.server.lock:
+                    shape = self.server.rng.choices(list(cfg["shapes"]), weights=list(cfg["shapes"].values()))[0]
+                text = SHAPES[shape](text)
+            tokens = tokenize(text + cfg["junk"])
+        time.sleep(cfg["latency"])  # prefill
+        if req.get("stream", True):
+            self._stream(req, tokens, cfg["token_delay"], load)
+            return
+        time.sleep(cfg["token_delay"] * len(tokens))
+        self._send_json({
+            "model": req.get("model", ""),
+            "response": "".join(tokens),
+            "done": True,
+            "eval_count": len(tokens),
+            "load_duration": int(load * 1e9),
+        })
+
+    def _load(self, req: dict) -> float:
+        """Pay `load_time` unless the model is resident; every call renews its keep_alive."""
+        model = req.get("model", "")
+        now = time.monotonic()
+        with self.server.lock:
+            cold = self.server.loaded.get(model, 0.0) <= now
+            self.server.loaded[model] = now + keep_alive_seconds(req.get("keep_alive"))
+            self.server.loads += cold
+        load = self.server.config["load_time"] if cold else 0.0
+        time.sleep(load)
+        return load
+
+    def _write_chunk(self, obj: dict) -> None:
+        data = json.dumps(obj).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _stream(self, req: dict, tokens: list[str], token_delay: float, load: float = 0.0) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        model = req.get("model", "")
+        n = 0
+        try:
+            for n, tok in enumerate(tokens, start=1):
+                time.sleep(token_delay)
+                self._write_chunk({"model": model, "response": tok, "done": False})
+            self._write_chunk({"model": model, "response": "", "done": True, "eval_count": len(tokens),
+                               "load_duration": int(load * 1e9)})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # client hung up early: count how many tokens we were spared
+            with self.server.lock:
+                self.server.aborted += 1
+                self.server.tokens_saved += len(tokens) - n
+            self.close_connection = True
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+          response: str = DEFAULT_RESPONSE, token_delay: float = 0.0,
+          junk: str = "", shapes: dict[str, float] | None = None,
+          seed: int = 0, structured: bool = False, fail_rate: float = 0.0,
+          load_time: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Start a stand-in server on a background thread; `port=0` picks a free port.
+    `latency` is paid once per call, `token_delay` per token, and `junk` is
+    appended after `response` to mimic a model that keeps chatting. `shapes`
+    (see SHAPES) re-renders `response` per call by weighted random choice.
+    With `structured` the server reports a version that takes a JSON schema
+    as `format` and honours it; otherwise such a request gets a 400.
+    `fail_rate` is the share of generate calls answered with a 503.
+    `load_time` is paid by a call that finds its model unloaded.
+    """
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.config = {"latency": latency, "response": response,
+                     "token_delay": token_delay, "junk": junk, "shapes": shapes or {},
+                     "structured": structured, "fail_rate": fail_rate,
+                     "load_time": load_time}
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.calls = 0
+    server.aborted = 0
+    server.tokens_saved = 0
+    server.loaded = {}  # model -> monotonic time its keep_alive runs out
+    server.loads = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11555)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per generate call")
+    ap.add_argument("--response", default=DEFAULT_RESPONSE)
+    ap.add_argument("--token-delay", type=float, default=0.0, help="seconds per generated token")
+    ap.add_argument("--tokens-per-sec", type=float, default=None, help="alternative to --token-delay")
+    ap.add_argument("--junk", default="", help="text the model 'keeps chatting' after the JSON")
+    ap.add_argument("--shapes", default="", help=f"weighted mix of {','.join(SHAPES)}, e.g. clean=3,kv=1")
+    ap.add_argument("--structured", action="store_true", help="accept a JSON schema as `format`")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of generate calls that get a 503")
+    ap.add_argument("--load-time", type=float, default=0.0, help="seconds to load an unloaded model")
+    args = ap.parse_args()
+    token_delay = 1.0 / args.tokens_per_sec if args.tokens_per_sec else args.token_delay
+    server = serve(args.host, args.port, args.latency, args.response, token_delay, args.junk,
+                   parse_shapes(args.shapes), structured=args.structured,
+                   fail_rate=args.fail_rate, load_time=args.load_time)
+    print(f"fake ollama listening on {server_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
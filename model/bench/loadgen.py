@@ -0,0 +1,110 @@
+"""
+Closed-loop load generator for a running parse API.
+
+    python -m bench.loadgen --url http://127.0.0.1:8000 \\
+        --concurrency 1,4,16 --requests 400 --mix mixed
+
+Each of `concurrency` workers keeps one keep-alive connection and sends
+/parse requests back to back until `--requests` have been sent for the
+level. Reports latency percentiles, throughput, errors and tier counts.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from bench.stats import latency_summary
+
+# Regex-confident utterances and ones that need the model.
+REGEX_MIX = [
+    "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed",
+    "Book TT 101 tomorrow 4 to 6 pm",
+    "Is LH-204 free next Friday 2pm to 3:30pm?",
+    "Cancel BK-2021",
+]
+MODEL_MIX = [
+    "grab a room in SJT for the afternoon",
+    "Cancel booking BK-2021",
+    "need somewhere for 10 people on monday morning",
+    "can I get the seminar hall after lunch",
+]
+MIXES = {"regex": REGEX_MIX, "model": MODEL_MIX, "mixed": REGEX_MIX + MODEL_MIX}
+
+
+def run_level(url: str, concurrency: int, requests: int, utterances: list[str],
+              force_model: bool = False, timeout: float = 120.0) -> dict:
+    parts = urlsplit(url)
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    tiers: Counter = Counter()
+
+    def worker():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        while True:
+            i = next(counter)
+            if i >= requests:
+                break
+            body = json.dumps({"utterance": utterances[i % len(utterances)],
+                               "force_model": force_model})
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", "/parse", body=body, headers={"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                data = resp.read()
+                status = resp.status
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+                status, data = "conn_error", b""
+            elapsed = time.perf_counter() - t0
+            tier = None
+            if status == 200:
+                try:
+                    tier = json.loads(data).get("tier")
+                except ValueError:
+                    pass
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] += 1
+                if tier:
+                    tiers[tier] += 1
+        conn.close()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    return {
+        "concurrency": concurrency,
+        **latency_summary(latencies),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "errors": sum(v for k, v in statuses.items() if k != "200"),
+        "statuses": dict(statuses),
+        "tiers": dict(tiers),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    ap.add_argument("--requests", type=int, default=400, help="requests per level")
+    ap.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    ap.add_argument("--force-model", action="store_true")
+    args = ap.parse_args()
+    for level in (int(c) for c in args.concurrency.split(",")):
+        print(json.dumps(run_level(args.url, level, args.requests, MIXES[args.mix], args.force_model)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Microbenchmark: legacy regex path vs the shared precompiled engine.
+
+    python -m bench.regex_bench -n 20000
+
+"legacy" is the pre-engine code path: `regex_parse` with inline pattern
+strings and one lowercase scan per intent keyword, then `prefer_explicit`
+re-scanning the utterance. "engine" extracts spans once and reuses them for
+both; "parse_many" is the bulk API. Outputs are checked for equality first.
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from nlp.regex_parser import extract_spans, parse_many, prefer_explicit, regex_parse
+
+SAMPLES = [
+    "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed",
+    "Book SJT 315 tomorrow 4 to 6 pm",
+    "Cancel booking BK-2021",
+    "Is LH-204 free next Friday 2pm to 3:30pm?",
+    "schedule TT 101 on 3/10 9:00-10:30 for the review",
+    "grab a room in SJT for the afternoon",
+    "delete BK-77 please",
+    "is anything vacant in TT today",
+]
+
+
+def legacy_regex_parse(text: str) -> dict:
+    out = {}
+    intents = {
+        "book": ["book", "reserve", "schedule"],
+        "cancel": ["cancel", "delete"],
+        "check_availability": ["available", "free", "vacant"],
+    }
+    lower = text.lower()
+    for intent, words in intents.items():
+        if any(w in lower for w in words):
+            out["intent"] = intent
+            break
+    m = re.search(r"\b([A-Z]{2,}-?\s?\d{2,3})\b", text)
+    if m:
+        out["room"] = m.group(1).strip()
+    m = re.search(r"\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec))\b", text, re.I)
+    if not m:
+        m = re.search(r"\b(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b", text)
+    if not m:
+        m = re.search(r"\b(today|tomorrow|day after tomorrow|next\s+\w+)\b", text, re.I)
+    if m:
+        out["date"] = m.group(1).strip()
+    m = re.search(r"\b((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\s*(?:-|–|to)\s*((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\b", text, re.I)
+    if m:
+        out["start"], out["end"] = m.group(1).strip(), m.group(2).strip()
+    m = re.search(r"\b(BK-\d+)\b", text, re.I)
+    if m:
+        out["booking_id"] = m.group(1).upper()
+    return out
+
+
+def legacy_prefer_explicit(original: str, model_out: dict) -> dict:
+    out = dict(model_out)
+    bk = re.search(r"\b(BK-\d+)\b", original, re.I)
+    if bk:
+        out["booking_id"] = bk.group(1).upper()
+    else:
+        out.pop("booking_id", None)
+    m = re.search(r"\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec))\b", original, re.I) \
+        or re.search(r"\b(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b", original)
+    if m:
+        out["date"] = m.group(1).strip()
+    m = re.search(r"\b((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\s*(?:-|–|to)\s*((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\b", original, re.I)
+    if m:
+        out["start"], out["end"] = m.group(1).strip(), m.group(2).strip()
+    m = re.search(r"\b([A-Z]{2,}-?\s?\d{2,3})\b", original)
+    if m:
+        out["room"] = m.group(1).strip()
+    elif "room" in out and out["room"] not in original:
+        out.pop("room", None)
+    return out
+
+
+def legacy(text: str) -> dict:
+    return legacy_prefer_explicit(text, legacy_regex_parse(text))
+
+
+def engine(text: str) -> dict:
+    spans = extract_spans(text)
+    return prefer_explicit(text, regex_parse(text, spans), spans)
+
+
+def corpus(n: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    fillers = ["", " please", " asap", " for 12 people", " with projector"]
+    return [rnd.choice(SAMPLES) + rnd.choice(fillers) for _ in range(n)]
+
+
+def rate(fn, texts) -> float:
+    t0 = time.perf_counter()
+    fn(texts)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=20000)
+    args = ap.parse_args()
+    texts = corpus(args.n)
+
+    for text in SAMPLES:
+        assert legacy_regex_parse(text) == regex_parse(text), text
+        assert legacy(text) == engine(text), text
+
+    results = {
+        "legacy_parse": rate(lambda ts: [legacy_regex_parse(t) for t in ts], texts),
+        "engine_parse": rate(lambda ts: [regex_parse(t) for t in ts], texts),
+        "legacy_parse+sanitize": rate(lambda ts: [legacy(t) for t in ts], texts),
+        "engine_parse+sanitize": rate(lambda ts: [engine(t) for t in ts], texts),
+        "parse_many": rate(lambda ts: list(parse_many(ts)), texts),
+    }
+    for name, per_sec in results.items():
+        print(json.dumps({"path": name, "n": args.n, "utterances_per_sec": round(per_sec)}))
+
+
+if __name__ == "__main__":
+    main()
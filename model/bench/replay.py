@@ -0,0 +1,133 @@
+"""
+Replay captured traffic (`nlp.capture`) against a running parse API.
+
+    python -m bench.replay logs/requests.jsonl --url http://127.0.0.1:8000 --speed 4
+
+Open loop: each request is sent at its original offset from the first one,
+divided by --speed (2 = twice as fast; 0 = back to back, as fast as the
+workers allow), whether or not earlier ones have answered. Real load shapes
+(bursts, lulls, the daily ramp) are reproduced instead of the steady rate
+`bench.loadgen` offers. Rotated backups of the given path (PATH.N ... PATH.1)
+are replayed first, oldest first.
+
+Reports latency next to the latency recorded at capture time, how late the
+sends were against the schedule (a large lag means the replayer, not the
+server, was the bottleneck: raise --workers), statuses, and tiers, with how
+many requests got a different tier than when they were captured.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urlsplit
+
+from bench.stats import latency_summary
+from nlp.capture import capture_files, read_capture
+
+
+def replay(records: list[dict], url: str, speed: float = 1.0, workers: int = 64,
+           timeout: float = 120.0) -> dict:
+    parts = urlsplit(url)
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, lags = [], []
+    statuses: Counter = Counter()
+    tiers: Counter = Counter()
+    tier_changes = 0
+
+    def connection() -> http.client.HTTPConnection:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        return conn
+
+    def send(rec: dict, due: float) -> None:
+        nonlocal tier_changes
+        lag = time.perf_counter() - due
+        body = json.dumps(rec.get("request") or {})
+        t0 = time.perf_counter()
+        try:
+            conn = connection()
+            conn.request("POST", rec.get("endpoint") or "/parse", body=body,
+                         headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            data = resp.read()
+            status = resp.status
+        except (http.client.HTTPException, OSError):
+            local.conn.close()
+            local.conn = None
+            status, data = "conn_error", b""
+        elapsed = time.perf_counter() - t0
+        tier = None
+        if status == 200:
+            try:
+                reply = json.loads(data)
+                tier = reply.get("tier") if isinstance(reply, dict) else None
+            except ValueError:
+                pass
+        with lock:
+            latencies.append(elapsed)
+            lags.append(max(lag, 0.0))
+            statuses[str(status)] += 1
+            if tier:
+                tiers[tier] += 1
+                if rec.get("tier") and tier != rec["tier"]:
+                    tier_changes += 1
+
+    first = records[0]["ts"]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rec in records:
+            due = t0 + ((rec["ts"] - first) / speed if speed > 0 else 0.0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, rec, due)
+    duration = time.perf_counter() - t0
+
+    span = records[-1]["ts"] - first
+    recorded = [r["latency_ms"] / 1000 for r in records if isinstance(r.get("latency_ms"), (int, float))]
+    return {
+        "requests": len(records),
+        "captured_span_s": round(span, 3),
+        "speed": speed,
+        "duration_s": round(duration, 3),
+        "offered_rps": round(len(records) / (span / speed), 2) if speed > 0 and span > 0 else None,
+        "achieved_rps": round(len(records) / duration, 2) if duration > 0 else None,
+        "latency": latency_summary(latencies),
+        "captured_latency": latency_summary(recorded),
+        "send_lag": latency_summary(lags),
+        "statuses": dict(statuses),
+        "tiers": dict(tiers),
+        "captured_tiers": dict(Counter(r["tier"] for r in records if r.get("tier"))),
+        "tier_changes": tier_changes,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("capture", help="capture log (PARSE_CAPTURE_PATH); its rotated backups are included")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--speed", type=float, default=1.0, help="time compression; 0 = no delays")
+    ap.add_argument("--workers", type=int, default=64, help="max requests in flight")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--endpoint", default=None, help="only replay this endpoint (e.g. /parse)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    args = ap.parse_args(argv)
+
+    files = capture_files(args.capture)
+    if not files:
+        ap.error(f"{args.capture}: no such capture log")
+    records = (r for r in read_capture(files) if args.endpoint is None or r.get("endpoint") == args.endpoint)
+    records = sorted(islice(records, args.limit), key=lambda r: r["ts"])
+    if not records:
+        ap.error("no records to replay")
+    print(json.dumps(replay(records, args.url, args.speed, args.workers, args.timeout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Drive `ReplicaRouter` against several stand-in servers with different
+latencies and failure rates, and report how the calls were spread.
+
+    python -m bench.router_bench -n 400 --concurrency 8 \\
+        --replica latency=0.02 --replica latency=0.05,weight=2 \\
+        --replica latency=0.02,fail=0.3 --break-after 200
+
+Each --replica takes latency (s), fail (share of 503s) and weight.
+--break-after makes the first replica fail every call after that many
+requests, to show it being marked down and the traffic moving elsewhere.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_ollama import serve, server_url
+from bench.stats import latency_summary
+from nlp.ollama_client import OllamaClient, OllamaError
+from nlp.ollama_runner import run_tinyllama_json
+from nlp.router import Replica, ReplicaRouter
+
+DEFAULT_REPLICAS = ("latency=0.02", "latency=0.05,weight=2", "latency=0.02,fail=0.3")
+
+
+def parse_replica(spec: str) -> dict:
+    opts = {"latency": 0.0, "fail": 0.0, "weight": 1.0}
+    for part in filter(None, spec.split(",")):
+        key, _, value = part.partition("=")
+        if key not in opts:
+            raise ValueError(f"unknown replica option {key!r}; use latency, fail, weight")
+        opts[key] = float(value)
+    return opts
+
+
+def run(specs: list[dict], n: int, concurrency: int, break_after: int | None,
+        probe_interval: float, seed: int = 0) -> dict:
+    servers = [serve(latency=s["latency"], fail_rate=s["fail"], seed=seed + i)
+               for i, s in enumerate(specs)]
+    router = ReplicaRouter(
+        [Replica(OllamaClient(server_url(srv), pool_size=concurrency, retries=0), s["weight"])
+         for srv, s in zip(servers, specs)],
+        retries=2, probe_interval=probe_interval,
+    )
+    samples, errors = [], 0
+    lock = threading.Lock()
+    done = 0
+
+    def one(i: int) -> None:
+        nonlocal errors, done
+        t0 = time.perf_counter()
+        try:
+            run_tinyllama_json(f"Book SJT {i} tomorrow", client=router, stream=False)
+            ok = True
+        except (OllamaError, ValueError):
+            ok = False
+        with lock:
+            samples.append(time.perf_counter() - t0)
+            errors += not ok
+            done += 1
+            if break_after is not None and done == break_after:
+                servers[0].config["fail_rate"] = 1.0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n)))
+    wall = time.perf_counter() - t0
+    report = {
+        "requests": n, "errors": errors, "throughput_rps": round(n / wall, 1),
+        "latency": latency_summary(samples),
+        "replicas": [{**state, "server_calls": srv.calls, "latency": spec["latency"], "fail_rate": spec["fail"]}
+                     for state, srv, spec in zip(router.snapshot()["replicas"], servers, specs)],
+    }
+    router.close()
+    for srv in servers:
+        srv.shutdown()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--replica", action="append", default=None, help="latency=S,fail=P,weight=W")
+    ap.add_argument("--break-after", type=int, default=None)
+    ap.add_argument("--probe-interval", type=float, default=0.5)
+    args = ap.parse_args()
+    specs = [parse_replica(s) for s in (args.replica or DEFAULT_REPLICAS)]
+    print(json.dumps(run(specs, args.n, args.concurrency, args.break_after, args.probe_interval), indent=2))
+
+
+if __name__ == "__main__":
+    main()
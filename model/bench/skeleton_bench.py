@@ -0,0 +1,67 @@
+"""
+Skeleton-cache hit rate and refill accuracy on synthetic traffic.
+
+    python -m bench.skeleton_bench -n 20000 --size 1024
+
+Utterances come from the `bench.slot_model_bench` templates. The "model" is
+an oracle that returns each utterance's labelled fields, so a refilled
+answer can be checked against what the model would have said. Reports the
+hit rate of the exact-match key next to the skeleton key, refill accuracy,
+lookup latency and the busiest skeletons.
+"""
+import argparse
+import json
+import time
+
+from bench.slot_model_bench import synth
+from bench.stats import latency_summary
+from nlp.cache import normalize_utterance
+from nlp.skeleton_cache import SkeletonCache, skeletonize
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=20000, help="utterances")
+    ap.add_argument("--size", type=int, default=1024, help="skeleton cache entries")
+    ap.add_argument("--top", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    traffic = synth(args.n, seed=args.seed)
+    cache = SkeletonCache(max_entries=args.size)
+    exact_seen: set[str] = set()
+    exact_hits = refills = wrong = no_skeleton = 0
+    samples = []
+    for utterance, fields in traffic:
+        key = normalize_utterance(utterance)
+        exact_hits += key in exact_seen
+        exact_seen.add(key)
+
+        t0 = time.perf_counter()
+        skeleton = skeletonize(utterance)
+        hit = cache.get(skeleton.text, skeleton) if skeleton is not None else None
+        samples.append(time.perf_counter() - t0)
+        if skeleton is None:
+            no_skeleton += 1
+        elif hit is None:
+            cache.put(skeleton.text, skeleton, fields)
+        else:
+            refills += 1
+            wrong += hit != fields
+
+    snap = cache.snapshot(args.top)
+    report = {
+        "utterances": args.n,
+        "exact_hit_rate": round(exact_hits / args.n, 4),
+        "skeleton_hit_rate": round(refills / args.n, 4),
+        "refill_accuracy": round(1 - wrong / refills, 4) if refills else None,
+        "no_skeleton": no_skeleton,
+        "lookup": latency_summary(samples, 1e6, "us"),
+        "cache": {k: v for k, v in snap.items() if k != "top"},
+        "top": snap["top"],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Train and time the learned intent/slot tier (`nlp.slot_model`) on synthetic
+request/response logs.
+
+    python -m bench.slot_model_bench -n 20000 --save /tmp/slot_model.npz
+
+Utterances are generated from phrasing templates the regex tier mostly
+cannot finish ("grab a room in SJT for the afternoon" style) plus explicit
+ones, labelled with the fields a correct parse returns. Reports held-out
+accuracy and calibration, coverage per confidence threshold, and
+single/batched inference latency.
+"""
+import argparse
+import json
+import random
+import time
+
+from bench.stats import latency_summary
+from nlp.slot_model import evaluate, train
+
+BUILDINGS = ["SJT", "TT", "LH", "MB", "PRP", "SMV", "GDN", "CDMM"]
+DATES = ["tomorrow", "today", "next Friday", "next Monday", "11 Sept", "3 Oct", "12/10", "friday",
+         "this weekend", "in 3 days", "day after tomorrow", "next week"]
+TIMES = [("9", "10"), ("10:00", "11:30"), ("2pm", "4pm"), ("14:00", "16:00"), ("3 pm", "5 pm"),
+         ("11", "12"), ("4", "6 pm"), ("13:30", "15:00"), ("2pm", "3:30pm"), ("9:30am", "11am")]
+TEMPLATES = [
+    ("book", "grab a room in {building} for {date}"),
+    ("book", "need somewhere in {building} {date} from {start} to {end}"),
+    ("book", "Book {room} {date} {start} to {end}"),
+    ("book", "can you get me {room} on {date} between {start} and {end}"),
+    ("book", "reserve {room} for {date} {start} - {end} for the review"),
+    ("book", "I'd like {room} {date} at {start} until {end}"),
+    ("check_availability", "Is {room} free {date} {start} to {end}?"),
+    ("check_availability", "anything open in {building} {date}?"),
+    ("check_availability", "is there space in {room} on {date} around {start}"),
+    ("check_availability", "what's vacant in {building} {date} {start} to {end}"),
+    ("cancel", "Cancel {booking_id}"),
+    ("cancel", "please drop my booking {booking_id}"),
+    ("cancel", "scrap the {room} slot on {date} at {start}"),
+    ("modify", "move {booking_id} to {date} {start} to {end}"),
+    ("modify", "push my {room} meeting to {date} at {start}"),
+]
+
+
+def synth(n: int, seed: int = 0) -> list[tuple[str, dict]]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        intent, template = rng.choice(TEMPLATES)
+        building = rng.choice(BUILDINGS)
+        start, end = rng.choice(TIMES)
+        values = {"building": building, "room": f"{building}{rng.choice(['', ' ', '-'])}{rng.randint(100, 999)}",
+                  "date": rng.choice(DATES), "start": start, "end": end,
+                  "booking_id": f"BK-{rng.randint(1, 9999)}"}
+        text = template.format(**values)
+        fields = {"intent": intent, **{k: v for k, v in values.items() if "{" + k + "}" in template}}
+        out.append((text, fields))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=20000, help="training examples")
+    ap.add_argument("--test", type=int, default=2000)
+    ap.add_argument("--epochs", type=int, default=8)
+    ap.add_argument("--dim", type=int, default=1 << 18)
+    ap.add_argument("--save", default=None, help="write the trained model here")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    model = train(synth(args.n, seed=1), dim=args.dim, epochs=args.epochs)
+    train_s = time.perf_counter() - t0
+    if args.save:
+        model.save(args.save)
+    test = synth(args.test, seed=2)
+
+    single = []
+    for u, _ in test[:500]:
+        t1 = time.perf_counter()
+        model.predict(u)
+        single.append(time.perf_counter() - t1)
+    report = {
+        "train_examples": args.n, "train_s": round(train_s, 2),
+        "calibration": {"intent_temperature": model.intent_temperature,
+                        "tag_temperature": model.tag_temperature, "confidence_power": model.confidence_power},
+        "heldout": evaluate(model, test),
+        "single_predict": latency_summary(single, 1e6, "us"),
+        "examples": {u: model.predict(u) for u in ("grab a room in SJT for the afternoon",
+                                                    "Is LH-204 free next Friday 2pm to 3:30pm?")},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
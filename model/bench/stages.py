@@ -0,0 +1,81 @@
+"""
+Per-stage cost of the parse path, timed in-process.
+
+    python -m bench.stages -n 2000
+
+Stages: build_prompt, regex (spans + regex_parse), model_call (against a
+stand-in server), _extract_first_json and _kv_fallback per output shape,
+prefer_explicit and compile_param_json.
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from bench.fake_ollama import DEFAULT_RESPONSE, SHAPES, serve, server_url
+from bench.regex_bench import SAMPLES
+from bench.stats import latency_summary
+from nlp.ollama_client import OllamaClient
+from nlp.ollama_runner import _extract_first_json, _kv_fallback, run_tinyllama_json
+from nlp.param_json import compile_param_json
+from nlp.prompt import build_prompt
+from nlp.regex_parser import extract_spans, prefer_explicit, regex_parse
+
+
+def _time(fn, args_list: list) -> list[float]:
+    out = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def _us(samples: list[float]) -> dict:
+    return latency_summary(samples, scale=1e6, unit="us")
+
+
+def stage_breakdown(n: int = 2000, client: OllamaClient | None = None,
+                    model_calls: int = 50, model_name: str = "room-nlu") -> dict:
+    texts = [SAMPLES[i % len(SAMPLES)] for i in range(n)]
+    now = datetime.now()
+    spans = [extract_spans(t) for t in texts]
+    parsed = [regex_parse(t, sp) for t, sp in zip(texts, spans)]
+
+    stages = {
+        "build_prompt": _us(_time(build_prompt, [(t,) for t in texts])),
+        "regex": _us(_time(lambda t: regex_parse(t, extract_spans(t)), [(t,) for t in texts])),
+        "prefer_explicit": _us(_time(prefer_explicit, list(zip(texts, parsed, spans)))),
+        "compile_param_json": _us(_time(compile_param_json, [(p, now) for p in parsed])),
+    }
+    for shape, render in SHAPES.items():
+        raw = render(DEFAULT_RESPONSE)
+        stages[f"extract_first_json[{shape}]"] = _us(_time(_extract_first_json, [(raw,)] * n))
+        stages[f"kv_fallback[{shape}]"] = _us(_time(_kv_fallback, [(raw,)] * n))
+
+    if client is not None and model_calls:
+        calls = [(texts[i % len(texts)], model_name, client) for i in range(model_calls)]
+
+        def model_call(text, name, c):
+            try:
+                run_tinyllama_json(text, name, client=c)
+            except ValueError:
+                pass  # "garbage" shape; the cost still counts
+        stages["model_call"] = _us(_time(model_call, calls))
+    return stages
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=2000)
+    ap.add_argument("--model-calls", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.0)
+    args = ap.parse_args()
+    server = serve(latency=args.latency)
+    client = OllamaClient(server_url(server))
+    print(json.dumps(stage_breakdown(args.n, client, args.model_calls), indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Small latency-summary helpers shared by the bench scripts."""
+import statistics
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 1]."""
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def latency_summary(samples: list[float], scale: float = 1000.0, unit: str = "ms") -> dict:
+    """p50/p95/p99/mean of `samples` (seconds) scaled to `unit`."""
+    if not samples:
+        return {"n": 0}
+    xs = [x * scale for x in samples]
+    return {
+        "n": len(xs),
+        f"p50_{unit}": round(percentile(xs, 0.50), 3),
+        f"p95_{unit}": round(percentile(xs, 0.95), 3),
+        f"p99_{unit}": round(percentile(xs, 0.99), 3),
+        f"mean_{unit}": round(statistics.fmean(xs), 3),
+    }
@@ -0,0 +1,56 @@
+"""
+Buffered vs streaming-with-early-stop generation against a chatty stand-in.
+
+    python -m bench.stream_latency -n 20 --token-delay 0.005
+
+The stand-in emits the JSON answer followed by `--junk-tokens` words of
+chatter, the way TinyLlama often does. The buffered path waits for all of
+it; the streaming path hangs up as soon as the JSON object closes.
+"""
+import argparse
+import json
+
+from bench.client_latency import summarize
+from bench.fake_ollama import serve, server_url
+from nlp.ollama_client import OllamaClient
+from nlp.ollama_runner import run_tinyllama_json
+
+UTTERANCE = "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=20)
+    ap.add_argument("--token-delay", type=float, default=0.005)
+    ap.add_argument("--junk-tokens", type=int, default=200)
+    args = ap.parse_args()
+
+    junk = "\nSure! Here is an explanation of each field." + " blah" * args.junk_tokens
+    server = serve(token_delay=args.token_delay, junk=junk)
+    client = OllamaClient(server_url(server))
+
+    rows = []
+    for name, stream in (("buffered", False), ("streaming", True)):
+        totals, ttft, tjson = [], [], []
+        for _ in range(args.n):
+            timings = {}
+            run_tinyllama_json(UTTERANCE, client=client, stream=stream, timings=timings)
+            totals.append(timings["generate"])
+            if stream:
+                ttft.append(timings["ttft"])
+                tjson.append(timings["json_complete"])
+        row = summarize(name, totals)
+        if stream:
+            row["ttft_p50_ms"] = summarize("", ttft)["p50_ms"]
+            row["json_complete_p50_ms"] = summarize("", tjson)["p50_ms"]
+        rows.append(row)
+
+    for row in rows:
+        print(json.dumps(row))
+    print(json.dumps({"server_calls": server.calls, "aborted_streams": server.aborted,
+                      "tokens_saved": server.tokens_saved}))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+End-to-end benchmark suite with a regression check.
+
+    python -m bench.suite                          # run, print report
+    python -m bench.suite --check                  # fail if worse than baseline
+    python -m bench.suite --update-baseline        # record this machine's numbers
+
+Starts a stand-in Ollama (latency, token rate and output-shape mix are
+configurable), serves api.app on a local port (or targets --url), then
+runs the per-stage breakdown and the /parse load levels. The result cache
+is disabled so every model-tier request reaches the stand-in.
+
+Baseline numbers are machine-specific: refresh bench/baseline.json with
+--update-baseline on the host where --check will run.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from bench.fake_ollama import parse_shapes, serve, server_url
+from bench.loadgen import MIXES, run_level
+from bench.stages import stage_breakdown
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Differences below these are timer noise, whatever the ratio.
+ABS_SLACK = {"_us": 5.0, "_ms": 2.0}
+
+
+def start_api() -> tuple[str, object]:
+    """Serve the Flask app on a free port in a background thread."""
+    from werkzeug.serving import make_server
+    from api.app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def flatten_metrics(report: dict) -> dict[str, float]:
+    """The numbers compared against the baseline, keyed by dotted path."""
+    out = {}
+    for name, s in report.get("stages", {}).items():
+        if "p50_us" in s:
+            out[f"stages.{name}.p50_us"] = s["p50_us"]
+    for level in report.get("load", []):
+        key = f"load.c{level['concurrency']}"
+        if "p99_ms" in level:
+            out[f"{key}.p99_ms"] = level["p99_ms"]
+        out[f"{key}.throughput_rps"] = level["throughput_rps"]
+    return out
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions: latency up or throughput down by more than `tolerance`."""
+    cur, base = flatten_metrics(current), flatten_metrics(baseline)
+    problems = []
+    for key, b in base.items():
+        if key not in cur:
+            continue
+        c = cur[key]
+        if key.endswith(".throughput_rps"):
+            bad = c < b * (1 - tolerance / (1 + tolerance))
+        else:
+            slack = next(v for suffix, v in ABS_SLACK.items() if key.endswith(suffix))
+            bad = c > b * (1 + tolerance) and c - b > slack
+        if bad:
+            problems.append(f"{key}: {c} vs baseline {b}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=None, help="benchmark a running server instead of api.app")
+    ap.add_argument("--latency", type=float, default=0.05, help="stand-in model latency (s)")
+    ap.add_argument("--tokens-per-sec", type=float, default=400.0)
+    ap.add_argument("--shapes", default="clean=5,fenced=2,chatter=2,kv=1,garbage=0.2")
+    ap.add_argument("--concurrency", default="1,4,16")
+    ap.add_argument("--requests", type=int, default=200, help="requests per load level")
+    ap.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    ap.add_argument("--stage-n", type=int, default=2000)
+    ap.add_argument("--no-load", action="store_true", help="stage breakdown only")
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--tolerance", type=float, default=1.0, help="allowed relative regression (1.0 = 2x)")
+    ap.add_argument("--check", action="store_true")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--out", default=None, help="also write the report here")
+    args = ap.parse_args()
+
+    fake = serve(latency=args.latency, token_delay=1.0 / args.tokens_per_sec,
+                 shapes=parse_shapes(args.shapes))
+    os.environ["OLLAMA_HOST"] = server_url(fake)
+    os.environ["PARSE_CACHE_SIZE"] = "0"
+
+    from nlp.ollama_client import OllamaClient
+    report = {
+        "config": {k: getattr(args, k) for k in
+                   ("latency", "tokens_per_sec", "shapes", "concurrency", "requests", "mix")},
+        "stages": stage_breakdown(args.stage_n, OllamaClient(server_url(fake))),
+        "load": [],
+    }
+
+    if not args.no_load:
+        url, api = (args.url, None) if args.url else start_api()
+        for level in (int(c) for c in args.concurrency.split(",")):
+            report["load"].append(run_level(url, level, args.requests, MIXES[args.mix]))
+        if api is not None:
+            api.shutdown()
+    report["model_calls"] = fake.calls
+    fake.shutdown()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    if args.update_baseline:
+        Path(args.baseline).write_text(text + "\n")
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+    if args.check:
+        problems = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
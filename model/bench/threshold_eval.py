@@ -0,0 +1,232 @@
+"""
+Differential evaluation of the regex bypass threshold against model cost.
+
+    python -m bench.threshold_eval corpus.jsonl --concurrency 4 --save runs.jsonl
+    python -m bench.threshold_eval --load runs.jsonl --max-loss 0.01
+
+Each labelled utterance goes through three paths: `regex_parse` alone, the
+model alone (asked for the regex gap fields, as the pipeline does; --full
+asks for every field) and the merge that `prefer_explicit` sanitizes. The
+"model" column is scored only on the fields the model was asked for, and
+only over the utterances it was called for. Model calls run in parallel,
+one per utterance, and are timed. None of them goes through the result
+cache. The time is wall clock around the call, so with --concurrency above
+the server's OLLAMA_NUM_PARALLEL it includes queueing at the server: compare
+model seconds between runs made at the same concurrency.
+
+Replaying the bypass rule offline then costs nothing. At threshold t an
+utterance whose regex confidence reaches t is answered by regex and every
+other one by the merge. For each candidate t the report gives:
+- per-field precision and recall;
+- exact match;
+- the model-call rate and total model seconds.
+
+The cost/accuracy frontier is the set of thresholds that no other threshold
+beats on both model calls and exact match. The recommendation is the
+cheapest threshold within --max-loss of the best exact match. Set it with
+REGEX_BYPASS_THRESHOLD.
+
+The corpus is JSONL in any shape `nlp.slot_model.read_examples` accepts
+({"utterance", "intent", "room", ...}, or logged request/response pairs).
+Values are compared after normalization: dates and times through
+`nlp.normalize`, rooms through `param_json.room_id`, the rest
+case-insensitively.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from nlp.normalize import normalize_date, normalize_time
+from nlp.ollama_runner import run_tinyllama_json
+from nlp.param_json import room_id
+from nlp.pipeline import batch_concurrency, bypass_threshold, merge, model_fields
+from nlp.regex_parser import confidence, extract_spans, regex_parse
+from nlp.schema import FIELDS
+from nlp.slot_model import read_examples
+
+SYSTEMS = ("regex", "model", "merged")
+
+
+def canonical(field: str, value, today: date) -> str | None:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    if field == "date":
+        return normalize_date(value, today) or value.strip().lower()
+    if field in ("start", "end"):
+        return normalize_time(value) or value.strip().lower()
+    if field == "room":
+        return room_id(value)
+    return " ".join(value.split()).lower()
+
+
+def run_one(utterance: str, gold: dict, model_name: str, full: bool) -> dict:
+    """Regex, model and merged answers for one utterance, plus the model time."""
+    spans = extract_spans(utterance)
+    regex_out = regex_parse(utterance, spans)
+    rec = {"utterance": utterance, "gold": gold, "score": confidence(regex_out),
+           "regex": regex_out, "model": {}, "model_seconds": 0.0}
+    fields = model_fields(regex_out, force_model=full)
+    if fields == ():
+        rec["merged"] = merge(utterance, regex_out, {}, spans)
+        return rec  # the pipeline would not call the model either
+    rec["model_call"] = True
+    rec["model_fields"] = list(fields or FIELDS)
+    t0 = time.perf_counter()
+    try:
+        rec["model"] = run_tinyllama_json(utterance, model_name=model_name, fields=fields)
+    except Exception as e:
+        rec["model_error"] = f"{type(e).__name__}: {e}"
+    rec["model_seconds"] = time.perf_counter() - t0
+    rec["merged"] = merge(utterance, regex_out, rec["model"], spans)
+    return rec
+
+
+def run_corpus(examples: list[tuple[str, dict]], model_name: str, full: bool,
+               concurrency: int, log=sys.stderr) -> list[dict]:
+    records = []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        jobs = pool.map(lambda ex: run_one(ex[0], ex[1], model_name, full), examples)
+        for i, rec in enumerate(jobs, 1):
+            records.append(rec)
+            if i % 100 == 0:
+                print(f"{i}/{len(examples)} ({i / (time.perf_counter() - t0):.1f}/s)", file=log)
+    return records
+
+
+class FieldCounts:
+    """Per-field true positives, predictions and gold labels."""
+
+    def __init__(self):
+        self.tp, self.pred, self.gold = {}, {}, {}
+        self.exact = self.n = 0
+
+    def add(self, predicted: dict, gold: dict, today: date, fields=FIELDS) -> None:
+        p = {f: canonical(f, predicted.get(f), today) for f in fields}
+        g = {f: canonical(f, gold.get(f), today) for f in fields}
+        for f in fields:
+            if p[f] is not None:
+                self.pred[f] = self.pred.get(f, 0) + 1
+            if g[f] is not None:
+                self.gold[f] = self.gold.get(f, 0) + 1
+                if p[f] == g[f]:
+                    self.tp[f] = self.tp.get(f, 0) + 1
+        self.n += 1
+        self.exact += all(p[f] == g[f] for f in fields if g[f] is not None or p[f] is not None)
+
+    def report(self) -> dict:
+        fields = {}
+        for f in FIELDS:
+            if f not in self.pred and f not in self.gold:
+                continue
+            tp = self.tp.get(f, 0)
+            fields[f] = {"precision": round(tp / self.pred[f], 4) if self.pred.get(f) else None,
+                         "recall": round(tp / self.gold[f], 4) if self.gold.get(f) else None,
+                         "support": self.gold.get(f, 0)}
+        tp, pred, gold = (sum(d.values()) for d in (self.tp, self.pred, self.gold))
+        return {"exact_match": round(self.exact / self.n, 4) if self.n else 0.0,
+                "micro_precision": round(tp / pred, 4) if pred else None,
+                "micro_recall": round(tp / gold, 4) if gold else None,
+                "fields": fields}
+
+
+def candidate_thresholds(records: list[dict]) -> list[float]:
+    """Every distinct regex score, plus one above the highest (never bypass)."""
+    scores = sorted({r["score"] for r in records})
+    return scores + [(scores[-1] if scores else 0.0) + 1.0]
+
+
+def at_threshold(records: list[dict], threshold: float, today: date) -> dict:
+    counts = FieldCounts()
+    calls, seconds = 0, 0.0
+    for r in records:
+        if r["score"] >= threshold:
+            counts.add(r["regex"], r["gold"], today)
+            continue
+        counts.add(r["merged"], r["gold"], today)
+        if r.get("model_call"):
+            calls += 1
+            seconds += r["model_seconds"]
+    n = max(len(records), 1)
+    return {"threshold": threshold, "model_call_rate": round(calls / n, 4),
+            "model_calls": calls, "model_seconds": round(seconds, 3), **counts.report()}
+
+
+def frontier(points: list[dict]) -> list[float]:
+    """Thresholds not beaten on both model calls and exact match, cheapest first."""
+    best, out = -1.0, []
+    for p in sorted(points, key=lambda p: (p["model_calls"], -p["exact_match"])):
+        if p["exact_match"] > best:
+            best = p["exact_match"]
+            out.append(p["threshold"])
+    return out
+
+
+def evaluate(records: list[dict], thresholds: list[float] | None = None, max_loss: float = 0.01,
+             today: date | None = None) -> dict:
+    today = today or date.today()
+    systems = {}
+    for name in SYSTEMS:
+        counts = FieldCounts()
+        for r in records:
+            if name != "model":
+                counts.add(r[name], r["gold"], today)
+            elif r.get("model_call"):
+                counts.add(r["model"], r["gold"], today, r.get("model_fields") or FIELDS)
+        systems[name] = counts.report()
+    points = [at_threshold(records, t, today) for t in thresholds or candidate_thresholds(records)]
+    best = max(p["exact_match"] for p in points)
+    ok = [p for p in points if p["exact_match"] >= best - max_loss]
+    pick = min(ok, key=lambda p: (p["model_calls"], -p["exact_match"]))
+    return {
+        "examples": len(records),
+        "model_errors": sum("model_error" in r for r in records),
+        "systems": systems,
+        "thresholds": points,
+        "frontier": frontier(points),
+        "current_threshold": bypass_threshold(),
+        "recommended": {"threshold": pick["threshold"], "max_loss": max_loss,
+                        "exact_match": pick["exact_match"], "best_exact_match": best,
+                        "model_call_rate": pick["model_call_rate"]},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("corpus", nargs="?", help="labelled JSONL (not needed with --load)")
+    ap.add_argument("--model", default="room-nlu")
+    ap.add_argument("--concurrency", type=int, default=None,
+                    help="parallel model calls (default PARSE_BATCH_CONCURRENCY); "
+                         "above the server's parallelism, model seconds include queueing")
+    ap.add_argument("--full", action="store_true", help="ask the model for every field, not the gaps")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--save", default=None, help="write per-utterance results here (JSONL)")
+    ap.add_argument("--load", default=None, help="re-score saved results instead of calling the model")
+    ap.add_argument("--thresholds", default=None, help="comma-separated (default: every observed score)")
+    ap.add_argument("--max-loss", type=float, default=0.01, help="exact-match loss allowed for the pick")
+    args = ap.parse_args(argv)
+
+    if args.load:
+        with open(args.load, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        if not args.corpus:
+            ap.error("corpus is required without --load")
+        with open(args.corpus, encoding="utf-8") as f:
+            examples = read_examples(f)[:args.limit]
+        records = run_corpus(examples, args.model, args.full, args.concurrency or batch_concurrency())
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if not records:
+        sys.exit("no usable examples")
+    thresholds = [float(t) for t in args.thresholds.split(",")] if args.thresholds else None
+    print(json.dumps(evaluate(records, thresholds, args.max_loss), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Admission control in front of the model backend.
+
+The model is CPU-bound and serves a handful of generations at a time, so a
+burst must not pile up behind it. `ModelGate` admits at most `slots` calls at
+once and lets at most `max_queue` more wait; a caller past that, or whose
+deadline runs out while waiting, gets `Overloaded` and the pipeline answers
+from the regex tier instead (flagged "degraded").
+
+Deadlines are absolute `time.monotonic()` values taken from the client's
+timeout. A model call that is already running gets the remaining time as its
+read timeout and hangs up when it runs out, which stops the generation on
+the server.
+
+Configuration (environment, all optional):
+    PARSE_QUEUE_SIZE          16     (callers allowed to wait for a slot)
+    PARSE_DEFAULT_TIMEOUT_MS  30000  (deadline when the client sends none)
+Slots default to PARSE_BATCH_CONCURRENCY, the parallel slots of one server.
+With the replica router (OLLAMA_HOSTS) they are multiplied by the healthy
+replicas, counted by weight, and follow them as replicas leave and rejoin.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable
+
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+
+
+class Overloaded(RuntimeError):
+    """The model tier cannot answer in time; `reason` is QUEUE_FULL or DEADLINE."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"model backend overloaded: {reason}")
+        self.reason = reason
+
+
+def default_timeout() -> float:
+    return float(os.environ.get("PARSE_DEFAULT_TIMEOUT_MS", "30000")) / 1000.0
+
+
+def deadline_after(timeout_ms=None) -> float:
+    """
+    Absolute deadline for a client timeout in milliseconds (None: default).
+    Raises ValueError for anything that is not a positive number.
+    """
+    if timeout_ms is None or timeout_ms == "":
+        return time.monotonic() + default_timeout()
+    timeout = float(timeout_ms)
+    if not timeout > 0:
+        raise ValueError("timeout_ms must be a positive number")
+    return time.monotonic() + timeout / 1000.0
+
+
+def remaining(deadline: float | None) -> float | None:
+    """Seconds left before `deadline` (None when there is no deadline)."""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(deadline: float | None) -> None:
+    if deadline is not None and time.monotonic() >= deadline:
+        raise Overloaded(DEADLINE)
+
+
+class _Slots:
+    """`slots`, optionally scaled by a live backend capacity (see `backend_capacity`)."""
+
+    def __init__(self, slots: int, scale: Callable[[], float] | None):
+        self.base_slots = slots
+        self.scale = scale
+
+    @property
+    def slots(self) -> int:
+        if self.scale is None:
+            return self.base_slots
+        return max(1, round(self.base_slots * self.scale()))
+
+    @slots.setter
+    def slots(self, value: int) -> None:
+        self.base_slots = value
+
+
+class ModelGate(_Slots):
+    """Thread-based gate for the sync pipeline (Flask, batch, bulk)."""
+
+    def __init__(self, slots: int = 4, max_queue: int = 16, scale: Callable[[], float] | None = None):
+        super().__init__(slots, scale)
+        self.max_queue = max_queue
+        self._busy = 0
+        self._queued = 0
+        self._cond = threading.Condition()
+        self.stats = {"admitted": 0, "rejected": 0, "expired": 0}
+
+    def _enter(self, deadline: float | None) -> None:
+        with self._cond:
+            if self._busy < self.slots and not self._queued:
+                self._busy += 1
+                self.stats["admitted"] += 1
+                return
+            if self._queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise Overloaded(QUEUE_FULL)
+            self._queued += 1
+            try:
+                while self._busy >= self.slots:
+                    left = remaining(deadline)
+                    if left is not None and left <= 0:
+                        self.stats["expired"] += 1
+                        raise Overloaded(DEADLINE)
+                    self._cond.wait(left)
+                self._busy += 1
+                self.stats["admitted"] += 1
+            finally:
+                self._queued -= 1
+                if self._busy < self.slots:
+                    self._cond.notify()  # pass on a wake-up we did not use
+
+    def _exit(self) -> None:
+        with self._cond:
+            self._busy -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self, deadline: float | None = None):
+        """Hold a model slot for the body; raises Overloaded instead of waiting too long."""
+        self._enter(deadline)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {**self.stats, "slots": self.slots, "busy": self._busy,
+                    "queued": self._queued, "max_queue": self.max_queue}
+
+
+class AsyncModelGate(_Slots):
+    """asyncio counterpart of `ModelGate`; waiters are served in arrival order."""
+
+    def __init__(self, slots: int = 4, max_queue: int = 16, scale: Callable[[], float] | None = None):
+        super().__init__(slots, scale)
+        self.max_queue = max_queue
+        self._busy = 0
+        self._waiters: deque = deque()  # of asyncio.Future
+        self.stats = {"admitted": 0, "rejected": 0, "expired": 0}
+
+    async def _enter(self, deadline: float | None) -> None:
+        if self._busy < self.slots and not self._waiters:
+            self._busy += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded(QUEUE_FULL)
+        import asyncio  # deferred: the sync servers and CLIs never need it
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, remaining(deadline))
+        except asyncio.TimeoutError:
+            self.stats["expired"] += 1
+            raise Overloaded(DEADLINE) from None
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self._exit()  # the slot was handed to us; hand it on
+            raise
+        finally:
+            if not fut.done():
+                fut.cancel()
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+        self.stats["admitted"] += 1
+
+    def _exit(self) -> None:
+        self._busy -= 1
+        # hand free slots to the waiters in order; more than one when capacity grew,
+        # none while busy is still above a capacity that shrank
+        slots = self.slots
+        while self._waiters and self._busy < slots:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._busy += 1
+                fut.set_result(None)
+
+    @asynccontextmanager
+    async def admit(self, deadline: float | None = None):
+        await self._enter(deadline)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "slots": self.slots, "busy": self._busy,
+                "queued": len(self._waiters), "max_queue": self.max_queue}
+
+
+def queue_size() -> int:
+    return max(0, int(os.environ.get("PARSE_QUEUE_SIZE", "16")))
+
+
+_default_gate: ModelGate | None = None
+_default_lock = threading.Lock()
+
+
+def get_gate() -> ModelGate:
+    """Process-wide gate; PARSE_BATCH_CONCURRENCY slots per healthy backend."""
+    global _default_gate
+    if _default_gate is None:
+        with _default_lock:
+            if _default_gate is None:
+                from .ollama_client import get_client  # deferred: admission stays import-light
+                from .router import backend_capacity
+                slots = max(1, int(os.environ.get("PARSE_BATCH_CONCURRENCY", "4")))
+                _default_gate = ModelGate(slots, queue_size(), scale=backend_capacity(get_client()))
+    return _default_gate
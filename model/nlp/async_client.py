@@ -0,0 +1,283 @@
+"""
+asyncio counterpart of `OllamaClient` for the ASGI server.
+
+Speaks just enough HTTP/1.1 over `asyncio.open_connection` to call
+`/api/generate` (buffered or streamed) on keep-alive connections, so an
+awaiting request does not hold a thread. Reads the same OLLAMA_* settings as
+`nlp.ollama_client.client_from_env`.
+"""
+import asyncio
+import json
+import os
+
+from .ollama_client import (
+    DEFAULT_HOST,
+    RETRY_STATUSES,
+    STRUCTURED_MIN_VERSION,
+    OllamaError,
+    OllamaTimeout,
+    _keep_alive_from_env,
+    _split_host,
+    version_at_least,
+)
+
+
+class _Response:
+    def __init__(self, status: int, headers: dict, reader: asyncio.StreamReader):
+        self.status = status
+        self.headers = headers
+        self.reader = reader
+        self.chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        self.length = int(headers.get("content-length", "0") or 0)
+        self.will_close = headers.get("connection", "").lower() == "close"
+        self.complete = False
+
+    async def read(self) -> bytes:
+        if not self.chunked:
+            data = await self.reader.readexactly(self.length) if self.length else b""
+            self.complete = True
+            return data
+        parts = []
+        async for piece in self.iter_chunks():
+            parts.append(piece)
+        return b"".join(parts)
+
+    async def iter_chunks(self):
+        while True:
+            size_line = await self.reader.readline()
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # trailers end with an empty line
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self.complete = True
+                return
+            data = await self.reader.readexactly(size)
+            await self.reader.readexactly(2)  # CRLF
+            yield data
+
+    async def iter_lines(self):
+        buf = b""
+        source = self.iter_chunks() if self.chunked else self._iter_body()
+        async for piece in source:
+            buf += piece
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                if line.strip():
+                    yield line
+        if buf.strip():
+            yield buf
+
+    async def _iter_body(self):
+        yield await self.read()
+
+
+class AsyncOllamaClient:
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        pool_size: int = 16,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 60.0,
+        retries: int = 2,
+        backoff: float = 0.1,
+        keep_alive: str | int | None = "30m",
+    ):
+        self.host = host
+        self._addr = _split_host(host)
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.structured: bool | None = None
+
+    async def _acquire(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(*self._addr), self.connect_timeout
+        )
+        return reader, writer, False
+
+    def _release(self, reader, writer, resp: _Response) -> None:
+        if resp.complete and not resp.will_close and len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def _send(self, reader, writer, method: str, path: str, body: bytes | None,
+                    timeout: float) -> _Response:
+        host, port = self._addr
+        head = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: keep-alive"]
+        if body is not None:
+            head += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        if not status_line:
+            raise ConnectionResetError("server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        return _Response(status, headers, reader)
+
+    async def open(self, method: str, path: str, payload: dict | None = None,
+                   timeout: float | None = None):
+        """Returns (reader, writer, response) with the body unread; see `finish`."""
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        read_timeout = self.read_timeout if timeout is None else timeout
+        last_err: Exception | None = None
+        attempt = 0
+        while attempt <= self.retries:
+            try:
+                reader, writer, reused = await self._acquire()
+            except (OSError, asyncio.TimeoutError) as e:
+                last_err = e
+                attempt += 1
+                if attempt <= self.retries:  # no backoff once out of attempts
+                    await asyncio.sleep(self.backoff * attempt)
+                continue
+            try:
+                resp = await self._send(reader, writer, method, path, body, read_timeout)
+            except asyncio.TimeoutError as e:
+                writer.close()
+                raise OllamaTimeout(f"Timed out after {read_timeout}s waiting for {path}") from e
+            except asyncio.CancelledError:
+                writer.close()  # hang up so the server stops generating
+                raise
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                writer.close()
+                last_err = e
+                if reused:
+                    continue
+                attempt += 1
+                if attempt <= self.retries:  # no backoff once out of attempts
+                    await asyncio.sleep(self.backoff * attempt)
+                continue
+
+            if resp.status in RETRY_STATUSES and attempt < self.retries:
+                await resp.read()
+                self._release(reader, writer, resp)
+                attempt += 1
+                await asyncio.sleep(self.backoff * attempt)
+                continue
+            if resp.status >= 400:
+                detail = (await resp.read()).decode("utf-8", "ignore")
+                self._release(reader, writer, resp)
+                try:
+                    detail = json.loads(detail).get("error", detail)
+                except (ValueError, AttributeError):
+                    pass
+                raise OllamaError(f"Ollama {path} returned {resp.status}: {detail}", status=resp.status)
+            return reader, writer, resp
+
+        raise OllamaError(f"Could not reach Ollama at {self.host}: {last_err}") from last_err
+
+    async def request_json(self, method: str, path: str, payload: dict | None = None,
+                           timeout: float | None = None) -> dict:
+        read_timeout = self.read_timeout if timeout is None else timeout
+        reader, writer, resp = await self.open(method, path, payload, timeout=timeout)
+        try:
+            raw = await asyncio.wait_for(resp.read(), read_timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            writer.close()
+            raise OllamaError(f"Connection lost while reading {path}: {e}") from e
+        except asyncio.CancelledError:
+            writer.close()
+            raise
+        self._release(reader, writer, resp)
+        return json.loads(raw) if raw else {}
+
+    def _payload(self, prompt: str, model: str, stream: bool, options: dict | None, extra: dict) -> dict:
+        payload = {"model": model, "prompt": prompt, "stream": stream}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        return payload
+
+    async def generate(self, prompt: str, model: str, options: dict | None = None,
+                       timeout: float | None = None, **extra) -> dict:
+        payload = self._payload(prompt, model, False, options, extra)
+        return await self.request_json("POST", "/api/generate", payload, timeout=timeout)
+
+    async def generate_stream(self, prompt: str, model: str, options: dict | None = None,
+                              timeout: float | None = None, **extra):
+        """Async generator of NDJSON chunks; closing it early hangs up on the server."""
+        payload = self._payload(prompt, model, True, options, extra)
+        read_timeout = self.read_timeout if timeout is None else timeout
+        reader, writer, resp = await self.open("POST", "/api/generate", payload, timeout=timeout)
+        finished = False
+        lines = resp.iter_lines()
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), read_timeout)
+                except StopAsyncIteration:
+                    break
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaError(f"Ollama stream error: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    finished = True
+                    break
+        except asyncio.TimeoutError as e:
+            raise OllamaTimeout(f"Timed out after {read_timeout}s reading stream") from e
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise OllamaError(f"Connection lost while streaming: {e}") from e
+        finally:
+            if finished:
+                async for _ in lines:  # drain the terminating chunk
+                    pass
+                self._release(reader, writer, resp)
+            else:
+                writer.close()
+            await lines.aclose()
+
+    async def supports_structured_output(self) -> bool:
+        if self.structured is None:
+            try:
+                res = await self.request_json("GET", "/api/version", timeout=self.connect_timeout)
+            except (OllamaError, ValueError):
+                return False
+            self.structured = version_at_least(res.get("version", ""), STRUCTURED_MIN_VERSION)
+        return self.structured
+
+
+def async_client_for(host: str, **overrides) -> AsyncOllamaClient:
+    env = os.environ
+    kwargs = dict(
+        pool_size=int(env.get("OLLAMA_ASYNC_POOL_SIZE", "16")),
+        connect_timeout=float(env.get("OLLAMA_CONNECT_TIMEOUT", "2.0")),
+        read_timeout=float(env.get("OLLAMA_READ_TIMEOUT", "60.0")),
+        retries=int(env.get("OLLAMA_RETRIES", "2")),
+        keep_alive=_keep_alive_from_env(env.get("OLLAMA_KEEP_ALIVE", "30m")),
+    )
+    kwargs.update(overrides)
+    return AsyncOllamaClient(host=host, **kwargs)
+
+
+def async_client_from_env() -> AsyncOllamaClient:
+    """Same choice as `client_from_env`: one host, or a router over OLLAMA_HOSTS."""
+    if os.environ.get("OLLAMA_HOSTS"):
+        from .router import async_router_from_env
+        return async_router_from_env()
+    return async_client_for(os.environ.get("OLLAMA_HOST", DEFAULT_HOST))
@@ -0,0 +1,270 @@
+"""
+asyncio version of `nlp.pipeline.parse_utterance` for the ASGI server.
+
+Same tiers (regex -> learned -> cache -> skeleton -> model) and merge rules. Model calls go through
+`AsyncOllamaClient` and are coalesced: concurrent requests for the same
+(utterance, model, prompt) share one in-flight generation (single-flight),
+which is cancelled once every request sharing it has run out of time.
+"""
+import asyncio
+import time
+
+from .admission import DEADLINE, AsyncModelGate, Overloaded, check_deadline, queue_size, remaining
+from .async_client import AsyncOllamaClient, async_client_from_env
+from .cache import cache_key, get_cache
+from .json_stream import JsonObjectScanner
+from .metrics import MODEL_INFLIGHT, MODEL_OUTPUT_TOKENS, OUTCOMES, STAGE_SECONDS
+from .ollama_client import OllamaError
+from .ollama_runner import (
+    STREAM_DEFAULT,
+    STRUCTURED_MODE,
+    call_timeout,
+    model_prompt,
+    only_fields,
+    parse_model_output,
+    parse_structured_output,
+    structured_payload,
+)
+from .pipeline import (
+    TIER_CACHE,
+    TIER_MODEL,
+    TIER_REGEX,
+    TIER_SKELETON,
+    _learned_tier,
+    _regex_tier,
+    batch_concurrency,
+    bypass_threshold,
+    degraded,
+    merge,
+    model_fields,
+)
+from .router import backend_capacity
+from .skeleton_cache import lookup as skeleton_lookup
+
+
+async def arun_tinyllama_json(client: AsyncOllamaClient, utterance: str,
+                              model_name: str = "room-nlu", timeout: float | None = None,
+                              stream: bool | None = None, timings: dict | None = None,
+                              fields: tuple | None = None, deadline: float | None = None) -> dict:
+    """Async `run_tinyllama_json`: schema-constrained when supported, else early stop on streamed JSON."""
+    t0 = time.perf_counter()
+    prompt = model_prompt(utterance, fields)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="prompt_build")
+    stream = STREAM_DEFAULT if stream is None else stream
+    timings = {} if timings is None else timings
+    timeout = call_timeout(timeout, deadline)
+    with MODEL_INFLIGHT.track():
+        try:
+            raw, blob = None, None
+            if await ause_structured(client):
+                raw = await agenerate_structured(client, prompt, model_name, timeout, timings,
+                                                 **structured_payload(fields))
+            structured = raw is not None
+            if not structured:
+                raw, blob = await _agenerate(client, prompt, model_name, timeout, stream, timings, deadline)
+        except Overloaded:
+            raise
+        except Exception as e:
+            if isinstance(e, OllamaError) and deadline is not None and remaining(deadline) <= 0:
+                raise Overloaded(DEADLINE) from e
+            OUTCOMES.inc(outcome="model_error")
+            raise
+    STAGE_SECONDS.observe(timings["generate"], stage="model_wait")
+    MODEL_OUTPUT_TOKENS.observe(timings["tokens"])
+    if structured:
+        return only_fields(parse_structured_output(raw), fields)
+    return only_fields(parse_model_output(raw, blob), fields)
+
+
+async def ause_structured(client: AsyncOllamaClient) -> bool:
+    if STRUCTURED_MODE == "off":
+        return False
+    if STRUCTURED_MODE == "on":
+        return client.structured is not False
+    return await client.supports_structured_output()
+
+
+async def agenerate_structured(client: AsyncOllamaClient, prompt: str, model_name: str,
+                               timeout: float | None, timings: dict, **kwargs) -> str | None:
+    """Async `generate_structured`; None if the server rejects the schema."""
+    kwargs = {**structured_payload(), **kwargs}
+    t0 = time.perf_counter()
+    try:
+        res = await client.generate(prompt, model_name, timeout=timeout, **kwargs)
+    except OllamaError as e:
+        if e.status != 400:
+            raise
+        client.structured = False
+        return None
+    timings["generate"] = time.perf_counter() - t0
+    timings["tokens"] = res.get("eval_count", 0)
+    return res.get("response", "")
+
+
+async def _agenerate(client: AsyncOllamaClient, prompt: str, model_name: str, timeout: float | None,
+                     stream: bool, timings: dict, deadline: float | None = None) -> tuple[str, str | None]:
+    t0 = time.perf_counter()
+    if not stream:
+        res = await client.generate(prompt, model_name, timeout=timeout)
+        timings["generate"] = time.perf_counter() - t0
+        timings["tokens"] = res.get("eval_count", 0)
+        return res.get("response", "").strip(), None
+
+    scanner = JsonObjectScanner()
+    tokens = 0
+    chunks = client.generate_stream(prompt, model_name, timeout=timeout)
+    try:
+        async for chunk in chunks:
+            piece = chunk.get("response", "")
+            tokens += bool(piece)
+            if piece and "ttft" not in timings:
+                timings["ttft"] = time.perf_counter() - t0
+            if scanner.feed(piece) is not None:
+                timings["json_complete"] = time.perf_counter() - t0
+                timings["early_stop"] = not chunk.get("done", False)
+                break
+            check_deadline(deadline)
+    finally:
+        await chunks.aclose()
+    timings["generate"] = time.perf_counter() - t0
+    timings["tokens"] = tokens
+    return scanner.text.strip(), scanner.result
+
+
+class Flight:
+    """One in-flight call: its task, how many callers await it, and their latest deadline."""
+
+    __slots__ = ("task", "waiters", "deadline")
+
+    def __init__(self, deadline: float | None):
+        self.task: asyncio.Task | None = None
+        self.waiters = 0
+        self.deadline = deadline
+
+    def join(self, deadline: float | None) -> None:
+        # None (no deadline) outlasts any deadline
+        if self.deadline is not None:
+            self.deadline = None if deadline is None else max(self.deadline, deadline)
+
+
+class SingleFlight:
+    """
+    Run one coroutine per key; concurrent callers await the same result.
+    `fn` gets the Flight, whose `deadline` is the latest of its callers'.
+    The call is cancelled once every caller has stopped waiting.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, Flight] = {}
+        self.stats = {"leaders": 0, "followers": 0, "abandoned": 0}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn, deadline: float | None = None):
+        flight = self._calls.get(key)
+        if flight is None or flight.waiters == 0:  # none yet, or abandoned and cancelling
+            flight = Flight(deadline)
+            flight.task = asyncio.ensure_future(fn(flight))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda t, k=key, f=flight: self._done(k, f))
+            self.stats["leaders"] += 1
+        else:
+            flight.join(deadline)
+            self.stats["followers"] += 1
+        flight.waiters += 1
+        try:
+            # shield: one impatient caller must not cancel the call for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()  # nobody is left to use the answer
+                self.stats["abandoned"] += 1
+
+    def _done(self, key: str, flight: Flight) -> None:
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # every caller may have stopped waiting (deadline)
+
+    async def wait_all(self) -> None:
+        if self._calls:
+            await asyncio.gather(*(f.task for f in self._calls.values()), return_exceptions=True)
+
+
+class AsyncParser:
+    def __init__(self, client: AsyncOllamaClient | None = None):
+        self.client = client or async_client_from_env()
+        self.flights = SingleFlight()
+        self.gate = AsyncModelGate(batch_concurrency(), queue_size(), scale=backend_capacity(self.client))
+
+    async def _model_call(self, flight: Flight, key: str, utterance: str, model_name: str,
+                          fields: tuple | None, skeleton=None) -> dict:
+        """
+        The shared call behind every coalesced request. Admission and the
+        model call are bounded by the latest deadline among the callers that
+        have joined so far, not the first one's, and SingleFlight cancels
+        the call (freeing its gate slot or queue place) once every caller
+        has given up.
+        """
+        async with self.gate.admit(flight.deadline):
+            model_out = await arun_tinyllama_json(self.client, utterance, model_name, fields=fields,
+                                                  deadline=flight.deadline)
+        cache = get_cache()
+        if cache is not None:
+            cache.put(key, model_out)
+        if skeleton is not None:
+            skeleton.store(model_out)
+        return model_out
+
+    async def parse(self, utterance: str, model_name: str = "room-nlu",
+                    threshold: float | None = None, force_model: bool = False,
+                    deadline: float | None = None) -> dict:
+        """
+        Same return shape as `parse_utterance`. Requests sharing an in-flight
+        call each stop waiting at their own `deadline`.
+        """
+        if threshold is None:
+            threshold = bypass_threshold()
+        answer, partial = _regex_tier(utterance, threshold, force_model)
+        if answer is not None:
+            return answer
+        answer = _learned_tier([utterance], [partial], force_model)[0]
+        if answer is not None:
+            return answer
+        regex_out, score, spans = partial
+        fields = model_fields(regex_out, force_model)
+        if fields == ():
+            return {"result": merge(utterance, regex_out, {}, spans), "tier": TIER_REGEX, "confidence": score}
+        if fields is not None:
+            OUTCOMES.inc(outcome="gap_fill")
+
+        key = cache_key(utterance, model_name, fields=fields)
+        cache = get_cache()
+        model_out = cache.get(key) if cache is not None else None
+        tier = TIER_CACHE
+        skeleton = None
+        if model_out is None:
+            model_out, skeleton = skeleton_lookup(utterance, model_name, fields)
+            tier = TIER_SKELETON
+        if model_out is not None:
+            OUTCOMES.inc(outcome="cache_hit" if tier == TIER_CACHE else "skeleton_hit")
+            if tier == TIER_SKELETON and cache is not None:
+                cache.put(key, model_out)
+        else:
+            flight = self.flights.do(
+                key, lambda f: self._model_call(f, key, utterance, model_name, fields, skeleton), deadline
+            )
+            try:
+                model_out = dict(await asyncio.wait_for(flight, remaining(deadline)))
+            except asyncio.TimeoutError:
+                return degraded(utterance, partial, DEADLINE)
+            except Overloaded as e:
+                return degraded(utterance, partial, e.reason)
+            tier = TIER_MODEL
+        return {"result": merge(utterance, regex_out, model_out, spans), "tier": tier, "confidence": score}
+
+    async def close(self) -> None:
+        await self.flights.wait_all()
+        await self.client.close()
@@ -0,0 +1,357 @@
+"""
+In-memory booking index that executes the Param-JSON templates.
+
+Bookings are indexed by date, then room, as three parallel arrays sorted by
+start minute: start, end and numeric booking id. A room never holds two
+overlapping bookings, so the arrays are sorted by end too, and a conflict
+check is a single bisect: the first booking that ends after the requested
+start conflicts exactly when it also starts before the requested end.
+
+"Which rooms are free" only visits the rooms that have bookings on that
+date; every other known room is free outright. Cancellation goes through a
+hash index from booking id to (date, room, start).
+
+    index = BookingIndex()
+    bk = index.book("lh-204", "2025-09-12", "14:00", "15:30")   # "BK-0001"
+    index.conflicts("lh-204", "2025-09-12", "15:00", "16:00")   # ["BK-0001"]
+    index.free_rooms("2025-09-12", "14:00", "15:00")
+    execute(compile_param_json(fields), index)
+
+This is a fast index in front of the system of record, not a replacement
+for it: it lives in process memory.
+
+Configuration (environment, optional):
+    BOOKING_ROOMS   comma-separated room ids known to the shared index
+"""
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable
+
+DAY_MINUTES = 24 * 60
+_BK_RE = re.compile(r"^BK-(\d+)$", re.I)
+_HHMM_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+MAX_BOOKING_ID = (1 << 8 * array("L").itemsize) - 1  # what _Day.ids can hold
+
+
+class BookingError(ValueError):
+    """A request the index cannot carry out (bad arguments, unknown id)."""
+
+
+class BookingConflict(BookingError):
+    def __init__(self, conflicts: list[str]):
+        super().__init__(f"conflicts with {', '.join(conflicts)}")
+        self.conflicts = conflicts
+
+
+def to_minutes(t: str | int) -> int:
+    """"14:30" -> 870; "24:00" is the end of the day. Ints pass through."""
+    if isinstance(t, int):
+        minutes = t
+    else:
+        m = _HHMM_RE.match(t or "")
+        if not m:
+            raise BookingError(f"invalid time {t!r}")
+        minutes = int(m[1]) * 60 + int(m[2])
+    if not 0 <= minutes <= DAY_MINUTES:
+        raise BookingError(f"time out of range: {t!r}")
+    return minutes
+
+
+def to_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_booking_id(booking_id: str) -> int:
+    m = _BK_RE.match((booking_id or "").strip())
+    if not m:
+        raise BookingError(f"invalid booking id {booking_id!r}")
+    return check_booking_id(int(m[1]))
+
+
+def check_booking_id(n: int) -> int:
+    if not 0 <= n <= MAX_BOOKING_ID:
+        raise BookingError(f"booking id out of range: {n}")
+    return n
+
+
+def format_booking_id(n: int) -> str:
+    return f"BK-{n:04d}"
+
+
+class _Day:
+    """One room's bookings on one date, sorted by start (and so by end)."""
+    __slots__ = ("starts", "ends", "ids")
+
+    def __init__(self):
+        self.starts = array("H")
+        self.ends = array("H")
+        self.ids = array("L")
+
+    def overlapping(self, start: int, end: int) -> range:
+        """Positions of the bookings overlapping [start, end)."""
+        first = bisect_right(self.ends, start)
+        last = first
+        while last < len(self.starts) and self.starts[last] < end:
+            last += 1
+        return range(first, last)
+
+    def is_free(self, start: int, end: int) -> bool:
+        i = bisect_right(self.ends, start)
+        return i == len(self.starts) or self.starts[i] >= end
+
+    def insert(self, start: int, end: int, n: int) -> None:
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, n)
+
+    def remove(self, start: int, n: int) -> None:
+        i = bisect_left(self.starts, start)
+        while self.ids[i] != n:
+            i += 1
+        del self.starts[i], self.ends[i], self.ids[i]
+
+
+class BookingIndex:
+    def __init__(self, rooms: Iterable[str] = ()):
+        self._days: dict[str, dict[str, _Day]] = {}  # date -> room -> bookings
+        self._by_id: dict[int, tuple[str, str, int]] = {}  # id -> (date, room, start)
+        self.rooms: dict[str, int | None] = {}  # room -> capacity
+        self._next_id = 1
+        self._lock = threading.Lock()
+        for room in rooms:
+            self.add_room(room)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add_room(self, room: str, capacity: int | None = None) -> None:
+        self.rooms[room] = capacity
+
+    @staticmethod
+    def _window(start, end) -> tuple[int, int]:
+        s, e = to_minutes(start), to_minutes(end)
+        if s >= e:
+            raise BookingError("invalid_time_range")
+        return s, e
+
+    def _ids(self, day: _Day, positions: range) -> list[str]:
+        return [format_booking_id(day.ids[i]) for i in positions]
+
+    # -------------------
+    # Queries
+    # -------------------
+    def conflicts(self, room: str, date: str, start, end) -> list[str]:
+        """Ids of the bookings of `room` overlapping [start, end) on `date`."""
+        s, e = self._window(start, end)
+        with self._lock:
+            day = self._days.get(date, {}).get(room)
+            return self._ids(day, day.overlapping(s, e)) if day else []
+
+    def is_free(self, room: str, date: str, start, end) -> bool:
+        s, e = self._window(start, end)
+        with self._lock:
+            day = self._days.get(date, {}).get(room)
+            return day is None or day.is_free(s, e)
+
+    def free_rooms(self, date: str, start, end, rooms: Iterable[str] | None = None,
+                   min_capacity: int | None = None) -> list[str]:
+        """Rooms (default: every known room) with nothing booked in [start, end) on `date`."""
+        s, e = self._window(start, end)
+        with self._lock:
+            booked = self._days.get(date, {})
+            candidates = self.rooms if rooms is None else rooms
+            out = []
+            for room in candidates:
+                if min_capacity is not None and (self.rooms.get(room) or 0) < min_capacity:
+                    continue
+                day = booked.get(room)
+                if day is None or day.is_free(s, e):
+                    out.append(room)
+            return out
+
+    def bookings(self, room: str, date: str) -> list[dict]:
+        with self._lock:
+            day = self._days.get(date, {}).get(room)
+            if day is None:
+                return []
+            return [{"booking_id": format_booking_id(n), "start": to_hhmm(s), "end": to_hhmm(e)}
+                    for s, e, n in zip(day.starts, day.ends, day.ids)]
+
+    def get(self, booking_id: str) -> dict:
+        n = parse_booking_id(booking_id)
+        with self._lock:
+            return self._describe(n)
+
+    def _describe(self, n: int) -> dict:
+        try:
+            date, room, start = self._by_id[n]
+        except KeyError:
+            raise BookingError(f"unknown booking {format_booking_id(n)}") from None
+        day = self._days[date][room]
+        i = bisect_left(day.starts, start)
+        return {"booking_id": format_booking_id(n), "room_id": room, "date": date,
+                "start": to_hhmm(start), "end": to_hhmm(day.ends[i])}
+
+    # -------------------
+    # Changes
+    # -------------------
+    def _insert(self, room: str, date: str, s: int, e: int, n: int) -> None:
+        check_booking_id(n)  # before touching the parallel arrays
+        if n in self._by_id:
+            raise BookingError(f"booking {format_booking_id(n)} already exists")
+        day = self._days.setdefault(date, {}).get(room)
+        if day is None:
+            day = self._days[date][room] = _Day()
+        elif not day.is_free(s, e):
+            raise BookingConflict(self._ids(day, day.overlapping(s, e)))
+        day.insert(s, e, n)
+        self._by_id[n] = (date, room, s)
+        self.rooms.setdefault(room, None)
+
+    def _delete(self, n: int) -> tuple[str, str, int]:
+        date, room, start = self._by_id.pop(n)
+        rooms = self._days[date]
+        rooms[room].remove(start, n)
+        if not rooms[room].starts:
+            del rooms[room]
+        return date, room, start
+
+    def book(self, room: str, date: str, start, end, booking_id: str | None = None) -> str:
+        """Book [start, end) and return the booking id; raises BookingConflict."""
+        s, e = self._window(start, end)
+        with self._lock:
+            n = self._next_id if booking_id is None else parse_booking_id(booking_id)
+            self._insert(room, date, s, e, n)
+            self._next_id = max(self._next_id, n + 1)
+            return format_booking_id(n)
+
+    def cancel(self, booking_id: str) -> dict:
+        n = parse_booking_id(booking_id)
+        with self._lock:
+            booking = self._describe(n)
+            self._delete(n)
+            return booking
+
+    def reschedule(self, booking_id: str, date: str | None = None,
+                   start=None, end=None, room: str | None = None) -> dict:
+        """Move a booking; unspecified parts stay. On a conflict it stays where it was."""
+        n = parse_booking_id(booking_id)
+        with self._lock:
+            old = self._describe(n)
+            s, e = self._window(start or old["start"], end or old["end"])
+            self._delete(n)
+            try:
+                self._insert(room or old["room_id"], date or old["date"], s, e, n)
+            except BookingConflict:
+                self._insert(old["room_id"], old["date"], to_minutes(old["start"]), to_minutes(old["end"]), n)
+                raise
+            return self._describe(n)
+
+    def bulk_load(self, rows: Iterable[tuple]) -> int:
+        """
+        Load (room, date, start, end[, booking_id]) rows, much faster than
+        `book` per row: each room-day is sorted once. Rows that overlap an
+        earlier one are skipped; returns how many were.
+        """
+        grouped: dict[tuple[str, str], list[tuple[int, int, int]]] = {}
+        with self._lock:
+            for row in rows:
+                room, date, start, end = row[:4]
+                s, e = self._window(start, end)
+                if len(row) > 4 and row[4] is not None:
+                    n = parse_booking_id(row[4]) if isinstance(row[4], str) else check_booking_id(row[4])
+                else:
+                    n = check_booking_id(self._next_id)
+                self._next_id = max(self._next_id, n + 1)
+                grouped.setdefault((date, room), []).append((s, e, n))
+            skipped = 0
+            for (date, room), items in grouped.items():
+                day = self._days.setdefault(date, {}).get(room)
+                if day is not None:  # merging into existing bookings: one at a time
+                    for s, e, n in items:
+                        try:
+                            self._insert(room, date, s, e, n)
+                        except BookingError:
+                            skipped += 1
+                    continue
+                day = _Day()
+                last_end = -1
+                for s, e, n in sorted(items):
+                    if s < last_end or n in self._by_id:
+                        skipped += 1
+                        continue
+                    day.starts.append(s)
+                    day.ends.append(e)
+                    day.ids.append(n)
+                    self._by_id[n] = (date, room, s)
+                    last_end = e
+                if day.starts:
+                    self._days[date][room] = day
+                self.rooms.setdefault(room, None)
+            return skipped
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"bookings": len(self._by_id), "rooms": len(self.rooms), "dates": len(self._days)}
+
+
+# -------------------
+# Param-JSON templates
+# -------------------
+def _require(args: dict, *names: str) -> None:
+    missing = [n for n in names if not args.get(n)]
+    if missing:
+        raise BookingError(f"missing {', '.join(missing)}")
+
+
+def execute(param_json: dict, index: BookingIndex | None = None) -> dict:
+    """
+    Run a compiled template against `index` (default: the shared one).
+    Returns {"ok": True, ...} or {"ok": False, "error": ...}; a conflict
+    also lists the "conflicts".
+    """
+    index = index if index is not None else get_index()
+    template, args = param_json.get("template"), param_json.get("args") or {}
+    try:
+        if template == "book_v1":
+            _require(args, "room_id", "date", "start", "end")
+            return {"ok": True, "booking_id": index.book(args["room_id"], args["date"], args["start"], args["end"])}
+        if template == "check_v1":
+            _require(args, "date")
+            start, end = args.get("start") or 0, args.get("end") or DAY_MINUTES  # no times: whole day
+            if args.get("room_id"):
+                conflicts = index.conflicts(args["room_id"], args["date"], start, end)
+                return {"ok": True, "free": not conflicts, "conflicts": conflicts}
+            return {"ok": True, "free_rooms": index.free_rooms(args["date"], start, end,
+                                                               min_capacity=args.get("capacity"))}
+        if template == "cancel_v1":
+            _require(args, "booking_id")
+            return {"ok": True, "cancelled": index.cancel(args["booking_id"])}
+        if template == "modify_v1":
+            _require(args, "booking_id")
+            return {"ok": True, "booking": index.reschedule(args["booking_id"], args.get("date"),
+                                                            args.get("start"), args.get("end"))}
+    except BookingConflict as e:
+        return {"ok": False, "error": "conflict", "conflicts": e.conflicts}
+    except BookingError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": False, "error": f"nothing to execute for template {template!r}"}
+
+
+_default_index: BookingIndex | None = None
+_default_lock = threading.Lock()
+
+
+def get_index() -> BookingIndex:
+    """Process-wide index, seeded with the BOOKING_ROOMS room ids."""
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                rooms = os.environ.get("BOOKING_ROOMS", "")
+                _default_index = BookingIndex(r.strip() for r in rooms.split(",") if r.strip())
+    return _default_index
@@ -0,0 +1,197 @@
+"""
+Offline bulk parser for JSONL request logs.
+
+    python -m nlp.bulk_parse logs.jsonl parsed.jsonl --field utterance \\
+        --processes 4 --concurrency 4
+
+Input is streamed in chunks (constant memory). The regex tier runs in a
+process pool, records that need the model go to it through at most
+`--concurrency` calls, and each output line is the input record plus a
+"parse" object shaped like a /parse response. After every chunk the output
+is flushed and a checkpoint (input byte offset + output size) is written,
+so rerunning the same command after a crash resumes where it stopped.
+The checkpoint also records what the output depends on (input size and
+mtime, prompt fingerprint, model, bypass threshold, field); if any of it
+changed, or the output is gone or shorter than checkpointed, the run
+starts over instead of resuming or reporting "already complete".
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .cache import prompt_fingerprint
+from .pipeline import _learned_tier, _model_tier, _regex_tier, batch_concurrency, bypass_threshold, flatten_item
+
+
+def _regex_stage(args: tuple) -> tuple:
+    """Runs in a worker process; match objects are dropped (not picklable)."""
+    utterance, threshold, force_model = args
+    answer, partial = _regex_tier(utterance, threshold, force_model)
+    if partial is not None:
+        regex_out, score, _spans = partial
+        partial = (regex_out, score, None)
+    return answer, partial
+
+
+def read_chunks(f, chunk_size: int):
+    """Yield lists of (line_bytes, end_offset) from a binary file."""
+    chunk = []
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        chunk.append((line, f.tell()))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_identity(src: str, dst: str, field: str, model_name: str, threshold: float,
+                 force_model: bool) -> dict:
+    """Everything a checkpoint's output depends on; a resume requires all of it to match."""
+    st = os.stat(src)
+    return {"input": os.path.abspath(src), "output": os.path.abspath(dst),
+            "input_size": st.st_size, "input_mtime_ns": st.st_mtime_ns,
+            "prompt": prompt_fingerprint(), "model": model_name, "threshold": threshold,
+            "force_model": force_model, "field": field}
+
+
+def load_checkpoint(path: str, identity: dict) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            ckpt = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(ckpt, dict) or any(ckpt.get(k) != v for k, v in identity.items()):
+        return None
+    try:
+        if os.path.getsize(identity["output"]) < ckpt.get("output_size", 0):
+            return None  # truncate() would pad the gap with NUL bytes
+    except OSError:
+        return None  # output deleted
+    return ckpt
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def process_chunk(chunk, field: str, model_name: str, threshold: float, force_model: bool,
+                  procs: ProcessPoolExecutor, threads: ThreadPoolExecutor) -> list[dict]:
+    records: list[dict] = []
+    jobs: list[tuple[int, str]] = []
+    for line, _ in chunk:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            records.append({"parse": {"error": "invalid JSON line"}})
+            continue
+        if not isinstance(rec, dict):
+            rec = {"value": rec}
+        utterance = rec.get(field)
+        if not isinstance(utterance, str) or not utterance.strip():
+            rec["parse"] = {"error": f"{field} is required"}
+        else:
+            jobs.append((len(records), utterance.strip()))
+        records.append(rec)
+
+    stage = procs.map(_regex_stage, [(u, threshold, force_model) for _, u in jobs],
+                      chunksize=max(1, len(jobs) // 32))
+    model_jobs = []
+    for (idx, utterance), (answer, partial) in zip(jobs, stage):
+        if answer is not None:
+            records[idx]["parse"] = flatten_item(answer)
+        else:
+            model_jobs.append((idx, utterance, partial))
+
+    # one batched pass of the learned tier over everything regex left
+    learned = _learned_tier([u for _, u, _ in model_jobs], [p for _, _, p in model_jobs], force_model)
+    for (idx, _, _), answer in zip(model_jobs, learned):
+        if answer is not None:
+            records[idx]["parse"] = flatten_item(answer)
+    model_jobs = [job for job, answer in zip(model_jobs, learned) if answer is None]
+
+    def run_model(job):
+        idx, utterance, partial = job
+        try:
+            return idx, flatten_item(_model_tier(utterance, model_name, partial, force_model, gated=False))
+        except Exception as e:
+            return idx, {"error": f"{type(e).__name__}: {e}", "confidence": partial[1]}
+
+    for idx, parsed in threads.map(run_model, model_jobs):
+        records[idx]["parse"] = parsed
+    return records
+
+
+def run(src: str, dst: str, field: str = "utterance", model_name: str = "room-nlu",
+        processes: int | None = None, concurrency: int | None = None,
+        chunk_size: int = 512, checkpoint: str | None = None,
+        force_model: bool = False, log=sys.stderr) -> dict:
+    checkpoint = checkpoint or dst + ".ckpt"
+    threshold = bypass_threshold()
+    concurrency = concurrency or batch_concurrency()
+
+    identity = run_identity(src, dst, field, model_name, threshold, force_model)
+    ckpt = load_checkpoint(checkpoint, identity)
+    state = ckpt or {**identity, "input_offset": 0, "output_size": 0, "records": 0, "done": False}
+    if state.get("done"):
+        print(f"{dst} already complete ({state['records']} records)", file=log)
+        return state
+    if ckpt:
+        print(f"resuming at record {state['records']} (byte {state['input_offset']})", file=log)
+
+    t0 = time.perf_counter()
+    with open(src, "rb") as fin, open(dst, "ab" if ckpt else "wb") as fout, \
+            ProcessPoolExecutor(max_workers=processes) as procs, \
+            ThreadPoolExecutor(max_workers=concurrency) as threads:
+        if ckpt:
+            # drop anything written after the last checkpoint
+            fout.truncate(state["output_size"])
+            fout.seek(state["output_size"])
+            fin.seek(state["input_offset"])
+        for chunk in read_chunks(fin, chunk_size):
+            for rec in process_chunk(chunk, field, model_name, threshold, force_model, procs, threads):
+                fout.write(json.dumps(rec, ensure_ascii=False).encode("utf-8") + b"\n")
+            fout.flush()
+            os.fsync(fout.fileno())
+            state.update(input_offset=chunk[-1][1], output_size=fout.tell(),
+                         records=state["records"] + len(chunk))
+            save_checkpoint(checkpoint, state)
+            rate = state["records"] / max(time.perf_counter() - t0, 1e-9)
+            print(f"{state['records']} records ({rate:.0f}/s)", file=log)
+
+    state["done"] = True
+    save_checkpoint(checkpoint, state)
+    return state
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("input")
+    ap.add_argument("output")
+    ap.add_argument("--field", default="utterance", help="record key holding the utterance")
+    ap.add_argument("--model", default="room-nlu")
+    ap.add_argument("--processes", type=int, default=None, help="regex-tier worker processes")
+    ap.add_argument("--concurrency", type=int, default=None,
+                    help="concurrent model calls (default PARSE_BATCH_CONCURRENCY)")
+    ap.add_argument("--chunk-size", type=int, default=512, help="records per checkpoint")
+    ap.add_argument("--checkpoint", default=None, help="default: OUTPUT.ckpt")
+    ap.add_argument("--force-model", action="store_true", help="skip the regex bypass")
+    args = ap.parse_args(argv)
+    run(args.input, args.output, field=args.field, model_name=args.model,
+        processes=args.processes, concurrency=args.concurrency, chunk_size=args.chunk_size,
+        checkpoint=args.checkpoint, force_model=args.force_model)
+
+
+if __name__ == "__main__":
+    main()
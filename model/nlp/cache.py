@@ -0,0 +1,227 @@
+"""
+Result cache for model parses.
+
+The Modelfile pins temperature 0.0, so a model answer depends only on the
+utterance, the model name and the prompt. Entries are keyed on all three
+(the prompt as a fingerprint of the active prompt template, the Modelfile
+and the output mode: OLLAMA_STRUCTURED and OLLAMA_STREAM), so changing any
+of them changes every key and old entries simply stop matching.
+
+Memory tier: LRU with a per-entry TTL. Optional SQLite tier survives
+restarts; memory misses fall through to it and hits are promoted. Every
+few hundred writes (and on open) the SQLite tier drops expired rows and
+then the oldest rows beyond its own cap.
+
+Configuration (environment, all optional):
+    PARSE_CACHE_SIZE  1024   (entries in memory; 0 disables the cache)
+    PARSE_CACHE_TTL   86400  (seconds; 0 = never expire)
+    PARSE_CACHE_DB    unset  (path of the SQLite file)
+    PARSE_CACHE_DB_SIZE  100000  (rows kept in the SQLite file; 0 = no cap)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from .ollama_runner import STREAM_DEFAULT, STRUCTURED_MODE
+from .prompt import GAP_HEADER, get_template
+
+MODELFILE = Path(__file__).resolve().parent.parent / "Modelfile"
+_PRUNE_EVERY = 256  # SQLite writes between purges
+
+_fp_lock = threading.Lock()
+_fp_state: tuple[tuple, str] | None = None
+
+
+def _modelfile_mtime() -> float | None:
+    try:
+        return MODELFILE.stat().st_mtime
+    except OSError:
+        return None
+
+
+def prompt_fingerprint() -> str:
+    """
+    Short hash of the prompt template, the Modelfile and the output mode
+    (schema-constrained or free text, streamed or not: each path parses the
+    reply differently). Recomputed when the Modelfile mtime or the
+    PROMPT_TEMPLATE choice changes; template text changes need a restart
+    anyway.
+    """
+    global _fp_state
+    template = get_template()
+    mtime = _modelfile_mtime()
+    mode = f"structured={STRUCTURED_MODE};stream={int(STREAM_DEFAULT)}"
+    state = _fp_state
+    if state is not None and state[0] == (mtime, template.name, mode):
+        return state[1]
+    with _fp_lock:
+        h = hashlib.sha256(template.fingerprint().encode("utf-8"))
+        h.update(GAP_HEADER.encode("utf-8"))
+        h.update(mode.encode("utf-8"))
+        if mtime is not None:
+            h.update(MODELFILE.read_bytes())
+        _fp_state = ((mtime, template.name, mode), h.hexdigest()[:16])
+        return _fp_state[1]
+
+
+def normalize_utterance(utterance: str) -> str:
+    # Case is kept: the model copies spans verbatim, so "sjt 315" != "SJT 315".
+    return " ".join(utterance.split())
+
+
+def cache_key(utterance: str, model_name: str, fingerprint: str | None = None,
+              fields: tuple | None = None) -> str:
+    """`fields` marks a gap-filling answer, which only holds those fields."""
+    fingerprint = fingerprint or prompt_fingerprint()
+    if fields is not None:
+        model_name = f"{model_name}+{','.join(fields)}"
+    return f"{fingerprint}|{model_name}|{normalize_utterance(utterance)}"
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400.0, db_path: str | None = None,
+                 db_max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_max_entries = db_max_entries
+        self._mem: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                      "disk_evictions": 0}
+        self._db = None
+        self._writes = 0
+        if db_path:
+            import sqlite3  # only the persistent tier needs it
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS parse_cache_created ON parse_cache (created)")
+            self._prune(time.time())
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._mem.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return dict(entry[1])
+                del self._mem[key]
+                self.stats["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM parse_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        value = json.loads(row[0])
+                        self._store(key, row[1], value)
+                        self.stats["disk_hits"] += 1
+                        return dict(value)
+                    self._db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                    self.stats["expirations"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._store(key, now, dict(value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now),
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        # caller holds the lock (or is the constructor)
+        if self.ttl > 0:
+            cur = self._db.execute("DELETE FROM parse_cache WHERE created < ?", (now - self.ttl,))
+            self.stats["expirations"] += max(cur.rowcount, 0)
+        if self.db_max_entries > 0:
+            cur = self._db.execute(
+                "DELETE FROM parse_cache WHERE key IN ("
+                " SELECT key FROM parse_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.db_max_entries,),
+            )
+            self.stats["disk_evictions"] += max(cur.rowcount, 0)
+
+    def _store(self, key: str, created: float, value: dict) -> None:
+        # caller holds the lock
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._mem), "max_entries": self.max_entries}
+
+
+def cache_from_env() -> ResultCache | None:
+    env = os.environ
+    size = int(env.get("PARSE_CACHE_SIZE", "1024"))
+    if size <= 0:
+        return None
+    return ResultCache(
+        max_entries=size,
+        ttl=float(env.get("PARSE_CACHE_TTL", "86400")),
+        db_path=env.get("PARSE_CACHE_DB") or None,
+        db_max_entries=int(env.get("PARSE_CACHE_DB_SIZE", "100000")),
+    )
+
+
+_default_cache: ResultCache | None = None
+_default_loaded = False
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache | None:
+    """Process-wide cache built from the environment; None when disabled."""
+    global _default_cache, _default_loaded
+    if not _default_loaded:
+        with _default_lock:
+            if not _default_loaded:
+                _default_cache = cache_from_env()
+                _default_loaded = True
+    return _default_cache
+
+
+def cached_run(utterance: str, model_name: str, run, fields: tuple | None = None) -> tuple[dict, bool]:
+    """
+    Look up (utterance, model, prompt[, fields]) and call `run()` on a miss.
+    Returns (model_output, was_cached). Failures are not cached.
+    """
+    cache = get_cache()
+    if cache is None:
+        return run(), False
+    key = cache_key(utterance, model_name, fields=fields)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit, True
+    value = run()
+    cache.put(key, value)
+    return value, False
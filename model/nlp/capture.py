@@ -0,0 +1,217 @@
+"""
+Traffic capture: the API's parse requests, written to a rotating JSONL log
+for replay (`bench.replay`) and as training/eval data (`nlp.slot_model`,
+`bench.threshold_eval` read the same lines).
+
+One line per request:
+
+    {"ts": 1726051200.123, "endpoint": "/parse", "status": 200,
+     "latency_ms": 12.4, "tier": "regex",
+     "request": {"utterance": "...", ...}, "response": {"intent": ..., "tier": ...}}
+
+"ts" is the wall-clock arrival time, so the gaps between lines are the
+original inter-arrival times. Request handlers only put the record on a
+bounded queue (no I/O, no JSON encoding); one background thread encodes and
+writes in batches. When the queue is full the record is dropped and counted
+instead of slowing the request down. The file rotates by size like
+`logging.handlers.RotatingFileHandler`: PATH.1 is the newest backup.
+
+Utterances are user text: capture is off unless PARSE_CAPTURE_PATH is set.
+
+Configuration (environment, all optional):
+    PARSE_CAPTURE_PATH       unset  (JSONL file; unset disables capture)
+    PARSE_CAPTURE_MAX_BYTES  67108864  (rotate when the file passes this)
+    PARSE_CAPTURE_BACKUPS    5      (rotated files kept)
+    PARSE_CAPTURE_SAMPLE     1.0    (fraction of requests captured)
+    PARSE_CAPTURE_QUEUE      10000  (records buffered before dropping)
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Iterable, Iterator
+
+_STOP = object()
+
+
+class TrafficCapture:
+    def __init__(self, path: str, max_bytes: int = 64 << 20, backups: int = 5, sample: float = 1.0,
+                 queue_size: int = 10000, flush_interval: float = 1.0, batch: int = 512):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample = sample
+        self.flush_interval = flush_interval
+        self.batch = batch
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"captured": 0, "written": 0, "dropped": 0, "rotations": 0, "write_errors": 0}
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # request threads and the writer both count
+
+    def start(self) -> "TrafficCapture":
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                self._thread.start()
+        return self
+
+    def record(self, endpoint: str, request: dict | None, response, status: int,
+               latency: float, ts: float | None = None) -> None:
+        """
+        Queue one request; never blocks. `response` may be a dict or the raw
+        JSON bytes of the reply (decoded on the writer thread).
+        """
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return
+        item = (time.time() - latency if ts is None else ts, endpoint, status, latency, request, response)
+        try:
+            self._queue.put_nowait(item)
+            self._count("captured")
+        except queue.Full:
+            self._count("dropped")
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # -------------------
+    # Writer thread
+    # -------------------
+    @staticmethod
+    def _encode(item: tuple) -> bytes:
+        ts, endpoint, status, latency, request, response = item
+        if isinstance(response, (bytes, bytearray)):
+            try:
+                response = json.loads(response)
+            except ValueError:
+                response = None
+        rec = {"ts": round(ts, 6), "endpoint": endpoint, "status": status,
+               "latency_ms": round(latency * 1000, 3),
+               "tier": response.get("tier") if isinstance(response, dict) else None,
+               "request": request, "response": response}
+        return json.dumps(rec, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def _rotate(self, f):
+        f.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._count("rotations")
+        return open(self.path, "ab")
+
+    def _run(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        f = open(self.path, "ab")
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                items = [first]
+                while len(items) < self.batch:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if _STOP in items:
+                    stopping = True
+                    items = [i for i in items if i is not _STOP]
+                lines = []
+                for item in items:
+                    try:
+                        lines.append(self._encode(item))
+                    except (TypeError, ValueError):
+                        self._count("write_errors")  # one unencodable record, not the batch
+                try:
+                    f.write(b"".join(lines))
+                    f.flush()
+                    self._count("written", len(lines))
+                    if self.max_bytes > 0 and f.tell() >= self.max_bytes:
+                        f = self._rotate(f)
+                except OSError:
+                    self._count("write_errors", len(lines))
+        finally:
+            f.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out what is queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "queued": self._queue.qsize(), "path": self.path}
+
+
+def capture_from_env() -> TrafficCapture | None:
+    env = os.environ
+    path = env.get("PARSE_CAPTURE_PATH")
+    if not path:
+        return None
+    return TrafficCapture(
+        path,
+        max_bytes=int(env.get("PARSE_CAPTURE_MAX_BYTES", str(64 << 20))),
+        backups=int(env.get("PARSE_CAPTURE_BACKUPS", "5")),
+        sample=float(env.get("PARSE_CAPTURE_SAMPLE", "1.0")),
+        queue_size=int(env.get("PARSE_CAPTURE_QUEUE", "10000")),
+    )
+
+
+_default_capture: TrafficCapture | None = None
+_default_loaded = False
+_default_lock = threading.Lock()
+
+
+def get_capture() -> TrafficCapture | None:
+    """Process-wide capture built from the environment and started; None when disabled."""
+    global _default_capture, _default_loaded
+    if not _default_loaded:
+        with _default_lock:
+            if not _default_loaded:
+                _default_capture = capture_from_env()
+                if _default_capture is not None:
+                    _default_capture.start()
+                    atexit.register(_default_capture.close)
+                _default_loaded = True
+    return _default_capture
+
+
+def capture_files(path: str) -> list[str]:
+    """`path` and its rotated backups, oldest first."""
+    backups = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        backups.append(f"{path}.{i}")
+        i += 1
+    return backups[::-1] + ([path] if os.path.exists(path) else [])
+
+
+def read_capture(paths: Iterable[str]) -> Iterator[dict]:
+    """Records from capture files in order; unreadable lines are skipped."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and "ts" in rec:
+                    yield rec
@@ -0,0 +1,53 @@
+"""
+Incremental scanner for the first top-level JSON object in streamed text.
+
+Unlike `_extract_first_json`, it is string-aware (braces inside "..." do not
+count) and is fed chunk by chunk, so generation can be stopped the moment
+the object closes instead of after the model finishes chatting.
+"""
+
+
+class JsonObjectScanner:
+    def __init__(self):
+        self._buf: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self.text = ""  # everything fed so far
+        self.result: str | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> str | None:
+        """Consume a chunk; return the complete object once it has closed."""
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+        for ch in chunk:
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._buf.append(ch)
+                continue
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.result = "".join(self._buf)
+                    return self.result
+        return None
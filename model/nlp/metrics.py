@@ -0,0 +1,221 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Recording is a dict lookup plus an add under a per-metric lock, so leaving
+the metrics on costs next to nothing when nobody scrapes; all formatting
+happens in `render()`, on the /metrics request.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds: regex tier is ~10us, model calls are seconds on CPU.
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+def _label_str(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def _key(self, labels: dict | None) -> tuple:
+        if not self.labels:
+            return ()
+        return tuple(map(labels.__getitem__, self.labels))
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def clear(self) -> None:
+        """Drop every label set (for gauges re-sampled wholesale at scrape time)."""
+        with self._lock:
+            self._values.clear()
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, "+Inf"), counts):
+                cumulative += c
+                le = _label_str((*self.labels, "le"), (*key, bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _label_str(self.labels, key)
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# -------------------
+# Parse-path metrics
+# -------------------
+STAGE_SECONDS = REGISTRY.histogram(
+    "nlu_stage_seconds", "Time spent per parse stage.", ("stage",))
+OUTCOMES = REGISTRY.counter(
+    "nlu_parse_outcomes_total", "How each parse was answered.", ("outcome",))
+MODEL_INFLIGHT = REGISTRY.gauge(
+    "nlu_model_inflight", "Model generations currently running.")
+MODEL_OUTPUT_TOKENS = REGISTRY.histogram(
+    "nlu_model_output_tokens", "Tokens read from the model per call.", buckets=TOKEN_BUCKETS)
+HTTP_INFLIGHT = REGISTRY.gauge(
+    "nlu_http_inflight", "HTTP requests currently being handled.", ("endpoint",))
+HTTP_REQUESTS = REGISTRY.counter(
+    "nlu_http_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "status"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "nlu_http_request_seconds", "HTTP request latency.", ("endpoint",))
+CACHE_STATS = REGISTRY.gauge(
+    "nlu_cache", "Result-cache counters, sampled at scrape time.", ("stat",))
+SKELETON_CACHE_STATS = REGISTRY.gauge(
+    "nlu_skeleton_cache", "Skeleton-cache counters, sampled at scrape time.", ("stat",))
+SKELETON_LOOKUPS = REGISTRY.gauge(
+    "nlu_skeleton_cache_skeleton", "Lookups of the busiest skeletons by result (id as in /healthz).",
+    ("skeleton", "result"))
+STARTUP_SECONDS = REGISTRY.gauge(
+    "nlu_startup_seconds", "Startup timings: import, warmup, ready, first_request.", ("phase",))
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+    "nlu_model_load_seconds", "Model load time reported by Ollama during warm-up.", ("model", "host"))
+
+
+def export_cache_stats(cache) -> None:
+    """Copy `ResultCache.snapshot()` into CACHE_STATS (called on scrape)."""
+    if cache is None:
+        return
+    for stat, value in cache.snapshot().items():
+        CACHE_STATS.set(value, stat=stat)
+
+
+def export_skeleton_stats(cache, top: int = 20) -> None:
+    """Copy `SkeletonCache.snapshot()` into the skeleton gauges (called on scrape)."""
+    if cache is None:
+        return
+    snap = cache.snapshot(top)
+    for stat, value in snap.items():
+        if stat != "top":
+            SKELETON_CACHE_STATS.set(value, stat=stat)
+    SKELETON_LOOKUPS.clear()
+    for row in snap["top"]:
+        SKELETON_LOOKUPS.set(row["hits"], skeleton=row["id"], result="hit")
+        SKELETON_LOOKUPS.set(row["misses"], skeleton=row["id"], result="miss")
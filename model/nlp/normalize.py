@@ -0,0 +1,270 @@
+"""
+Date and time normalization for Param-JSON, shared by the API, the demo and
+bulk jobs.
+
+    normalize_time("2 pm")                                -> "14:00"
+    normalize_range("4", "6 pm")                          -> ("16:00", "18:00")
+    normalize_date("next Friday", now=date(2025, 9, 9))   -> "2025-09-12"
+    normalize_many(["tomorrow", "11 Sept", "tomorrow"])   -> [..., ..., ...]
+
+Tables and patterns are built once at import. Dates are memoized on
+(token, reference date, timezone): "tomorrow" means another day tomorrow, so
+the reference date is part of the key, and the cache is dropped when the
+reference date moves forward (per-day cutover) rather than keeping a copy
+of every token for every day. Times do not depend on the date and are
+memoized on the token alone.
+
+Relative forms:
+    today, tonight, tomorrow, day after tomorrow, yesterday
+    in 3 days, in a week, in 2 weeks
+    friday, on fri, this friday, coming friday  the next one, today included
+    next friday                                 the next one after today
+    friday next week                            Friday of the following week
+    next week / this weekend / next weekend     that Monday / Saturday
+    next month                                  its 1st
+Absolute forms: "11 Sept", "11th of September 2025", "Sept 11", "11/9",
+"11-9-25" (day first) and "2025-09-11". A day and month without a year that
+has already passed this year means next year.
+
+"Today" is taken in PARSE_TIMEZONE (an IANA name; default: the host's zone)
+unless a timezone or reference `now` is passed in.
+"""
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterable
+
+# -------------------
+# Tables
+# -------------------
+_MONTH_NAMES = ("january", "february", "march", "april", "may", "june", "july",
+                "august", "september", "october", "november", "december")
+_WEEKDAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+MONTHS = {abbr: i for i, name in enumerate(_MONTH_NAMES, start=1) for abbr in (name, name[:3])}
+MONTHS["sept"] = 9
+WEEKDAYS = {abbr: i for i, name in enumerate(_WEEKDAY_NAMES) for abbr in (name, name[:3])}
+WEEKDAYS.update(tues=1, weds=2, thur=3, thurs=3)
+
+# offset in days from the reference date
+NAMED_DAYS = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1, "day after tomorrow": 2,
+              "the day after tomorrow": 2, "yesterday": -1}
+NAMED_TIMES = {"noon": "12:00", "midday": "12:00", "midnight": "00:00"}
+_UNIT_DAYS = {"day": 1, "days": 1, "week": 7, "weeks": 7}
+_COUNTS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3}
+
+_MONTH_ALT = "|".join(sorted(MONTHS, key=len, reverse=True))
+_WEEKDAY_ALT = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_ORD = r"(?:st|nd|rd|th)?"
+
+_DAY_MONTH_RE = re.compile(rf"^(\d{{1,2}}){_ORD}\s*(?:of\s+)?({_MONTH_ALT})\.?,?(?:\s+(\d{{2}}|\d{{4}}))?$")
+_MONTH_DAY_RE = re.compile(rf"^({_MONTH_ALT})\.?\s+(\d{{1,2}}){_ORD},?(?:\s+(\d{{2}}|\d{{4}}))?$")
+_NUMERIC_RE = re.compile(r"^(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2}|\d{4}))?$")
+_ISO_RE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+_IN_RE = re.compile(rf"^in\s+(\d{{1,3}}|{'|'.join(_COUNTS)})\s+({'|'.join(_UNIT_DAYS)})$")
+_WEEKDAY_RE = re.compile(rf"^(?:on\s+)?(?:(this|coming|next)\s+)?({_WEEKDAY_ALT})\.?(\s+next\s+week)?$")
+_TIME_RE = re.compile(r"^(\d{1,2})(?:[:.h](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _clean(tok) -> str | None:
+    """Lowercased, single-spaced token; None for anything but a string."""
+    if not isinstance(tok, str):
+        return None
+    return _SPACE_RE.sub(" ", tok.strip().lower())
+
+
+# -------------------
+# Reference date
+# -------------------
+@lru_cache(maxsize=64)
+def get_zone(name: str | None):
+    """tzinfo for an IANA name (None: local time). Raises ValueError if unknown."""
+    if not name:
+        return None
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown timezone {name!r}") from None
+
+
+def reference_date(now: datetime | date | None = None, tz: str | None = None) -> date:
+    """The date relative tokens count from: `now` (seen in `tz`), else today in `tz`."""
+    zone = get_zone(tz or os.environ.get("PARSE_TIMEZONE"))
+    if now is None:
+        return datetime.now(zone).date()
+    if isinstance(now, datetime):
+        if zone is not None and now.tzinfo is not None:
+            now = now.astimezone(zone)
+        return now.date()
+    return now
+
+
+_cache_day: date | None = None
+_cutover_lock = threading.Lock()
+
+
+def _cutover(ref: date) -> None:
+    """Drop memoized dates once the reference date moves past the one they were made for."""
+    global _cache_day
+    if _cache_day is None or ref > _cache_day:
+        with _cutover_lock:
+            if _cache_day is None or ref > _cache_day:
+                _resolve_date.cache_clear()
+                _cache_day = ref
+
+
+# -------------------
+# Resolution
+# -------------------
+def _day_month(day: int, month: int, year: str | None, ref: date) -> str | None:
+    if year is not None:
+        y = int(year)
+        try:
+            return date(y + 2000 if y < 100 else y, month, day).isoformat()
+        except ValueError:
+            return None
+    try:
+        out = date(ref.year, month, day)
+        if out < ref:
+            out = date(ref.year + 1, month, day)
+    except ValueError:
+        return None
+    return out.isoformat()
+
+
+def _relative(s: str, ref: date) -> date | None:
+    if s in NAMED_DAYS:
+        return ref + timedelta(days=NAMED_DAYS[s])
+    m = _IN_RE.match(s)
+    if m:
+        count = _COUNTS.get(m[1]) or int(m[1])
+        return ref + timedelta(days=count * _UNIT_DAYS[m[2]])
+    m = _WEEKDAY_RE.match(s)
+    if m:
+        which, target = m[1], WEEKDAYS[m[2]]
+        if m[3]:
+            return ref + timedelta(days=7 - ref.weekday() + target)
+        ahead = (target - ref.weekday()) % 7
+        if which == "next" and ahead == 0:
+            ahead = 7
+        return ref + timedelta(days=ahead)
+    if s == "next week":
+        return ref + timedelta(days=7 - ref.weekday())
+    if s in ("weekend", "this weekend"):
+        return ref if ref.weekday() == 6 else ref + timedelta(days=(5 - ref.weekday()) % 7)
+    if s == "next weekend":
+        return ref + timedelta(days=7 - ref.weekday() + 5)
+    if s == "next month":
+        return date(ref.year + ref.month // 12, ref.month % 12 + 1, 1)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _resolve_date(s: str, ref: date, tz: str | None) -> str | None:
+    # tz is part of the key only: `ref` already reflects it
+    rel = _relative(s, ref)
+    if rel is not None:
+        return rel.isoformat()
+    m = _DAY_MONTH_RE.match(s)
+    if m:
+        return _day_month(int(m[1]), MONTHS[m[2]], m[3], ref)
+    m = _MONTH_DAY_RE.match(s)
+    if m:
+        return _day_month(int(m[2]), MONTHS[m[1]], m[3], ref)
+    m = _NUMERIC_RE.match(s)
+    if m:
+        return _day_month(int(m[1]), int(m[2]), m[3], ref)
+    m = _ISO_RE.match(s)
+    if m:
+        try:
+            return date(int(m[1]), int(m[2]), int(m[3])).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+def normalize_date(tok: str | None, now: datetime | date | None = None,
+                   tz: str | None = None) -> str | None:
+    """ISO date for a date token, or None if it is not one."""
+    s = _clean(tok)
+    if not s:
+        return None
+    ref = reference_date(now, tz)
+    _cutover(ref)
+    return _resolve_date(s, ref, tz)
+
+
+def normalize_time(tok: str | None) -> str | None:
+    """"2 pm" / "14:00" / "9.30am" / "noon" -> "HH:MM", or None."""
+    return _normalize_time(tok) if isinstance(tok, str) and tok else None
+
+
+@lru_cache(maxsize=1024)
+def _normalize_time(tok: str) -> str | None:
+    s = _clean(tok)
+    if s in NAMED_TIMES:
+        return NAMED_TIMES[s]
+    m = _TIME_RE.match(s)
+    if not m:
+        return None
+    hh, mm, ap = int(m[1]), int(m[2] or 0), (m[3] or " ")[0]
+    if ap != " " and not 1 <= hh <= 12:
+        return None
+    if ap == "p" and hh < 12:
+        hh += 12
+    elif ap == "a" and hh == 12:
+        hh = 0
+    if hh < 24 and mm < 60:
+        return f"{hh:02d}:{mm:02d}"
+    return None
+
+
+def normalize_range(start: str | None, end: str | None) -> tuple[str | None, str | None]:
+    """
+    `normalize_time` for a start/end pair. A bare start borrows the end's
+    am/pm ("4 to 6 pm" -> 16:00-18:00) when that keeps it before the end
+    ("11 to 1 pm" stays 11:00-13:00).
+    """
+    s, e = normalize_time(start), normalize_time(end)
+    if s is None or e is None:
+        return s, e
+    m = _TIME_RE.match(_clean(end))
+    if m and m[3]:
+        borrowed = normalize_time(f"{start} {m[3]}")  # None unless start is a bare 1-12
+        if borrowed is not None and borrowed < e:
+            return borrowed, e
+    return s, e
+
+
+def normalize_many(tokens: Iterable[str | None], kind: str = "date",
+                   now: datetime | date | None = None, tz: str | None = None) -> list[str | None]:
+    """
+    Bulk `normalize_date` / `normalize_time` (kind "date" or "time"). The
+    reference date is worked out once for the whole batch and each distinct
+    token is resolved once.
+    """
+    if kind == "time":
+        resolve = normalize_time
+    elif kind == "date":
+        ref = reference_date(now, tz)
+        _cutover(ref)
+
+        def resolve(tok):
+            s = _clean(tok)
+            return _resolve_date(s, ref, tz) if s else None
+    else:
+        raise ValueError(f"kind must be 'date' or 'time', got {kind!r}")
+    seen: dict = {}
+    out = []
+    for tok in tokens:
+        if not isinstance(tok, str):
+            out.append(None)
+            continue
+        if tok not in seen:
+            seen[tok] = resolve(tok)
+        out.append(seen[tok])
+    return out
@@ -0,0 +1,331 @@
+"""
+Pooled HTTP client for the Ollama REST API.
+
+Replaces the old `ollama run <model>` subprocess: requests go to
+`/api/generate` over a small pool of keep-alive connections, with separate
+connect/read timeouts, retries on transient failures and a model `keep_alive`
+so the weights stay resident between calls.
+
+Configuration (environment, all optional):
+    OLLAMA_HOST             http://127.0.0.1:11434
+    OLLAMA_POOL_SIZE        4
+    OLLAMA_CONNECT_TIMEOUT  2.0   (seconds)
+    OLLAMA_READ_TIMEOUT     60.0  (seconds)
+    OLLAMA_RETRIES          2
+    OLLAMA_KEEP_ALIVE       30m
+    OLLAMA_HOSTS            unset (several replicas; see nlp.router)
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+
+# Status codes worth retrying: the server is up but busy / restarting.
+RETRY_STATUSES = {502, 503, 504}
+# First release that accepts a JSON schema as the `format` of /api/generate.
+STRUCTURED_MIN_VERSION = (0, 5)
+
+
+class OllamaError(RuntimeError):
+    """Raised when the Ollama server cannot be reached or returns an error."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class OllamaTimeout(OllamaError):
+    """The server is reachable but did not answer in time (not worth a retry)."""
+
+
+def version_at_least(version: str, minimum: tuple) -> bool:
+    """'0.5.7' / '0.6.0-rc1' compared numerically against (major, minor, ...)."""
+    parts = []
+    for piece in version.split("-")[0].split("."):
+        if not piece.isdigit():
+            break
+        parts.append(int(piece))
+    return bool(parts) and tuple(parts) >= tuple(minimum)
+
+
+def _split_host(host: str) -> tuple[str, int]:
+    """Accept 'http://h:p', 'h:p' or 'h' (the forms OLLAMA_HOST allows)."""
+    if "://" not in host:
+        host = "http://" + host
+    parts = urlsplit(host)
+    if parts.scheme != "http":
+        raise ValueError(f"Unsupported OLLAMA_HOST scheme: {parts.scheme}")
+    hostname = parts.hostname or "127.0.0.1"
+    if hostname == "0.0.0.0":
+        hostname = "127.0.0.1"
+    return hostname, parts.port or 11434
+
+
+class OllamaClient:
+    """
+    Thread-safe client holding up to `pool_size` idle keep-alive connections.
+    Callers beyond the pool size still get a connection; it is simply not
+    kept once the pool is full.
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        pool_size: int = 4,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 60.0,
+        retries: int = 2,
+        backoff: float = 0.1,
+        keep_alive: str | int | None = "30m",
+    ):
+        self.host = host
+        self._addr = _split_host(host)
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._closed = False
+        self.structured: bool | None = None  # learned on first use
+
+    # -------------------
+    # Connection pool
+    # -------------------
+    def _connect(self) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(*self._addr, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused)."""
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        if self._closed or self._idle.qsize() >= self.pool_size:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Close every idle connection; in-use ones close when released."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # -------------------
+    # Requests
+    # -------------------
+    def open(self, method: str, path: str, payload: dict | None = None,
+             timeout: float | None = None):
+        """
+        Send a request and return (connection, response) with the body unread.
+        The caller must read the body and hand the connection back through
+        `finish()`. Retries connection failures and RETRY_STATUSES.
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        read_timeout = self.read_timeout if timeout is None else timeout
+
+        last_err: Exception | None = None
+        attempt = 0
+        while attempt <= self.retries:
+            try:
+                conn, reused = self._acquire()
+            except OSError as e:
+                last_err = e
+                attempt += 1
+                if attempt <= self.retries:  # no backoff once out of attempts
+                    time.sleep(self.backoff * attempt)
+                continue
+            try:
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+            except socket.timeout as e:
+                # The model is slow, not the network: retrying would only
+                # stack another generation on the same server.
+                conn.close()
+                raise OllamaTimeout(f"Timed out after {read_timeout}s waiting for {path}") from e
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                last_err = e
+                if reused:
+                    # Idle connection was dropped by the server; a fresh
+                    # one does not count against the retry budget.
+                    continue
+                attempt += 1
+                if attempt <= self.retries:  # no backoff once out of attempts
+                    time.sleep(self.backoff * attempt)
+                continue
+
+            if resp.status in RETRY_STATUSES and attempt < self.retries:
+                resp.read()
+                self.finish(conn, resp)
+                attempt += 1
+                time.sleep(self.backoff * attempt)
+                continue
+            if resp.status >= 400:
+                detail = resp.read().decode("utf-8", "ignore")
+                self.finish(conn, resp)
+                try:
+                    detail = json.loads(detail).get("error", detail)
+                except (ValueError, AttributeError):
+                    pass
+                raise OllamaError(f"Ollama {path} returned {resp.status}: {detail}", status=resp.status)
+            return conn, resp
+
+        raise OllamaError(f"Could not reach Ollama at {self.host}: {last_err}") from last_err
+
+    def finish(self, conn: http.client.HTTPConnection, resp, reusable: bool = True) -> None:
+        """Return a connection to the pool once its response is fully read."""
+        if reusable and not resp.will_close and resp.isclosed():
+            self._release(conn)
+        else:
+            conn.close()
+
+    def request_json(self, method: str, path: str, payload: dict | None = None,
+                     timeout: float | None = None) -> dict:
+        conn, resp = self.open(method, path, payload, timeout=timeout)
+        try:
+            raw = resp.read()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            raise OllamaError(f"Connection lost while reading {path}: {e}") from e
+        self.finish(conn, resp)
+        return json.loads(raw) if raw else {}
+
+    def generate(self, prompt: str, model: str, options: dict | None = None,
+                 timeout: float | None = None, **extra) -> dict:
+        """
+        Non-streaming POST /api/generate. Returns the decoded response body
+        ('response', 'eval_count', 'total_duration', ...).
+        """
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        return self.request_json("POST", "/api/generate", payload, timeout=timeout)
+
+    def generate_stream(self, prompt: str, model: str, options: dict | None = None,
+                        timeout: float | None = None, **extra):
+        """
+        Streaming POST /api/generate. Yields each NDJSON chunk as a dict.
+        Closing the generator early drops the connection, which makes the
+        server stop generating; a stream read to `done` is pooled again.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+
+        conn, resp = self.open("POST", "/api/generate", payload, timeout=timeout)
+        finished = False
+        try:
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaError(f"Ollama stream error: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    finished = True
+                    break
+        except socket.timeout as e:
+            raise OllamaTimeout(f"Timed out after {timeout or self.read_timeout}s reading stream") from e
+        except (http.client.HTTPException, OSError) as e:
+            raise OllamaError(f"Connection lost while streaming: {e}") from e
+        finally:
+            if finished:
+                resp.read()  # consume the terminating chunk
+                self.finish(conn, resp)
+            else:
+                conn.close()
+
+    def version(self, timeout: float | None = None) -> dict:
+        return self.request_json("GET", "/api/version", timeout=timeout)
+
+    def supports_structured_output(self) -> bool:
+        """Whether the server takes a JSON schema as `format`; asked once."""
+        if self.structured is None:
+            try:
+                version = self.version(timeout=self.connect_timeout).get("version", "")
+            except (OllamaError, ValueError):
+                return False  # transient; ask again next time
+            self.structured = version_at_least(version, STRUCTURED_MIN_VERSION)
+        return self.structured
+
+
+def _keep_alive_from_env(value: str) -> str | int:
+    # Ollama accepts either a duration string ("30m") or seconds (-1 = forever).
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def client_for(host: str, **overrides) -> OllamaClient:
+    """Client for `host` with the OLLAMA_* settings; keyword arguments win."""
+    env = os.environ
+    kwargs = dict(
+        pool_size=int(env.get("OLLAMA_POOL_SIZE", "4")),
+        connect_timeout=float(env.get("OLLAMA_CONNECT_TIMEOUT", "2.0")),
+        read_timeout=float(env.get("OLLAMA_READ_TIMEOUT", "60.0")),
+        retries=int(env.get("OLLAMA_RETRIES", "2")),
+        keep_alive=_keep_alive_from_env(env.get("OLLAMA_KEEP_ALIVE", "30m")),
+    )
+    kwargs.update(overrides)
+    return OllamaClient(host=host, **kwargs)
+
+
+def client_from_env() -> OllamaClient:
+    """One client for OLLAMA_HOST, or a `ReplicaRouter` when OLLAMA_HOSTS is set."""
+    if os.environ.get("OLLAMA_HOSTS"):
+        from .router import router_from_env
+        return router_from_env()
+    return client_for(os.environ.get("OLLAMA_HOST", DEFAULT_HOST))
+
+
+_default_client: OllamaClient | None = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Process-wide shared client, built from the environment on first use."""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = client_from_env()
+    return _default_client
+
+
+def set_client(client: OllamaClient | None) -> None:
+    """Swap the shared client (benchmarks, stand-in servers)."""
+    global _default_client
+    with _default_lock:
+        old, _default_client = _default_client, client
+    if old is not None and old is not client:
+        old.close()
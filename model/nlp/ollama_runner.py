@@ -1,7 +1,13 @@
 import json
+import os
 import re
-import subprocess
-from .prompt import build_prompt
+import time
+from .admission import DEADLINE, Overloaded, check_deadline, remaining
+from .json_stream import JsonObjectScanner
+from .metrics import MODEL_INFLIGHT, MODEL_OUTPUT_TOKENS, OUTCOMES, STAGE_SECONDS
+from .ollama_client import OllamaClient, OllamaError, get_client
+from .prompt import build_gap_prompt, build_prompt
+from .schema import NUM_PREDICT, OUTPUT_SCHEMA, num_predict_for, schema_for, validate
 
 KNOWN_KEYS = {
     "intent": "intent",
@@ -15,6 +21,11 @@ KNOWN_KEYS = {
     "booking id": "booking_id",
 }
 
+# Stream tokens and stop at the first closed JSON object (OLLAMA_STREAM=0 to disable).
+STREAM_DEFAULT = os.environ.get("OLLAMA_STREAM", "1") != "0"
+# Schema-constrained decoding: auto (if the server is new enough) | on | off.
+STRUCTURED_MODE = os.environ.get("OLLAMA_STRUCTURED", "auto").lower()
+
 def _extract_first_json(text: str) -> str | None:
     """Return the first balanced {...} JSON object, or None."""
     # strip fences if any
@@ -55,33 +66,203 @@ def _kv_fallback(text: str) -> dict | None:
             out[k] = v
     return out or None
 
-def run_tinyllama_json(utterance: str, model_name: str = "room-nlu") -> dict:
+def stream_until_json(client: OllamaClient, prompt: str, model_name: str,
+                      timeout: float | None = None, timings: dict | None = None,
+                      deadline: float | None = None) -> tuple[str, str | None]:
+    """
+    Stream the generation and hang up as soon as the first top-level JSON
+    object is complete. Returns (text_read, json_blob_or_None) and records
+    time-to-first-token / time-to-JSON-complete (seconds) in `timings`.
+    Past `deadline` it hangs up as well and raises Overloaded.
+    """
+    timings = {} if timings is None else timings
+    t0 = time.perf_counter()
+    scanner = JsonObjectScanner()
+    tokens = 0
+    stream = client.generate_stream(prompt, model_name, timeout=timeout)
+    try:
+        for chunk in stream:
+            piece = chunk.get("response", "")
+            tokens += bool(piece)  # Ollama streams one token per chunk
+            if piece and "ttft" not in timings:
+                timings["ttft"] = time.perf_counter() - t0
+            if scanner.feed(piece) is not None:
+                timings["json_complete"] = time.perf_counter() - t0
+                timings["early_stop"] = not chunk.get("done", False)
+                break
+            check_deadline(deadline)
+    finally:
+        stream.close()
+    timings["generate"] = time.perf_counter() - t0
+    timings["tokens"] = tokens
+    return scanner.text, scanner.result
+
+
+def use_structured(client: OllamaClient) -> bool:
+    if STRUCTURED_MODE == "off":
+        return False
+    if STRUCTURED_MODE == "on":
+        return client.structured is not False
+    return client.supports_structured_output()
+
+
+def structured_payload(fields: tuple | None = None) -> dict:
+    """`generate()` keyword arguments for a schema-constrained call (optionally a field subset)."""
+    if fields is None:
+        return {"format": OUTPUT_SCHEMA, "options": {"num_predict": NUM_PREDICT}}
+    return {"format": schema_for(fields), "options": {"num_predict": num_predict_for(fields)}}
+
+
+def model_prompt(utterance: str, fields: tuple | None = None) -> str:
+    return build_prompt(utterance) if fields is None else build_gap_prompt(utterance, fields)
+
+
+def only_fields(out: dict, fields: tuple | None) -> dict:
+    """Drop anything a gap-filling call was not asked for."""
+    if fields is None:
+        return out
+    return {k: v for k, v in out.items() if k in fields}
+
+
+def generate_structured(client: OllamaClient, prompt: str, model_name: str,
+                        timeout: float | None = None, timings: dict | None = None,
+                        **kwargs) -> str | None:
+    """
+    One buffered call decoded under OUTPUT_SCHEMA (or `format=` in kwargs).
+    Not streamed: the grammar ends the reply when the object closes, so
+    there is nothing to stop early. Returns None if the server rejects the
+    schema; the client then remembers not to send one again.
+    """
+    timings = {} if timings is None else timings
+    kwargs = {**structured_payload(), **kwargs}
+    t0 = time.perf_counter()
+    try:
+        res = client.generate(prompt, model_name, timeout=timeout, **kwargs)
+    except OllamaError as e:
+        if e.status != 400:
+            raise
+        client.structured = False
+        return None
+    timings["generate"] = time.perf_counter() - t0
+    timings["tokens"] = res.get("eval_count", 0)
+    return res.get("response", "")
+
+
+def call_timeout(timeout: float | None, deadline: float | None) -> float | None:
+    """Read timeout for a model call: `timeout`, cut to what is left before `deadline`."""
+    left = remaining(deadline)
+    if left is None:
+        return timeout
+    check_deadline(deadline)
+    return left if timeout is None else min(timeout, left)
+
+
+def _generate_text(client: OllamaClient, prompt: str, model_name: str, timeout: float | None,
+                   stream: bool, timings: dict, deadline: float | None = None) -> tuple[str, str | None]:
+    if stream:
+        raw, blob = stream_until_json(client, prompt, model_name, timeout=timeout, timings=timings,
+                                      deadline=deadline)
+        return raw.strip(), blob
+    t0 = time.perf_counter()
+    res = client.generate(prompt, model_name, timeout=timeout)
+    timings["generate"] = time.perf_counter() - t0
+    timings["tokens"] = res.get("eval_count", 0)
+    return res.get("response", "").strip(), None
+
+
+def run_tinyllama_json(utterance: str, model_name: str = "room-nlu",
+                       client: OllamaClient | None = None,
+                       timeout: float | None = None,
+                       stream: bool | None = None,
+                       timings: dict | None = None,
+                       fields: tuple | None = None,
+                       deadline: float | None = None) -> dict:
     """
-    Calls TinyLlama locally via Ollama and returns a dict.
+    Calls TinyLlama via the Ollama HTTP API and returns a dict.
+    With `fields` only those are asked for (see `prompt.build_gap_prompt`)
+    and only those are returned. A `deadline` (time.monotonic()) caps the
+    call; running past it raises Overloaded(DEADLINE).
     Enforces JSON, but if the model still chats, falls back to parsing 'Key: Value' lines.
+    If the server supports it (OLLAMA_STRUCTURED) the reply is decoded under
+    the output schema and only validated; otherwise, with `stream` (default:
+    OLLAMA_STREAM) generation stops at the first closed JSON object. Pass a
+    dict as `timings` to collect per-call timings.
+    """
+    t0 = time.perf_counter()
+    prompt = model_prompt(utterance, fields)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="prompt_build")
+    client = client or get_client()
+    stream = STREAM_DEFAULT if stream is None else stream
+    timings = {} if timings is None else timings
+    timeout = call_timeout(timeout, deadline)
+
+    with MODEL_INFLIGHT.track():
+        try:
+            raw, blob = None, None
+            if use_structured(client):
+                raw = generate_structured(client, prompt, model_name, timeout=timeout, timings=timings,
+                                          **structured_payload(fields))
+            structured = raw is not None
+            if not structured:
+                raw, blob = _generate_text(client, prompt, model_name, timeout, stream, timings, deadline)
+        except Overloaded:
+            raise
+        except Exception as e:
+            if isinstance(e, OllamaError) and deadline is not None and remaining(deadline) <= 0:
+                raise Overloaded(DEADLINE) from e
+            OUTCOMES.inc(outcome="model_error")
+            raise
+    STAGE_SECONDS.observe(timings["generate"], stage="model_wait")
+    MODEL_OUTPUT_TOKENS.observe(timings["tokens"])
+    if structured:
+        return only_fields(parse_structured_output(raw), fields)
+    return only_fields(parse_model_output(raw, blob), fields)
+
+
+def parse_structured_output(raw: str) -> dict:
     """
-    prompt = build_prompt(utterance)
-    res = subprocess.run(
-        ["ollama", "run", model_name],
-        input=prompt.encode("utf-8"),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        check=True
-    )
-    raw = res.stdout.decode("utf-8").strip()
+    Decode a schema-constrained reply in one pass. The repair chain in
+    `parse_model_output` only runs if the grammar was not honoured (e.g. the
+    reply was cut off at num_predict).
+    """
+    t0 = time.perf_counter()
+    try:
+        out = validate(json.loads(raw))
+    except ValueError:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="extraction")
+        return parse_model_output(raw.strip())
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="extraction")
+    OUTCOMES.inc(outcome="structured")
+    return out
+
 
+def parse_model_output(raw: str, blob: str | None = None) -> dict:
+    """
+    Turn raw model text into a dict: strict JSON first (`blob` if the
+    streaming scanner already found it), then 'Key: Value' chatter.
+    """
     # 1) Try strict JSON
-    blob = _extract_first_json(raw)
+    t0 = time.perf_counter()
+    if blob is None:
+        blob = _extract_first_json(raw)
     if blob is not None:
         try:
-            return json.loads(blob)
+            out = validate(json.loads(blob))
+            STAGE_SECONDS.observe(time.perf_counter() - t0, stage="extraction")
+            OUTCOMES.inc(outcome="json")
+            return out
         except Exception:
             pass  # attempt fallback
+    t1 = time.perf_counter()
+    STAGE_SECONDS.observe(t1 - t0, stage="extraction")
 
     # 2) Fallback: parse 'Intent: ...' style chatter
     kv = _kv_fallback(raw)
+    STAGE_SECONDS.observe(time.perf_counter() - t1, stage="fallback")
     if kv:
+        OUTCOMES.inc(outcome="kv_fallback")
         return kv
 
     # 3) If nothing worked, raise with raw for debugging
+    OUTCOMES.inc(outcome="failure")
     raise ValueError(f"No JSON found and KV fallback failed. Output head:\n{raw[:300]}")
@@ -0,0 +1,56 @@
+"""
+Compile a sanitized field dict into Param-JSON (template + normalized args).
+Moved out of the Streamlit demo so the API and benchmarks can use it. Dates
+and times go through nlp.normalize, which memoizes them, so /parse can
+return Param-JSON with every response.
+"""
+from datetime import date, datetime
+from typing import Iterable
+
+from .normalize import normalize_date, normalize_many, normalize_range
+
+TEMPLATES = {"book": "book_v1", "check_availability": "check_v1", "cancel": "cancel_v1", "modify": "modify_v1"}
+
+
+def room_id(room: str | None) -> str | None:
+    return room.strip().lower().replace(" ", "-") if isinstance(room, str) and room.strip() else None
+
+
+def _compile(chosen: dict, date_iso: str | None, start_iso: str | None, end_iso: str | None) -> dict:
+    intent = chosen.get("intent")
+    template = TEMPLATES.get(intent.lower() if isinstance(intent, str) else "", "noop")
+    args = {
+        "room_id": room_id(chosen.get("room")),
+        "date": date_iso,
+        "start": start_iso,
+        "end": end_iso,
+        "purpose": None,
+        "equip": [],
+        "capacity": None,
+        "recurrence": None,
+        "booking_id": chosen.get("booking_id") if isinstance(chosen.get("booking_id"), str) else None,
+    }
+    warnings = []
+    if template == "book_v1":
+        if not args["room_id"]: warnings.append("missing_room_id")
+        if not date_iso: warnings.append("missing_date")
+        if not start_iso or not end_iso: warnings.append("missing_time_range")
+        if start_iso and end_iso and start_iso >= end_iso: warnings.append("invalid_time_range")
+    if chosen.get("date") and not date_iso:
+        warnings.append("unparsed_date")
+
+    return {"template": template, "args": args, "warnings": warnings}
+
+
+def compile_param_json(chosen: dict, now: datetime | date | None = None, tz: str | None = None) -> dict:
+    """`now` / `tz` set the day relative dates count from (default: today in PARSE_TIMEZONE)."""
+    return _compile(chosen, normalize_date(chosen.get("date"), now, tz),
+                    *normalize_range(chosen.get("start"), chosen.get("end")))
+
+
+def compile_many(rows: Iterable[dict], now: datetime | date | None = None, tz: str | None = None) -> list[dict]:
+    """`compile_param_json` over many rows, normalizing each column in one pass."""
+    rows = list(rows)
+    dates = normalize_many((r.get("date") for r in rows), "date", now, tz)
+    times = [normalize_range(r.get("start"), r.get("end")) for r in rows]  # memoized per token
+    return [_compile(row, d, *t) for row, d, t in zip(rows, dates, times)]
@@ -0,0 +1,258 @@
+"""
+Tiered parse pipeline shared by the API and offline tools.
+
+    1) regex   deterministic `regex_parse`; answers alone when its confidence
+               reaches the bypass threshold
+    2) learned small NumPy intent/slot model (`nlp.slot_model`, only when
+               PARSE_LEARNED_MODEL is set); answers when its calibrated
+               confidence reaches PARSE_LEARNED_THRESHOLD (default 0.9)
+    3) cache   a previous model answer for the same utterance/model/prompt;
+               then the skeleton cache (`nlp.skeleton_cache`): a previous
+               answer for an utterance differing only in its slot spans,
+               re-filled with this one's spans ("skeleton" tier)
+    4) model   TinyLlama via Ollama; the regex spans are overlaid and
+               `prefer_explicit` sanitizes the merge
+
+Model calls go through the admission gate (`nlp.admission`): when it is
+saturated, or the client's deadline passes, the answer comes from regex alone
+and is flagged "degraded" instead of failing.
+
+The model is only asked for the fields regex left missing (`schema.gap_fields`),
+which keeps both prompt and reply short; `force_model` and PARSE_GAP_FILL=0
+ask for every field instead.
+
+Set REGEX_BYPASS_THRESHOLD to tune the cut-off (default 3.0) and
+PARSE_BATCH_CONCURRENCY to the number of parallel slots the Ollama server
+runs (OLLAMA_NUM_PARALLEL on the server side; default 4).
+"""
+import os
+
+from .admission import Overloaded, get_gate
+from .cache import cached_run, normalize_utterance
+from .metrics import OUTCOMES
+from .ollama_runner import run_tinyllama_json
+from .param_json import compile_param_json
+from .regex_parser import BYPASS_THRESHOLD, Spans, confidence, extract_spans, prefer_explicit, regex_parse
+from .schema import gap_fields
+from .skeleton_cache import skeleton_run
+from .slot_model import get_slot_model
+
+TIER_REGEX = "regex"
+TIER_CACHE = "cache"
+TIER_MODEL = "model"
+TIER_LEARNED = "learned"
+TIER_SKELETON = "skeleton"
+
+
+def bypass_threshold() -> float:
+    return float(os.environ.get("REGEX_BYPASS_THRESHOLD", BYPASS_THRESHOLD))
+
+
+def learned_threshold() -> float:
+    return float(os.environ.get("PARSE_LEARNED_THRESHOLD", "0.9"))
+
+
+def batch_concurrency() -> int:
+    return max(1, int(os.environ.get("PARSE_BATCH_CONCURRENCY", "4")))
+
+
+def gap_fill_enabled() -> bool:
+    return os.environ.get("PARSE_GAP_FILL", "1") != "0"
+
+
+def model_fields(regex_out: dict, force_model: bool = False) -> tuple | None:
+    """Fields to ask the model for; None means all of them (a full parse)."""
+    if force_model or not gap_fill_enabled():
+        return None
+    return gap_fields(regex_out)
+
+
+def merge(utterance: str, regex_out: dict, model_out: dict, spans: Spans | None = None,
+          threshold: float | None = None) -> dict:
+    """
+    Regex spans win over the model, then explicit spans are enforced. The
+    intent is the exception: a keyword guess whose regex answer did not
+    clear the bypass `threshold` (default REGEX_BYPASS_THRESHOLD) does not
+    override the model's (or learned tier's). One that did, as when
+    force_model sends a confident utterance to the model anyway, stays.
+    """
+    merged = dict(model_out or {})
+    merged.update(regex_out)
+    if (model_out or {}).get("intent"):
+        threshold = bypass_threshold() if threshold is None else threshold
+        if not (regex_out.get("intent") and confidence(regex_out) >= threshold):
+            merged["intent"] = model_out["intent"]
+    return prefer_explicit(utterance, merged, spans)
+
+
+def flatten(answer: dict, tz: str | None = None) -> dict:
+    """
+    API response shape: the fields plus "tier" and "confidence", the
+    compiled "param_json" (relative dates resolved against today in `tz`),
+    and "degraded"/"degraded_reason" when the model was skipped under load
+    (errors pass through).
+    """
+    if "error" in answer:
+        return answer
+    out = {**answer["result"], "tier": answer["tier"], "confidence": answer["confidence"],
+           "param_json": compile_param_json(answer["result"], tz=tz)}
+    if "degraded" in answer:
+        out["degraded"] = True
+        out["degraded_reason"] = answer["degraded"]
+    return out
+
+
+def flatten_item(answer: dict, tz: str | None = None) -> dict:
+    """`flatten` for one item of a batch: a failure becomes that item's {"error": ...}."""
+    try:
+        return flatten(answer, tz)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "confidence": answer.get("confidence")}
+
+
+def degraded(utterance: str, partial: tuple, reason: str) -> dict:
+    """Regex-only answer for a request the model tier could not take."""
+    regex_out, score, spans = partial
+    OUTCOMES.inc(outcome=f"degraded_{reason}")
+    return {"result": merge(utterance, regex_out, {}, spans), "tier": TIER_REGEX,
+            "confidence": score, "degraded": reason}
+
+
+def parse_utterance(utterance: str, model_name: str = "room-nlu",
+                    threshold: float | None = None, force_model: bool = False,
+                    deadline: float | None = None) -> dict:
+    """
+    Returns {"result": {...}, "tier": "regex"|"learned"|"cache"|"skeleton"|"model", "confidence": float},
+    plus "degraded": reason when the model was skipped (see `degraded`).
+    `deadline` is a time.monotonic() value. Model errors propagate to the caller.
+    """
+    if threshold is None:
+        threshold = bypass_threshold()
+    answer, partial = _regex_tier(utterance, threshold, force_model)
+    if answer is not None:
+        return answer
+    answer = _learned_tier([utterance], [partial], force_model)[0]
+    if answer is not None:
+        return answer
+    return _model_tier(utterance, model_name, partial, force_model, deadline)
+
+
+def _regex_tier(utterance: str, threshold: float, force_model: bool):
+    """
+    Returns (answer, None) when regex alone is confident enough, otherwise
+    (None, (regex_out, score, spans)) for the model tier to finish.
+    """
+    spans = extract_spans(utterance)
+    regex_out = regex_parse(utterance, spans)
+    score = confidence(regex_out)
+    if score >= threshold and not force_model:
+        OUTCOMES.inc(outcome="regex_bypass")
+        return {"result": regex_out, "tier": TIER_REGEX, "confidence": score}, None
+    return None, (regex_out, score, spans)
+
+
+def _learned_tier(utterances: list[str], partials: list[tuple], force_model: bool = False) -> list[dict | None]:
+    """
+    Batched learned-model answers for utterances regex could not finish:
+    None where the model is not configured or not confident enough.
+    Regex spans still win over the learned ones. "confidence" is the
+    learned model's calibrated probability, not the regex score.
+    """
+    model = get_slot_model()
+    if model is None or force_model or not utterances:
+        return [None] * len(utterances)
+    threshold = learned_threshold()
+    answers = []
+    for utterance, (regex_out, _, spans), pred in zip(utterances, partials, model.predict_many(utterances)):
+        if pred["confidence"] < threshold:
+            OUTCOMES.inc(outcome="learned_pass")
+            answers.append(None)
+            continue
+        OUTCOMES.inc(outcome="learned")
+        answers.append({"result": merge(utterance, regex_out, pred["fields"], spans),
+                        "tier": TIER_LEARNED, "confidence": pred["confidence"]})
+    return answers
+
+
+def _model_tier(utterance: str, model_name: str, partial: tuple, force_model: bool = False,
+                deadline: float | None = None, gated: bool = True) -> dict:
+    """`gated=False` skips admission control (offline jobs bound their own concurrency)."""
+    regex_out, score, spans = partial
+    fields = model_fields(regex_out, force_model)
+    if fields == ():
+        # nothing the model could add (e.g. a raised threshold)
+        return {"result": merge(utterance, regex_out, {}, spans), "tier": TIER_REGEX, "confidence": score}
+    if fields is not None:
+        OUTCOMES.inc(outcome="gap_fill")
+
+    def run() -> dict:
+        if not gated:
+            return run_tinyllama_json(utterance, model_name=model_name, fields=fields, deadline=deadline)
+        with get_gate().admit(deadline):
+            return run_tinyllama_json(utterance, model_name=model_name, fields=fields, deadline=deadline)
+
+    refilled = False
+
+    def run_or_refill() -> dict:
+        nonlocal refilled
+        model_out, refilled = skeleton_run(utterance, model_name, run, fields=fields)
+        return model_out
+
+    try:
+        model_out, cached = cached_run(utterance, model_name, run_or_refill, fields=fields)
+    except Overloaded as e:
+        return degraded(utterance, partial, e.reason)
+    if cached:
+        OUTCOMES.inc(outcome="cache_hit")
+    elif refilled:
+        OUTCOMES.inc(outcome="skeleton_hit")
+    tier = TIER_CACHE if cached else TIER_SKELETON if refilled else TIER_MODEL
+    return {"result": merge(utterance, regex_out, model_out, spans), "tier": tier, "confidence": score}
+
+
+def parse_batch(utterances: list[str], model_name: str = "room-nlu",
+                threshold: float | None = None, force_model: bool = False,
+                max_workers: int | None = None, deadline: float | None = None) -> list[dict]:
+    """
+    Parse many utterances. Duplicates (after whitespace normalization) are
+    parsed once, the regex tier answers inline and the rest go to the model
+    through at most `max_workers` concurrent calls. Results are in input
+    order; a failed item gets {"error": ...} instead of failing the batch,
+    and items still waiting for the model at `deadline` come back degraded.
+    """
+    if threshold is None:
+        threshold = bypass_threshold()
+    if max_workers is None:
+        max_workers = batch_concurrency()
+
+    keys = [normalize_utterance(u or "") for u in utterances]
+    answers: dict[str, dict] = {}
+    pending: dict[str, tuple] = {}
+    for key in dict.fromkeys(keys):
+        if not key:
+            answers[key] = {"error": "utterance is required"}
+            continue
+        answer, partial = _regex_tier(key, threshold, force_model)
+        if answer is not None:
+            answers[key] = answer
+        else:
+            pending[key] = partial
+
+    def run_one(key: str) -> dict:
+        try:
+            return _model_tier(key, model_name, pending[key], force_model, deadline)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}", "confidence": pending[key][1]}
+
+    for key, answer in zip(list(pending), _learned_tier(list(pending), list(pending.values()), force_model)):
+        if answer is not None:
+            answers[key] = answer
+            del pending[key]
+
+    if pending:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            for key, answer in zip(pending, pool.map(run_one, pending)):
+                answers[key] = answer
+
+    return [answers[k] for k in keys]
@@ -1,6 +1,48 @@
-def build_prompt(utterance: str) -> str:
+"""
+Versioned prompt templates.
+
+Every template is a byte-identical static prefix (rules + few-shot examples)
+followed by a suffix that holds the utterance:
+
+    <prefix>Text: {utterance}
+    JSON:
+
+Because the prefix never changes between requests, the Ollama server can
+reuse its prompt/KV cache for it and only prefill the few suffix tokens.
+
+    fewshot_v1  the original rules and all four examples
+    compact_v1  one-line rules, same examples (default)
+    budget_v1   compact rules, only the examples for the intent detected by
+                the regex matcher, trimmed to PROMPT_TOKEN_BUDGET tokens;
+                one static prefix per intent
 
-    return f"""Task: Extract fields VERBATIM from the input text.
+Pick with PROMPT_TEMPLATE or `build_prompt(utterance, template=...)`.
+`build_gap_prompt(utterance, fields)` asks for a subset of the fields only,
+with the examples cut down to those fields (one static prefix per subset).
+`python -m nlp.prompt` prints prompt token counts per template.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+
+from .regex_parser import INTENT_KEYWORDS, match_intent
+
+# (intent, text, answer) — answers copy the spans verbatim
+EXAMPLES = (
+    ("book", "Book SJT 315 tomorrow 4 to 6 pm",
+     '{"intent":"book","room":"SJT 315","date":"tomorrow","start":"4 pm","end":"6 pm"}'),
+    ("book", "Reserve TT 101 11 Sept 14:00 to 16:00",
+     '{"intent":"book","room":"TT 101","date":"11 Sept","start":"14:00","end":"16:00"}'),
+    ("cancel", "Cancel booking BK-2021",
+     '{"intent":"cancel","booking_id":"BK-2021"}'),
+    ("check_availability", "Is LH-204 free next Friday 2pm to 3:30pm?",
+     '{"intent":"check_availability","room":"LH-204","date":"next Friday","start":"2 pm","end":"3:30 pm"}'),
+)
+
+FEWSHOT_HEADER = """Task: Extract fields VERBATIM from the input text.
 Fields: intent, room, building, date, start, end, booking_id.
 Rules:
 - COPY EXACT SUBSTRINGS from the text (verbatim). Do NOT normalize or paraphrase.
@@ -9,18 +51,145 @@ Rules:
 - If a field is absent, omit it (do not invent).
 - Output STRICT JSON only (one object).
 
-Text: Book SJT 315 tomorrow 4 to 6 pm
-JSON: {{"intent":"book","room":"SJT 315","date":"tomorrow","start":"4 pm","end":"6 pm"}}
+"""
 
-Text: Reserve TT 101 11 Sept 14:00 to 16:00
-JSON: {{"intent":"book","room":"TT 101","date":"11 Sept","start":"14:00","end":"16:00"}}
+COMPACT_HEADER = (
+    "Extract intent, room, building, date, start, end, booking_id as one JSON object. "
+    "Copy spans verbatim; 'X to Y' is start X, end Y; omit absent fields.\n\n"
+)
 
-Text: Cancel booking BK-2021
-JSON: {{"intent":"cancel","booking_id":"BK-2021"}}
+GAP_HEADER = "Extract only {fields} as one JSON object. Copy spans verbatim; omit absent fields.\n\n"
 
-Text: Is LH-204 free next Friday 2pm to 3:30pm?
-JSON: {{"intent":"check_availability","room":"LH-204","date":"next Friday","start":"2 pm","end":"3:30 pm"}}
+SUFFIX = "Text: {utterance}\nJSON:\n"
 
-Text: Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed
-JSON:
-"""
+DEFAULT_TEMPLATE = "compact_v1"
+TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "160"))
+
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,4}|\d|[^\w\s]|_")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough Llama-tokenizer count (letters in ~4-char pieces, digits and
+    punctuation one each). Use `--measure` for the server's real count.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def _render_examples(examples) -> str:
+    return "".join(f"Text: {text}\nJSON: {answer}\n\n" for _, text, answer in examples)
+
+
+class PromptTemplate:
+    def __init__(self, name: str, header: str, examples=EXAMPLES, by_intent: bool = False,
+                 token_budget: int | None = None):
+        self.name = name
+        self.by_intent = by_intent
+        # precomputed so every request reuses the exact same prefix string
+        self.prefixes: dict[str | None, str] = {None: header + _render_examples(examples)}
+        if by_intent:
+            for intent in (None, *INTENT_KEYWORDS):
+                picked = self._select(examples, intent, header, token_budget)
+                if picked:  # intents without examples use the generic prefix
+                    self.prefixes[intent] = header + _render_examples(picked)
+
+    @staticmethod
+    def _select(examples, intent, header: str, budget: int | None):
+        """Examples for `intent` (one per intent when unknown), cut to `budget`."""
+        if intent is None:
+            seen, picked = set(), []
+            for ex in examples:
+                if ex[0] not in seen:
+                    seen.add(ex[0])
+                    picked.append(ex)
+        else:
+            picked = [ex for ex in examples if ex[0] == intent]
+        if budget is not None:
+            while len(picked) > 1 and estimate_tokens(header + _render_examples(picked)) > budget:
+                picked.pop()
+        return picked
+
+    def prefix(self, utterance: str = "") -> str:
+        if not self.by_intent:
+            return self.prefixes[None]
+        return self.prefixes.get(match_intent(utterance), self.prefixes[None])
+
+    def render(self, utterance: str) -> str:
+        return self.prefix(utterance) + SUFFIX.format(utterance=utterance)
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha256(self.name.encode("utf-8"))
+        for key in sorted(self.prefixes, key=str):
+            h.update(self.prefixes[key].encode("utf-8"))
+        h.update(SUFFIX.encode("utf-8"))
+        return h.hexdigest()[:16]
+
+
+TEMPLATES = {
+    "fewshot_v1": PromptTemplate("fewshot_v1", FEWSHOT_HEADER),
+    "compact_v1": PromptTemplate("compact_v1", COMPACT_HEADER),
+    "budget_v1": PromptTemplate("budget_v1", COMPACT_HEADER, by_intent=True, token_budget=TOKEN_BUDGET),
+}
+
+
+@functools.lru_cache(maxsize=64)
+def gap_prefix(fields: tuple) -> str:
+    """Static prefix asking for `fields` only: one example per intent, projected onto them."""
+    seen, picked = set(), []
+    for intent, text, answer in EXAMPLES:
+        sub = {k: v for k, v in json.loads(answer).items() if k in fields}
+        if sub and intent not in seen:
+            seen.add(intent)
+            picked.append((intent, text, json.dumps(sub, separators=(",", ":"))))
+    return GAP_HEADER.format(fields=", ".join(fields)) + _render_examples(picked)
+
+
+def build_gap_prompt(utterance: str, fields) -> str:
+    return gap_prefix(tuple(fields)) + SUFFIX.format(utterance=utterance)
+
+
+def get_template(name: str | None = None) -> PromptTemplate:
+    name = name or os.environ.get("PROMPT_TEMPLATE", DEFAULT_TEMPLATE)
+    try:
+        return TEMPLATES[name]
+    except KeyError:
+        raise ValueError(f"Unknown prompt template {name!r}; choose from {sorted(TEMPLATES)}") from None
+
+
+def build_prompt(utterance: str, template: str | None = None) -> str:
+    return get_template(template).render(utterance)
+
+
+def token_report(utterance: str = "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed") -> dict:
+    """Estimated prompt tokens per template (and per intent prefix)."""
+    report = {}
+    for name, tpl in TEMPLATES.items():
+        entry = {
+            "prefix_tokens": {str(k): estimate_tokens(v) for k, v in tpl.prefixes.items()},
+            "suffix_tokens": estimate_tokens(SUFFIX.format(utterance=utterance)),
+            "prompt_tokens": estimate_tokens(tpl.render(utterance)),
+        }
+        report[name] = entry
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prompt token counts per template.")
+    ap.add_argument("--utterance", default="Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed")
+    ap.add_argument("--measure", metavar="MODEL", default=None,
+                    help="also ask the server for prompt_eval_count (tokens it had to evaluate, "
+                         "so a reused prefix shows up as a smaller number)")
+    args = ap.parse_args()
+    report = token_report(args.utterance)
+    if args.measure:
+        from .ollama_client import get_client
+        client = get_client()
+        for name, tpl in TEMPLATES.items():
+            res = client.generate(tpl.render(args.utterance), args.measure,
+                                  options={"num_predict": 1})
+            report[name]["measured_prompt_tokens"] = res.get("prompt_eval_count")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,176 @@
+"""
+Deterministic slot extraction shared by the API, the demo and offline jobs.
+
+Every pattern is compiled once at import. `extract_spans` runs them over the
+text a single time and both `regex_parse` and `prefer_explicit` accept those
+spans, so parse + sanitize of one utterance does not scan it twice.
+"""
 import re
+from typing import Iterable, NamedTuple
+
+# Room patterns — e.g. SJT 315, TT 101, LH-204
+ROOM_RE = re.compile(r"\b([A-Z]{2,}-?\s?\d{2,3})\b")
+# Date — 11 Sept / 11/09 / tomorrow / next Friday
+DATE_LONG_RE = re.compile(r"\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec))\b", re.I)
+DATE_SLASH_RE = re.compile(r"\b(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b")
+# (resolved to ISO dates by nlp.normalize)
+RELATIVE_DATE_RE = re.compile(
+    r"\b(today|tonight|tomorrow|day after tomorrow|in\s+(?:\d{1,3}|a|an|one|two|three)\s+(?:days?|weeks?)"
+    r"|(?:(?:this|coming|next)\s+)?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)(?:\s+next\s+week)?"
+    r"|(?:this|next)\s+weekend|next\s+\w+)\b", re.I)
+# Time range — 14:00 to 16:00 / 2 pm - 4 pm
+TIME_RANGE_RE = re.compile(r"\b((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\s*(?:-|–|to)\s*((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\b", re.I)
+# Booking ID — BK-####
+BK_RE = re.compile(r"\b(BK-\d+)\b", re.I)
+
+# Intent — keyword map; on a tie the earlier intent wins ("book" before "cancel").
+# Keywords match whole words only ("booking" is not "book"), so inflected
+# forms are listed explicitly.
+INTENT_KEYWORDS = {
+    "book": ["book", "books", "reserve", "reserved", "schedule"],
+    "cancel": ["cancel", "cancels", "cancelled", "canceled", "delete", "deleted"],
+    "modify": ["modify", "reschedule", "postpone"],
+    "check_availability": ["available", "availability", "free", "vacant"],
+}
+# A booking id names an existing booking, so with one present these beat "book".
+_EXISTING_BOOKING_INTENTS = ("cancel", "modify")
+_INTENT_OF = {w: intent for intent, words in INTENT_KEYWORDS.items() for w in words}
+_INTENT_RANK = {intent: i for i, intent in enumerate(INTENT_KEYWORDS)}
+# One matcher for every keyword.
+INTENT_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(map(re.escape, _INTENT_OF), key=len, reverse=True)) + r")\b", re.I)
+# "move" is modify only next to a booking ("move my booking", "move BK-12"),
+# not in "move the meeting to room B" or "move on".
+MOVE_RE = re.compile(
+    r"\bmove\s+(?:(?:my|the|this|that|our|your)\s+)?(?:booking|reservation|slot|BK-\d+)\b", re.I)
+
+
+class Spans(NamedTuple):
+    """First match of each pattern in one utterance (None when absent)."""
+    intent: str | None
+    room: re.Match | None
+    explicit_date: re.Match | None
+    relative_date: re.Match | None
+    time_range: re.Match | None
+    booking_id: re.Match | None
+
+
+def match_intent(text: str, has_booking_id: bool | None = None) -> str | None:
+    """
+    Highest-ranked intent keyword in `text`. With a booking id present
+    (looked up when `has_booking_id` is None) cancel/modify win, and "book"
+    alone is left for the model to decide.
+    """
+    found = {_INTENT_OF[m.group(0).lower()] for m in INTENT_RE.finditer(text)}
+    if MOVE_RE.search(text):
+        found.add("modify")
+    if not found:
+        return None
+    if has_booking_id is None:
+        has_booking_id = BK_RE.search(text) is not None
+    if has_booking_id:
+        existing = [i for i in _EXISTING_BOOKING_INTENTS if i in found]
+        if existing:
+            return existing[0]
+        found.discard("book")
+    return min(found, key=_INTENT_RANK.__getitem__, default=None)
+
+
+def extract_spans(text: str) -> Spans:
+    explicit = DATE_LONG_RE.search(text) or DATE_SLASH_RE.search(text)
+    booking_id = BK_RE.search(text)
+    return Spans(
+        intent=match_intent(text, booking_id is not None),
+        room=ROOM_RE.search(text),
+        explicit_date=explicit,
+        relative_date=None if explicit else RELATIVE_DATE_RE.search(text),
+        time_range=TIME_RANGE_RE.search(text),
+        booking_id=booking_id,
+    )
 
-def regex_parse(text: str) -> dict:
+
+def regex_parse(text: str, spans: Spans | None = None) -> dict:
     """
     Quick deterministic slot extraction.
     Returns dict with any of: intent, room, date, start, end, booking_id.
     """
-
+    sp = spans or extract_spans(text)
     out = {}
+    if sp.intent:
+        out["intent"] = sp.intent
+    if sp.room:
+        out["room"] = sp.room.group(1).strip()
+    date = sp.explicit_date or sp.relative_date
+    if date:
+        out["date"] = date.group(1).strip()
+    if sp.time_range:
+        out["start"], out["end"] = sp.time_range.group(1).strip(), sp.time_range.group(2).strip()
+    if sp.booking_id:
+        out["booking_id"] = sp.booking_id.group(1).upper()
+    return out
+
+
+def parse_many(texts: Iterable[str]) -> Iterable[dict]:
+    """Bulk `regex_parse` for offline jobs; yields one dict per input, lazily."""
+    for text in texts:
+        yield regex_parse(text)
+
+
+# -------------------
+# Confidence scoring (decides whether the model can be skipped)
+# -------------------
+# Explicit spans are trusted fully; relative dates ("next Friday") still need
+# resolving downstream so they count for less.
+FIELD_WEIGHTS = {"intent": 1.0, "room": 1.0, "date": 1.0, "start": 1.0, "end": 1.0}
+RELATIVE_DATE_WEIGHT = 0.75
+# "Cancel BK-2021" is complete with just intent + booking id.
+CANCEL_BOOKING_ID_WEIGHT = 2.0
+BYPASS_THRESHOLD = 3.0
+
+
+def field_confidence(parsed: dict) -> dict:
+    """Per-field confidence in [0, 1] for the fields `regex_parse` returned."""
+    scores = {}
+    for key, weight in FIELD_WEIGHTS.items():
+        if key in parsed:
+            scores[key] = weight
+    if "date" in scores and RELATIVE_DATE_RE.fullmatch(parsed["date"]):
+        scores["date"] = RELATIVE_DATE_WEIGHT
+    if "booking_id" in parsed:
+        scores["booking_id"] = 1.0
+    return scores
+
+
+def confidence(parsed: dict) -> float:
+    """Total score compared against BYPASS_THRESHOLD."""
+    scores = field_confidence(parsed)
+    total = sum((v for k, v in scores.items() if k in FIELD_WEIGHTS), 0.0)
+    if parsed.get("intent") == "cancel" and "booking_id" in parsed:
+        total += CANCEL_BOOKING_ID_WEIGHT
+    return total
 
-    # Intent — simple keyword map
-    intents = {
-        "book": ["book", "reserve", "schedule"],
-        "cancel": ["cancel", "delete"],
-        "check_availability": ["available", "free", "vacant"],
-    }
-    lower = text.lower()
-    for intent, words in intents.items():
-        if any(w in lower for w in words):
-            out["intent"] = intent
-            break
-
-    # Room patterns — e.g. SJT 315, TT 101, LH-204
-    m = re.search(r"\b([A-Z]{2,}-?\s?\d{2,3})\b", text)
-    if m:
-        out["room"] = m.group(1).strip()
-
-    # Date — 11 Sept / 11/09 / tomorrow / next Friday
-    m = re.search(r"\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec))\b", text, re.I)
-    if not m:
-        m = re.search(r"\b(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b", text)
-    if not m:
-        m = re.search(r"\b(today|tomorrow|next\s+\w+)\b", text, re.I)
-    if m:
-        out["date"] = m.group(1).strip()
-
-    # Time range — 14:00 to 16:00 / 2 pm - 4 pm
-    m = re.search(r"\b((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\s*(?:-|–|to)\s*((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\b", text, re.I)
-    if m:
-        out["start"], out["end"] = m.group(1).strip(), m.group(2).strip()
-
-    # Booking ID — BK-####
-    m = re.search(r"\b(BK-\d+)\b", text, re.I)
-    if m:
-        out["booking_id"] = m.group(1).upper()
 
+# -------------------
+# Sanitize (explicit spans override; kill hallucinated booking ids)
+# -------------------
+def prefer_explicit(original: str, model_out: dict, spans: Spans | None = None) -> dict:
+    """Pass the `spans` from `regex_parse` to avoid re-scanning `original`."""
+    sp = spans or extract_spans(original)
+    out = dict(model_out) if model_out else {}
+    # booking id must literally appear
+    if sp.booking_id:
+        out["booking_id"] = sp.booking_id.group(1).upper()
+    else:
+        out.pop("booking_id", None)
+    # explicit date overrides
+    if sp.explicit_date:
+        out["date"] = sp.explicit_date.group(1).strip()
+    # explicit time range overrides
+    if sp.time_range:
+        out["start"], out["end"] = sp.time_range.group(1).strip(), sp.time_range.group(2).strip()
+    # explicit room overrides; a room not literally in the text is dropped
+    if sp.room:
+        out["room"] = sp.room.group(1).strip()
+    elif "room" in out and out["room"] not in original:
+        out.pop("room", None)
     return out
@@ -0,0 +1,365 @@
+"""
+Routing across several Ollama replicas.
+
+    OLLAMA_HOSTS="http://10.0.0.5:11434=2,http://10.0.0.6:11434"
+
+Each call goes to the healthy replica with the fewest outstanding requests
+for its weight (`=2` after a host; default 1). A replica leaves rotation
+after OLLAMA_FAIL_THRESHOLD consecutive failures (passive) or a failed
+/api/version probe (active, every OLLAMA_PROBE_INTERVAL seconds). A replica
+that failed a probe comes back on the next successful one. One that kept
+failing calls still answers probes, so it gets a single trial call after
+OLLAMA_EJECT_SECONDS instead, and comes back if that call succeeds.
+
+Parses are idempotent, so a call that cannot connect or gets a 5xx is
+retried on another replica, up to OLLAMA_RETRIES times. A stream is only
+retried before its first chunk. Timeouts are not retried (the model was
+slow, not down) and neither are 4xx. A timeout still counts as a failure
+toward ejection when the call had at least OLLAMA_HANG_SECONDS to answer,
+so a replica that hangs leaves rotation; a shorter one was cut by the
+caller's deadline and says nothing about the replica.
+
+Model-gate slots (nlp.admission) are PARSE_BATCH_CONCURRENCY per replica:
+they scale with `capacity()`, the healthy replicas counted by weight.
+
+`ReplicaRouter` and `AsyncReplicaRouter` have the same generate /
+generate_stream interface as the single-host clients, so the runners use
+them unchanged. `client_from_env` returns one when OLLAMA_HOSTS is set.
+
+Configuration (environment, all optional):
+    OLLAMA_PROBE_INTERVAL   5     (seconds; 0 disables active probes)
+    OLLAMA_FAIL_THRESHOLD   3
+    OLLAMA_EJECT_SECONDS    30
+    OLLAMA_HANG_SECONDS     10    (a timeout at least this long counts as a failure)
+"""
+import os
+import random
+import threading
+import time
+
+from .ollama_client import OllamaClient, OllamaError, OllamaTimeout, client_for
+
+
+class Replica:
+    def __init__(self, client, weight: float = 1.0, probe_client: OllamaClient | None = None):
+        if weight <= 0:
+            raise ValueError(f"replica weight must be positive, got {weight}")
+        self.client = client
+        self.host = client.host
+        self.weight = weight
+        # sync client for /api/version probes (the async router's clients are async)
+        self.probe_client = probe_client or client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.ejected_at: float | None = None
+        self.down_reason: str | None = None  # "probe" or "errors"
+        self.requests = 0
+        self.errors = 0
+        self.last_error: str | None = None
+
+    def snapshot(self) -> dict:
+        return {
+            "host": self.host, "weight": self.weight, "healthy": self.healthy,
+            "down_reason": self.down_reason,
+            "outstanding": self.outstanding, "requests": self.requests,
+            "errors": self.errors, "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+def parse_hosts(spec: str) -> list[tuple[str, float]]:
+    """'http://a:11434=2,b:11434' -> [('http://a:11434', 2.0), ('b:11434', 1.0)]"""
+    hosts = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        host, sep, weight = part.rpartition("=")
+        hosts.append((host, float(weight)) if sep else (part, 1.0))
+    return hosts
+
+
+def retryable(error: BaseException) -> bool:
+    """Connection failures and 5xx; a timeout or a 4xx would fail the same elsewhere."""
+    if isinstance(error, OllamaTimeout) or not isinstance(error, OllamaError):
+        return False
+    return error.status is None or error.status >= 500
+
+
+class _ReplicaSet:
+    """Selection and health bookkeeping shared by the sync and async routers."""
+
+    def __init__(self, replicas: list[Replica], retries: int = 1, fail_threshold: int = 3,
+                 eject_seconds: float = 30.0, probe_interval: float = 5.0,
+                 probe_timeout: float = 2.0, hang_seconds: float = 10.0):
+        if not replicas:
+            raise ValueError("at least one replica is required")
+        self.replicas = replicas
+        self.host = ",".join(r.host for r in replicas)
+        self.retries = retries
+        self.fail_threshold = fail_threshold
+        self.eject_seconds = eject_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.hang_seconds = hang_seconds
+        self.structured: bool | None = None
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._stop = threading.Event()
+        self._prober: threading.Thread | None = None
+        if probe_interval > 0:
+            self._prober = threading.Thread(target=self._probe_loop, name="ollama-probe", daemon=True)
+            self._prober.start()
+
+    def _usable(self, r: Replica, now: float) -> bool:
+        if r.healthy:
+            return True
+        # probe-ejected replicas wait for a probe; error-ejected ones get a trial call
+        return r.down_reason == "errors" and now - r.ejected_at >= self.eject_seconds
+
+    def _pick(self, tried: list[Replica]) -> Replica | None:
+        """Least outstanding requests per unit of weight; random among ties."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas if r not in tried and self._usable(r, now)]
+            if not candidates and not tried:
+                # everything is marked down: try anyway rather than fail outright
+                candidates = list(self.replicas)
+            if not candidates:
+                return None
+            best = min(candidates, key=lambda r: ((r.outstanding + 1) / r.weight, self._rng.random()))
+            if not best.healthy:
+                best.ejected_at = now  # one trial call per cool-down
+            best.outstanding += 1
+            best.requests += 1
+            return best
+
+    def capacity(self) -> float:
+        """Healthy replicas counted by weight (all of them when none is healthy)."""
+        with self._lock:
+            healthy = sum(r.weight for r in self.replicas if r.healthy)
+            return healthy or sum(r.weight for r in self.replicas)
+
+    def _failed(self, error: BaseException, timeout: float | None) -> bool:
+        """Whether `error` counts against the replica (see the module docstring)."""
+        if isinstance(error, OllamaTimeout):
+            return timeout is None or timeout >= self.hang_seconds
+        return retryable(error)
+
+    def _done(self, r: Replica, error: BaseException | None = None, timeout: float | None = None) -> None:
+        with self._lock:
+            r.outstanding -= 1
+            if error is None:
+                r.failures = 0
+                r.healthy, r.down_reason = True, None
+            elif self._failed(error, timeout):
+                r.errors += 1
+                r.failures += 1
+                r.last_error = str(error)
+                if r.failures >= self.fail_threshold and r.healthy:
+                    r.healthy, r.down_reason = False, "errors"
+                    r.ejected_at = time.monotonic()
+
+    def _attempts(self):
+        """Yield replicas to try in order; the caller stops once a call succeeds."""
+        tried: list[Replica] = []
+        while len(tried) <= self.retries:
+            r = self._pick(tried)
+            if r is None:
+                return
+            tried.append(r)
+            yield r
+
+    # -------------------
+    # Active health checks
+    # -------------------
+    def probe(self) -> None:
+        for r in self.replicas:
+            try:
+                r.probe_client.version(timeout=self.probe_timeout)
+                ok, err = True, None
+            except (OllamaError, ValueError) as e:
+                ok, err = False, str(e)
+            with self._lock:
+                if ok:
+                    if r.down_reason == "probe":
+                        r.healthy, r.down_reason, r.failures = True, None, 0
+                elif r.down_reason != "probe":
+                    r.healthy, r.down_reason = False, "probe"
+                    r.ejected_at, r.last_error = time.monotonic(), err
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            self.probe()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            replicas = [r.snapshot() for r in self.replicas]
+        return {"healthy": sum(r["healthy"] for r in replicas), "replicas": replicas}
+
+    def _stop_probing(self) -> None:
+        self._stop.set()
+
+
+class ReplicaRouter(_ReplicaSet):
+    """Drop-in for `OllamaClient` over several replicas."""
+
+    def generate(self, prompt: str, model: str, options: dict | None = None,
+                 timeout: float | None = None, **extra) -> dict:
+        error: BaseException = OllamaError(f"No replica available among {self.host}")
+        for r in self._attempts():
+            try:
+                res = r.client.generate(prompt, model, options=options, timeout=timeout, **extra)
+            except Exception as e:
+                self._done(r, e, timeout)
+                if not retryable(e):
+                    raise
+                error = e
+                continue
+            self._done(r)
+            return res
+        raise error
+
+    def generate_stream(self, prompt: str, model: str, options: dict | None = None,
+                        timeout: float | None = None, **extra):
+        error: BaseException = OllamaError(f"No replica available among {self.host}")
+        for r in self._attempts():
+            stream = r.client.generate_stream(prompt, model, options=options, timeout=timeout, **extra)
+            started, failure = False, None
+            try:
+                for chunk in stream:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                failure = e
+                if started or not retryable(e):
+                    raise
+                error = e
+            finally:
+                stream.close()
+                self._done(r, failure, timeout)
+        raise error
+
+    def version(self, timeout: float | None = None) -> dict:
+        for r in self._attempts():
+            try:
+                res = r.client.version(timeout=timeout)
+            except (OllamaError, ValueError) as e:
+                self._done(r, e, timeout)
+                continue
+            self._done(r)
+            return res
+        raise OllamaError(f"No replica available among {self.host}")
+
+    def supports_structured_output(self) -> bool:
+        """True only if every replica accepts a schema (calls may land on any of them)."""
+        if self.structured is None:
+            answers = [r.client.supports_structured_output() for r in self.replicas]
+            if all(r.client.structured is not None for r in self.replicas):
+                self.structured = all(answers)
+            return all(answers)
+        return self.structured
+
+    def close(self) -> None:
+        self._stop_probing()
+        for r in self.replicas:
+            r.client.close()
+
+
+class AsyncReplicaRouter(_ReplicaSet):
+    """Drop-in for `AsyncOllamaClient`; probes run on a thread with sync clients."""
+
+    def __init__(self, replicas: list[Replica], **kwargs):
+        for r in replicas:
+            if r.probe_client is r.client:
+                r.probe_client = OllamaClient(r.host, pool_size=1, retries=0)
+        super().__init__(replicas, **kwargs)
+
+    async def generate(self, prompt: str, model: str, options: dict | None = None,
+                       timeout: float | None = None, **extra) -> dict:
+        error: BaseException = OllamaError(f"No replica available among {self.host}")
+        for r in self._attempts():
+            try:
+                res = await r.client.generate(prompt, model, options=options, timeout=timeout, **extra)
+            except Exception as e:
+                self._done(r, e, timeout)
+                if not retryable(e):
+                    raise
+                error = e
+                continue
+            except BaseException:
+                self._done(r)  # cancelled: not the replica's fault
+                raise
+            self._done(r)
+            return res
+        raise error
+
+    async def generate_stream(self, prompt: str, model: str, options: dict | None = None,
+                              timeout: float | None = None, **extra):
+        error: BaseException = OllamaError(f"No replica available among {self.host}")
+        for r in self._attempts():
+            stream = r.client.generate_stream(prompt, model, options=options, timeout=timeout, **extra)
+            started, failure = False, None
+            try:
+                async for chunk in stream:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                failure = e
+                if started or not retryable(e):
+                    raise
+                error = e
+            finally:
+                await stream.aclose()
+                self._done(r, failure, timeout)
+        raise error
+
+    async def supports_structured_output(self) -> bool:
+        if self.structured is None:
+            answers = [await r.client.supports_structured_output() for r in self.replicas]
+            if all(r.client.structured is not None for r in self.replicas):
+                self.structured = all(answers)
+            return all(answers)
+        return self.structured
+
+    async def close(self) -> None:
+        self._stop_probing()
+        for r in self.replicas:
+            await r.client.close()
+            r.probe_client.close()
+
+
+def _router_settings() -> dict:
+    env = os.environ
+    return dict(
+        retries=int(env.get("OLLAMA_RETRIES", "2")),
+        fail_threshold=int(env.get("OLLAMA_FAIL_THRESHOLD", "3")),
+        eject_seconds=float(env.get("OLLAMA_EJECT_SECONDS", "30")),
+        probe_interval=float(env.get("OLLAMA_PROBE_INTERVAL", "5")),
+        probe_timeout=float(env.get("OLLAMA_CONNECT_TIMEOUT", "2.0")),
+        hang_seconds=float(env.get("OLLAMA_HANG_SECONDS", "10")),
+    )
+
+
+def router_from_env() -> ReplicaRouter:
+    # retries happen across replicas, so each client gives up on the first failure
+    replicas = [Replica(client_for(host, retries=0), weight)
+                for host, weight in parse_hosts(os.environ["OLLAMA_HOSTS"])]
+    return ReplicaRouter(replicas, **_router_settings())
+
+
+def async_router_from_env() -> AsyncReplicaRouter:
+    from .async_client import async_client_for
+    replicas = [Replica(async_client_for(host, retries=0), weight)
+                for host, weight in parse_hosts(os.environ["OLLAMA_HOSTS"])]
+    return AsyncReplicaRouter(replicas, **_router_settings())
+
+
+def backend_health(client) -> dict | None:
+    """Per-replica state for /healthz, or None for a single-host client."""
+    return client.snapshot() if isinstance(client, _ReplicaSet) else None
+
+
+def backend_capacity(client):
+    """`capacity` of a router, for scaling model-gate slots; None for a single-host client."""
+    return client.capacity if isinstance(client, _ReplicaSet) else None
@@ -1,7 +1,13 @@
 import json
-import subprocess
 import sys
-from prompt import build_prompt
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # allow `python run_tinyllama.py ...` from inside nlp/
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nlp.ollama_client import get_client
+from nlp.prompt import build_prompt
 
 def extract_first_json(text: str) -> str:
     """Find the first balanced JSON object in the model's output."""
@@ -34,15 +40,7 @@ def run_tinyllama(utterance: str, model: str = "room-nlu") -> dict:
     Call the local Ollama model with the built prompt and return parsed JSON.
     """
     prompt = build_prompt(utterance)
-    res = subprocess.run(
-        ["ollama", "run", model],
-        input=prompt.encode("utf-8"),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        check=True
-    )
-
-    raw_output = res.stdout.decode("utf-8").strip()
+    raw_output = get_client().generate(prompt, model).get("response", "").strip()
     try:
         json_text = extract_first_json(raw_output)
         return json.loads(json_text)
@@ -0,0 +1,83 @@
+"""
+Output schema for the extractor, used for constrained generation.
+
+Ollama (>= 0.5) accepts a JSON schema in the `format` field and decodes
+under that grammar, so the reply is exactly one object with these keys and
+no prose: no fence stripping, brace hunting or 'Key: Value' fallback needed.
+"""
+from .prompt import estimate_tokens
+
+FIELDS = ("intent", "room", "building", "date", "start", "end", "booking_id")
+INTENTS = ("book", "cancel", "check_availability", "modify")
+
+# Longest value we expect per field, used to size num_predict.
+_MAX_VALUE_CHARS = 24
+
+OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": list(INTENTS)},
+        **{f: {"type": "string", "maxLength": _MAX_VALUE_CHARS} for f in FIELDS[1:]},
+    },
+    "required": ["intent"],
+    "additionalProperties": False,
+}
+
+
+# Slots worth asking the model for, per intent. booking_id is never asked:
+# `prefer_explicit` drops any id that is not literally in the text, so the
+# regex span is the only source that survives.
+INTENT_SLOTS = {
+    "book": ("room", "date", "start", "end"),
+    "check_availability": ("room", "date", "start", "end"),
+    "modify": ("date", "start", "end"),
+    "cancel": ("room", "date", "start"),  # identify the booking without an id
+}
+
+
+def gap_fields(known: dict) -> tuple:
+    """
+    Fields still missing from a partial (regex) parse, in FIELDS order.
+    Without an intent everything but booking_id is wanted; building is only
+    wanted when no room was found.
+    """
+    intent = known.get("intent")
+    wanted = set(INTENT_SLOTS.get(intent, ())) if intent else set(FIELDS) - {"booking_id"}
+    if "room" in wanted and "room" not in known:
+        wanted.add("building")
+    return tuple(f for f in FIELDS if f in wanted and f not in known)
+
+
+def schema_for(fields) -> dict:
+    """OUTPUT_SCHEMA restricted to `fields` (nothing required)."""
+    props = {f: OUTPUT_SCHEMA["properties"][f] for f in fields}
+    return {"type": "object", "properties": props, "additionalProperties": False}
+
+
+def num_predict_for(fields=FIELDS) -> int:
+    """Token cap for a reply holding every field at its maximum length."""
+    widest = {f: "x" * _MAX_VALUE_CHARS for f in fields}
+    text = "{" + ", ".join(f'"{k}": "{v}"' for k, v in widest.items()) + "}"
+    return estimate_tokens(text) + 8
+
+
+NUM_PREDICT = num_predict_for()
+
+
+def validate(obj) -> dict:
+    """
+    Single pass over a decoded reply: keep known fields whose values are
+    non-empty strings (numbers, e.g. "start": 14, become strings) and drop
+    the rest. Raises ValueError if `obj` is not an object.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError(f"Expected a JSON object, got {type(obj).__name__}")
+    out = {}
+    for key, value in obj.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if key in OUTPUT_SCHEMA["properties"] and isinstance(value, str):
+            value = value.strip()
+            if value and (key != "intent" or value in INTENTS):
+                out[key] = value
+    return out
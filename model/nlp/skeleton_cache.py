@@ -0,0 +1,257 @@
+"""
+Skeleton cache: reuse a model answer across utterances that differ only in
+their slot values.
+
+The exact-match result cache (`nlp.cache`) rarely hits, because nearly every
+utterance names a different room, date or time. Here the spans found by the
+regex patterns (ROOM_RE, DATE_LONG_RE, DATE_SLASH_RE, RELATIVE_DATE_RE,
+TIME_RANGE_RE, BK_RE) are replaced with typed placeholders, so
+
+    Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed
+    Reserve TT 101 3 Oct 9:00 to 10:00 projector needed
+
+both become "Reserve <ROOM1> <DATE1> <TIME1> to <TIME2> projector needed".
+The model answer is stored with every value that was copied from a span
+replaced by its placeholder, and a hit re-fills those from the new
+utterance's spans. Answers that cannot be templated safely are not stored:
+a value that sits inside a span without being the whole span ("SJT" out of
+"SJT 315"), or one with digits that appears nowhere in the skeleton (most
+likely derived from a slot value, e.g. a reformatted date).
+
+Keys carry the prompt fingerprint, model name and gap fields exactly like
+`cache_key`. LRU with a per-entry TTL, memory only. Per-skeleton hit and
+miss counts are kept for the busiest skeletons and exported on /metrics
+(`nlu_skeleton_cache_skeleton`, labelled by a short id) and /healthz.
+
+Configuration (environment, all optional):
+    PARSE_SKELETON_CACHE_SIZE  1024   (entries; 0 disables the skeleton cache)
+    PARSE_SKELETON_CACHE_TTL   86400  (seconds; 0 = never expire)
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .cache import cache_key, normalize_utterance
+from .regex_parser import BK_RE, DATE_LONG_RE, DATE_SLASH_RE, RELATIVE_DATE_RE, ROOM_RE, TIME_RANGE_RE
+
+# (placeholder type, pattern); every capture group is one slot. On overlap
+# the earlier span wins, then the longer one.
+SLOT_PATTERNS = (
+    ("BK", BK_RE),
+    ("ROOM", ROOM_RE),
+    ("DATE", DATE_LONG_RE),
+    ("DATE", DATE_SLASH_RE),
+    ("DATE", RELATIVE_DATE_RE),
+    ("TIME", TIME_RANGE_RE),
+)
+_PLACEHOLDER_RE = re.compile(r"<[A-Z]+\d+>")
+_DIGIT_RE = re.compile(r"\d")
+
+
+class Skeleton(NamedTuple):
+    text: str              # utterance with slot spans replaced by placeholders
+    values: dict           # placeholder -> span text
+
+
+def skeletonize(utterance: str) -> Skeleton | None:
+    """Typed-placeholder skeleton of `utterance`; None when it has no slot spans."""
+    text = normalize_utterance(utterance)
+    found = []
+    for kind, pattern in SLOT_PATTERNS:
+        for m in pattern.finditer(text):
+            for g in range(1, (pattern.groups or 0) + 1):
+                start, end = m.span(g)
+                value = text[start:end]
+                start += len(value) - len(value.lstrip())
+                end -= len(value) - len(value.rstrip())
+                if start < end:
+                    found.append((start, -end, kind))
+    if not found:
+        return None
+    found.sort()
+    parts, values, counts, pos = [], {}, {}, 0
+    for start, neg_end, kind in found:
+        if start < pos:
+            continue  # overlaps a span already taken
+        counts[kind] = counts.get(kind, 0) + 1
+        placeholder = f"<{kind}{counts[kind]}>"
+        parts.append(text[pos:start])
+        parts.append(placeholder)
+        values[placeholder] = text[start:-neg_end]
+        pos = -neg_end
+    parts.append(text[pos:])
+    return Skeleton("".join(parts), values)
+
+
+def to_template(model_out: dict, skeleton: Skeleton) -> dict | None:
+    """
+    `model_out` with span values swapped for their placeholders, or None when
+    some value cannot be re-derived from another utterance with this skeleton.
+    """
+    by_value = {v.lower(): p for p, v in skeleton.values.items()}
+    literal_text = _PLACEHOLDER_RE.sub(" ", skeleton.text).lower()
+    template = {}
+    for field, value in model_out.items():
+        if field == "intent" or not isinstance(value, str) or not value.strip():
+            template[field] = value
+            continue
+        v = value.strip().lower()
+        if v in by_value:
+            template[field] = by_value[v]
+        elif re.search(rf"(?<!\w){re.escape(v)}(?!\w)", literal_text):
+            template[field] = value
+        elif any(v in span.lower() for span in skeleton.values.values()) or _DIGIT_RE.search(v):
+            return None
+        else:
+            template[field] = value  # inferred from the wording ("afternoon" -> "12:00")
+    return template
+
+
+def fill(template: dict, skeleton: Skeleton) -> dict:
+    """Inverse of `to_template` for another utterance with the same skeleton."""
+    return {k: skeleton.values.get(v, v) if isinstance(v, str) else v for k, v in template.items()}
+
+
+def skeleton_id(text: str) -> str:
+    """Short stable id for a skeleton, used as the metric label."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+class SkeletonCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400.0, tracked: int | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # skeleton text -> [hits, misses], LRU-bounded separately from the entries
+        self.tracked = tracked if tracked is not None else 4 * max_entries
+        self._mem: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._per_skeleton: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0,
+                      "evictions": 0, "expirations": 0}
+
+    def _count(self, skeleton: Skeleton, hit: bool) -> None:
+        # caller holds the lock
+        counts = self._per_skeleton.get(skeleton.text)
+        if counts is None:
+            counts = self._per_skeleton[skeleton.text] = [0, 0]
+            while len(self._per_skeleton) > self.tracked:
+                self._per_skeleton.popitem(last=False)
+        else:
+            self._per_skeleton.move_to_end(skeleton.text)
+        counts[0 if hit else 1] += 1
+
+    def get(self, key: str, skeleton: Skeleton) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if self.ttl <= 0 or now - entry[0] <= self.ttl:
+                    self._mem.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self._count(skeleton, True)
+                    return fill(entry[1], skeleton)
+                del self._mem[key]
+                self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            self._count(skeleton, False)
+            return None
+
+    def put(self, key: str, skeleton: Skeleton, model_out: dict) -> bool:
+        """Store `model_out` as a template; False when it cannot be templated."""
+        template = to_template(model_out, skeleton)
+        with self._lock:
+            if template is None:
+                self.stats["uncacheable"] += 1
+                return False
+            self._mem[key] = (time.time(), template)
+            self._mem.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                self.stats["evictions"] += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._per_skeleton.clear()
+
+    def top(self, n: int = 10) -> list[dict]:
+        """The `n` skeletons with the most lookups, with their hit rates."""
+        with self._lock:
+            items = [(text, h, m) for text, (h, m) in self._per_skeleton.items()]
+        items.sort(key=lambda item: item[1] + item[2], reverse=True)
+        return [{"id": skeleton_id(text), "skeleton": text, "hits": h, "misses": m,
+                 "hit_rate": round(h / (h + m), 4)} for text, h, m in items[:n]]
+
+    def snapshot(self, top: int = 10) -> dict:
+        with self._lock:
+            stats = {**self.stats, "size": len(self._mem), "max_entries": self.max_entries,
+                     "skeletons_tracked": len(self._per_skeleton)}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["top"] = self.top(top)
+        return stats
+
+
+def skeleton_cache_from_env() -> SkeletonCache | None:
+    env = os.environ
+    size = int(env.get("PARSE_SKELETON_CACHE_SIZE", "1024"))
+    if size <= 0:
+        return None
+    return SkeletonCache(max_entries=size, ttl=float(env.get("PARSE_SKELETON_CACHE_TTL", "86400")))
+
+
+_default_cache: SkeletonCache | None = None
+_default_loaded = False
+_default_lock = threading.Lock()
+
+
+def get_skeleton_cache() -> SkeletonCache | None:
+    """Process-wide skeleton cache built from the environment; None when disabled."""
+    global _default_cache, _default_loaded
+    if not _default_loaded:
+        with _default_lock:
+            if not _default_loaded:
+                _default_cache = skeleton_cache_from_env()
+                _default_loaded = True
+    return _default_cache
+
+
+class Lookup(NamedTuple):
+    cache: SkeletonCache
+    key: str
+    skeleton: Skeleton
+
+    def store(self, model_out: dict) -> None:
+        self.cache.put(self.key, self.skeleton, model_out)
+
+
+def lookup(utterance: str, model_name: str, fields: tuple | None = None) -> tuple[dict | None, Lookup | None]:
+    """
+    (refilled answer or None, handle to `store` the model answer under).
+    The handle is None when the cache is off or the utterance has no spans.
+    """
+    cache = get_skeleton_cache()
+    if cache is None:
+        return None, None
+    skeleton = skeletonize(utterance)
+    if skeleton is None:
+        return None, None
+    handle = Lookup(cache, cache_key(skeleton.text, model_name, fields=fields), skeleton)
+    return cache.get(handle.key, skeleton), handle
+
+
+def skeleton_run(utterance: str, model_name: str, run, fields: tuple | None = None) -> tuple[dict, bool]:
+    """Like `cached_run` for the skeleton cache: (model_output, was_refilled)."""
+    hit, handle = lookup(utterance, model_name, fields)
+    if hit is not None:
+        return hit, True
+    value = run()
+    if handle is not None:
+        handle.store(value)
+    return value, False
@@ -0,0 +1,453 @@
+"""
+Small learned intent/slot model: the tier between regex and the LLM.
+
+Two linear models over hashed features, with weights stored as NumPy arrays:
+
+    intent   softmax over word unigrams and bigrams of the utterance
+    slots    per-token BIO tagger (B-room, I-room, B-date, ...) over the
+             token, its shape, affixes and neighbours
+
+Inference for a batch is a handful of array operations: gather the weight
+rows of every feature of every token, `np.add.reduceat` them into logits,
+softmax. Spans are returned verbatim from the utterance.
+
+`confidence` is the probability that the whole parse is right: the intent
+probability times every token's label probability, calibrated on a
+held-out split at training time (a temperature per softmax, then a power
+on the product fitted to exact-match outcomes), so it can be compared
+against a fixed threshold (PARSE_LEARNED_THRESHOLD in the pipeline). It is
+also scaled by the share of (alphabetic) words seen in training, since a linear model
+is confidently wrong about text unlike anything it was trained on.
+
+Training reads logged request/response pairs (JSONL). Each line needs the
+utterance ("utterance", or "request.utterance") and the answer's fields
+under "parse", "response" or "result" (or at the top level). Spans are
+labelled wherever a field value occurs verbatim in the utterance.
+
+    python -m nlp.slot_model train logs.jsonl -o slot_model.npz
+    python -m nlp.slot_model eval slot_model.npz heldout.jsonl
+    PARSE_LEARNED_MODEL=slot_model.npz python -m api.app
+
+NumPy is only needed here and is imported on first use; without
+PARSE_LEARNED_MODEL the pipeline never loads this module's model.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from typing import Iterable
+
+from .schema import FIELDS
+
+SLOTS = tuple(f for f in FIELDS if f != "intent")
+TAGS = ("O",) + tuple(f"{p}-{s}" for s in SLOTS for p in ("B", "I"))
+DEFAULT_DIM = 1 << 18
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SHAPE_RE = (re.compile(r"[A-Z]+"), re.compile(r"[a-z]+"), re.compile(r"\d+"))
+
+
+def _np():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("the learned tier needs numpy (pip install numpy)") from None
+    return numpy
+
+
+# -------------------
+# Features
+# -------------------
+def tokenize(text: str) -> list[tuple[str, int, int]]:
+    """(token, start, end) character spans."""
+    return [(m.group(0), m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+
+
+def shape(tok: str) -> str:
+    """"SJT" -> "X", "315" -> "d", "Sept" -> "Xx", "14" ":" "00" -> "d" ":" "d"."""
+    for pat, ch in zip(_SHAPE_RE, "Xxd"):
+        tok = pat.sub(ch, tok)
+    return tok
+
+
+def _hash(feature: str, mask: int) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & mask
+
+
+def intent_features(tokens: list[str], mask: int) -> list[int]:
+    words = [t.lower() for t in tokens]
+    feats = ["bias"] + [f"u={w}" for w in words] + [f"b={a}_{b}" for a, b in zip(words, words[1:])]
+    return [_hash(f, mask) for f in feats]
+
+
+def token_features(tokens: list[str], mask: int) -> list[list[int]]:
+    words = [t.lower() for t in tokens]
+    shapes = [shape(t) for t in tokens]
+    pad_w, pad_s = ["<s>", "<s>"] + words + ["</s>", "</s>"], ["<s>", "<s>"] + shapes + ["</s>", "</s>"]
+    out = []
+    for i, w in enumerate(words):
+        j = i + 2
+        feats = ("bias", f"w={w}", f"s={shapes[i]}", f"p3={w[:3]}", f"x3={w[-3:]}",
+                 f"w-1={pad_w[j - 1]}", f"w+1={pad_w[j + 1]}", f"w-2={pad_w[j - 2]}", f"w+2={pad_w[j + 2]}",
+                 f"s-1={pad_s[j - 1]}", f"s+1={pad_s[j + 1]}", f"w-1w={pad_w[j - 1]}_{w}",
+                 f"ww+1={w}_{pad_w[j + 1]}")
+        out.append([_hash(f, mask) for f in feats])
+    return out
+
+
+def _softmax(np, z, temperature: float = 1.0):
+    z = z / temperature
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _logits(np, W, b, rows: list[list[int]]):
+    """One row of logits per feature list: the sum of its weight rows, plus bias."""
+    lengths = [len(r) for r in rows]
+    flat = np.fromiter((i for r in rows for i in r), dtype=np.int64, count=sum(lengths))
+    offsets = np.zeros(len(rows), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    return np.add.reduceat(W[flat], offsets, axis=0) + b
+
+
+# -------------------
+# Model
+# -------------------
+class SlotModel:
+    def __init__(self, intents: list[str], intent_W, intent_b, tag_W, tag_b, seen,
+                 intent_temperature: float = 1.0, tag_temperature: float = 1.0,
+                 confidence_power: float = 1.0, meta: dict | None = None):
+        self.np = _np()
+        self.intents = intents  # "" means no intent
+        self.intent_W, self.intent_b = intent_W, intent_b
+        self.tag_W, self.tag_b = tag_W, tag_b
+        self.seen = seen  # bool per hash bucket: a "w=" token feature seen in training
+        self.dim = intent_W.shape[0]
+        self.mask = self.dim - 1
+        self.intent_temperature = intent_temperature
+        self.tag_temperature = tag_temperature
+        self.confidence_power = confidence_power
+        self.meta = meta or {}
+
+    def predict_many(self, utterances: list[str]) -> list[dict]:
+        """
+        Batched inference. Each result: {"fields": {...}, "confidence": p,
+        "intent_confidence": p}; fields hold verbatim spans of the utterance.
+        """
+        np = self.np
+        toks = [tokenize(u) for u in utterances]
+        if not utterances:
+            return []
+        intent_p = _softmax(np, _logits(np, self.intent_W, self.intent_b,
+                                        [intent_features([t for t, _, _ in ts], self.mask) for ts in toks]),
+                            self.intent_temperature)
+        rows = [f for ts in toks for f in token_features([t for t, _, _ in ts], self.mask)]
+        tag_p = (_softmax(np, _logits(np, self.tag_W, self.tag_b, rows), self.tag_temperature)
+                 if rows else np.zeros((0, len(TAGS))))
+        tag_best = tag_p.argmax(axis=1)
+        tag_conf = tag_p.max(axis=1)
+        # numbers are open-class (room numbers, times): only words can be unknown
+        words = [t for ts in toks for t, _, _ in ts]
+        known = np.array([bool(self.seen[r[1]]) or not w.isalpha() for w, r in zip(words, rows)], dtype=bool)
+
+        out, pos = [], 0
+        for u, ts, ip in zip(utterances, toks, intent_p):
+            k = int(ip.argmax())
+            labels = tag_best[pos:pos + len(ts)]
+            conf = float(ip[k] * np.prod(tag_conf[pos:pos + len(ts)])) ** self.confidence_power
+            if ts:
+                conf *= float(known[pos:pos + len(ts)].mean())
+            pos += len(ts)
+            fields = decode(u, ts, [TAGS[i] for i in labels])
+            if self.intents[k]:
+                fields["intent"] = self.intents[k]
+            out.append({"fields": fields, "confidence": round(conf, 4),
+                        "intent_confidence": round(float(ip[k]), 4)})
+        return out
+
+    def predict(self, utterance: str) -> dict:
+        return self.predict_many([utterance])[0]
+
+    def save(self, path: str) -> None:
+        meta = {**self.meta, "intents": self.intents, "tags": list(TAGS),
+                "intent_temperature": self.intent_temperature, "tag_temperature": self.tag_temperature,
+                "confidence_power": self.confidence_power}
+        self.np.savez_compressed(path, intent_W=self.intent_W, intent_b=self.intent_b,
+                                 tag_W=self.tag_W, tag_b=self.tag_b, seen=self.np.packbits(self.seen),
+                                 meta=json.dumps(meta))
+
+    @classmethod
+    def load(cls, path: str) -> "SlotModel":
+        np = _np()
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("tags") != list(TAGS):
+                raise ValueError(f"{path} was trained for other slots: {meta.get('tags')}")
+            seen = np.unpackbits(z["seen"], count=z["intent_W"].shape[0]).astype(bool)
+            return cls(meta["intents"], z["intent_W"], z["intent_b"], z["tag_W"], z["tag_b"], seen,
+                       meta["intent_temperature"], meta["tag_temperature"],
+                       meta.get("confidence_power", 1.0), meta)
+
+
+def decode(utterance: str, tokens: list[tuple[str, int, int]], labels: list[str]) -> dict:
+    """BIO labels -> {slot: verbatim span}; the first span of each slot wins."""
+    fields, current, start, end = {}, None, 0, 0
+
+    def close():
+        if current and current not in fields:
+            fields[current] = utterance[start:end]
+
+    for (_, s, e), label in zip(tokens, labels):
+        if label == "O":
+            close()
+            current = None
+            continue
+        prefix, slot = label.split("-", 1)
+        if prefix == "I" and slot == current:
+            end = e
+            continue
+        close()
+        current, start, end = slot, s, e
+    close()
+    return fields
+
+
+def label_tokens(utterance: str, tokens: list[tuple[str, int, int]], fields: dict) -> list[str]:
+    """BIO labels for the fields whose value occurs verbatim (ignoring case) in the utterance."""
+    labels = ["O"] * len(tokens)
+    lower = utterance.lower()
+    for slot in SLOTS:
+        value = fields.get(slot)
+        if not isinstance(value, str) or not value.strip():
+            continue
+        at = lower.find(value.strip().lower())
+        if at < 0:
+            continue
+        stop = at + len(value.strip())
+        covered = [i for i, (_, s, e) in enumerate(tokens) if s < stop and e > at]
+        if not covered or any(labels[i] != "O" for i in covered):
+            continue
+        for n, i in enumerate(covered):
+            labels[i] = ("B-" if n == 0 else "I-") + slot
+    return labels
+
+
+# -------------------
+# Training
+# -------------------
+def read_examples(lines: Iterable[str]) -> list[tuple[str, dict]]:
+    """(utterance, fields) pairs from JSONL log lines; unusable lines are skipped."""
+    out = []
+    for line in lines:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(rec, dict):
+            continue
+        req = rec.get("request") if isinstance(rec.get("request"), dict) else rec
+        utterance = req.get("utterance")
+        fields = next((rec[k] for k in ("parse", "response", "result") if isinstance(rec.get(k), dict)), rec)
+        if isinstance(utterance, str) and utterance.strip() and "error" not in fields:
+            out.append((utterance.strip(), {k: fields[k] for k in FIELDS if k in fields}))
+    return out
+
+
+def _fit_softmax(np, rows: list[list[int]], y, n_classes: int, dim: int, epochs: int,
+                 lr: float, batch: int, rng):
+    """Multinomial logistic regression on hashed features, mini-batch Adagrad."""
+    W = np.zeros((dim, n_classes), dtype=np.float32)
+    b = np.zeros(n_classes, dtype=np.float32)
+    acc_W = np.full((dim, n_classes), 1e-6, dtype=np.float32)
+    acc_b = np.full(n_classes, 1e-6, dtype=np.float32)
+    y = np.asarray(y)
+    for _ in range(epochs):
+        order = rng.permutation(len(rows))
+        for lo in range(0, len(order), batch):
+            idx = order[lo:lo + batch]
+            sub = [rows[i] for i in idx]
+            g = _softmax(np, _logits(np, W, b, sub))
+            g[np.arange(len(idx)), y[idx]] -= 1.0
+            g /= len(idx)
+            flat = np.fromiter((f for r in sub for f in r), dtype=np.int64)
+            uniq, inv = np.unique(flat, return_inverse=True)
+            gW = np.zeros((len(uniq), n_classes), dtype=np.float32)
+            np.add.at(gW, inv, np.repeat(g, [len(r) for r in sub], axis=0))
+            gb = g.sum(axis=0)
+            acc_W[uniq] += gW * gW
+            acc_b += gb * gb
+            W[uniq] -= lr * gW / np.sqrt(acc_W[uniq])
+            b -= lr * gb / np.sqrt(acc_b)
+    return W, b
+
+
+def _fit_temperature(np, logits, y) -> float:
+    """Temperature minimizing held-out negative log-likelihood."""
+    if len(y) == 0:
+        return 1.0
+    y = np.asarray(y)
+    best, best_nll = 1.0, float("inf")
+    for t in np.geomspace(0.05, 8.0, 81):
+        p = _softmax(np, logits, t)[np.arange(len(y)), y]
+        nll = float(-np.log(np.clip(p, 1e-12, None)).mean())
+        if nll < best_nll:
+            best, best_nll = float(t), nll
+    return best
+
+
+def _fit_power(np, conf, correct) -> float:
+    """Exponent on the confidence minimizing held-out log-loss against exact match."""
+    if len(conf) == 0:
+        return 1.0
+    conf, correct = np.clip(np.asarray(conf), 1e-6, 1.0), np.asarray(correct, dtype=float)
+    best, best_nll = 1.0, float("inf")
+    for a in np.geomspace(0.05, 4.0, 81):
+        p = np.clip(conf ** a, 1e-6, 1 - 1e-6)
+        nll = float(-(correct * np.log(p) + (1 - correct) * np.log(1 - p)).mean())
+        if nll < best_nll:
+            best, best_nll = float(a), nll
+    return best
+
+
+def exact_match(utterance: str, gold: dict, got: dict) -> bool:
+    """Whether `got` has the intent and exactly the verbatim slots of `gold`."""
+    want = {k: v for k, v in gold.items()
+            if k == "intent" or k in SLOTS and isinstance(v, str) and v.strip().lower() in utterance.lower()}
+
+    def norm(d: dict) -> dict:
+        return {k: str(v).strip().lower() for k, v in d.items()}
+    return norm(want) == norm(got)
+
+
+def train(examples: list[tuple[str, dict]], dim: int = DEFAULT_DIM, epochs: int = 8,
+          lr: float = 0.5, batch: int = 32, holdout: float = 0.1, seed: int = 0) -> SlotModel:
+    """Fit both heads; temperatures are fitted on a `holdout` share kept out of training."""
+    np = _np()
+    if dim & (dim - 1):
+        raise ValueError("dim must be a power of two")
+    if not examples:
+        raise ValueError("no usable training examples")
+    rng = np.random.default_rng(seed)
+    mask = dim - 1
+    intents = sorted({f.get("intent") or "" for _, f in examples})
+    intent_of = {name: i for i, name in enumerate(intents)}
+    tag_of = {t: i for i, t in enumerate(TAGS)}
+
+    order = rng.permutation(len(examples))
+    n_hold = int(len(examples) * holdout) if len(examples) >= 20 else 0
+    splits = {"hold": order[:n_hold], "train": order[n_hold:]}
+    data = {}
+    for name, ids in splits.items():
+        i_rows, i_y, t_rows, t_y = [], [], [], []
+        for k in ids:
+            utterance, fields = examples[k]
+            toks = tokenize(utterance)
+            words = [t for t, _, _ in toks]
+            i_rows.append(intent_features(words, mask))
+            i_y.append(intent_of[fields.get("intent") or ""])
+            t_rows.extend(token_features(words, mask))
+            t_y.extend(tag_of[label] for label in label_tokens(utterance, toks, fields))
+        data[name] = (i_rows, i_y, t_rows, t_y)
+
+    i_rows, i_y, t_rows, t_y = data["train"]
+    intent_W, intent_b = _fit_softmax(np, i_rows, i_y, len(intents), dim, epochs, lr, batch, rng)
+    tag_W, tag_b = _fit_softmax(np, t_rows, t_y, len(TAGS), dim, epochs, lr, batch, rng)
+
+    h_i_rows, h_i_y, h_t_rows, h_t_y = data["hold"]
+    intent_t = _fit_temperature(np, _logits(np, intent_W, intent_b, h_i_rows), h_i_y) if h_i_rows else 1.0
+    tag_t = _fit_temperature(np, _logits(np, tag_W, tag_b, h_t_rows), h_t_y) if h_t_rows else 1.0
+    meta = {"examples": len(examples), "holdout": n_hold, "dim": dim, "epochs": epochs,
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    seen = np.zeros(dim, dtype=bool)
+    seen[[r[1] for r in t_rows]] = True
+    model = SlotModel(intents, intent_W, intent_b, tag_W, tag_b, seen, intent_t, tag_t, 1.0, meta)
+    held = [examples[k] for k in splits["hold"]]
+    if held:
+        preds = model.predict_many([u for u, _ in held])
+        model.confidence_power = _fit_power(np, [p["confidence"] for p in preds],
+                                            [exact_match(u, g, p["fields"]) for (u, g), p in zip(held, preds)])
+    return model
+
+
+def evaluate(model: SlotModel, examples: list[tuple[str, dict]], thresholds=(0.5, 0.7, 0.8, 0.9, 0.95)) -> dict:
+    """Exact-match accuracy, calibration and coverage at each confidence threshold."""
+    np = model.np
+    t0 = time.perf_counter()
+    preds = model.predict_many([u for u, _ in examples])
+    batch_s = time.perf_counter() - t0
+    exact = [exact_match(u, gold, p["fields"]) for (u, gold), p in zip(examples, preds)]
+    conf = np.array([p["confidence"] for p in preds])
+    exact = np.array(exact, dtype=float)
+    bins = np.minimum((conf * 10).astype(int), 9)
+    ece = sum(abs(exact[bins == i].mean() - conf[bins == i].mean()) * (bins == i).mean()
+              for i in range(10) if (bins == i).any())
+    return {
+        "examples": len(examples),
+        "exact_match": round(float(exact.mean()), 4) if len(exact) else None,
+        "mean_confidence": round(float(conf.mean()), 4) if len(conf) else None,
+        "ece": round(float(ece), 4),
+        "batch_us_per_utterance": round(batch_s / max(1, len(examples)) * 1e6, 2),
+        "thresholds": {
+            str(t): {"coverage": round(float((conf >= t).mean()), 4),
+                     "accuracy": round(float(exact[conf >= t].mean()), 4) if (conf >= t).any() else None}
+            for t in thresholds
+        },
+    }
+
+
+# -------------------
+# Process-wide model
+# -------------------
+_default_model: SlotModel | None = None
+_default_path: str | None = None
+_default_lock = threading.Lock()
+
+
+def get_slot_model() -> SlotModel | None:
+    """The model at PARSE_LEARNED_MODEL, loaded once; None when it is unset."""
+    global _default_model, _default_path
+    path = os.environ.get("PARSE_LEARNED_MODEL")
+    if not path:
+        return None
+    if _default_path != path:
+        with _default_lock:
+            if _default_path != path:
+                _default_model, _default_path = SlotModel.load(path), path
+    return _default_model
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train", help="train from JSONL logs")
+    t.add_argument("logs", nargs="+")
+    t.add_argument("-o", "--output", default="slot_model.npz")
+    t.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    t.add_argument("--epochs", type=int, default=8)
+    t.add_argument("--holdout", type=float, default=0.1)
+    e = sub.add_parser("eval", help="accuracy, calibration and coverage on JSONL logs")
+    e.add_argument("model")
+    e.add_argument("logs", nargs="+")
+    args = ap.parse_args()
+
+    examples = []
+    for path in args.logs:
+        with open(path, encoding="utf-8") as f:
+            examples.extend(read_examples(f))
+    if args.cmd == "train":
+        t0 = time.perf_counter()
+        model = train(examples, dim=args.dim, epochs=args.epochs, holdout=args.holdout)
+        model.save(args.output)
+        print(f"trained on {len(examples)} examples in {time.perf_counter() - t0:.1f}s -> {args.output}",
+              file=sys.stderr)
+    else:
+        print(json.dumps(evaluate(SlotModel.load(args.model), examples), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,257 +1,185 @@
 # streamlit_app.py
+"""
+Room NLU demo: one utterance stage by stage, or a bulk CSV/JSONL upload
+parsed concurrently with live progress.
+
+    streamlit run nlp/streamlit_app.py
+
+Streamlit reruns this script on every interaction, so the expensive parts
+live outside the script's reruns. The Ollama client and the learned model
+are the process-wide singletons the pipeline itself uses (`get_client`,
+`get_slot_model`); the regex patterns are compiled once at import of
+nlp.regex_parser. Per-utterance results are `st.cache_data`, keyed on the
+utterance, settings and prompt fingerprint, so editing the prompt template
+or Modelfile re-parses everything while a rerun does not. Failed and
+degraded parses are not memoized: the next rerun asks the model again.
+
+Rows go through the same tiers as the API (regex -> learned -> cache ->
+skeleton -> model, see nlp.pipeline) and the regex bypass uses the same
+confidence score and REGEX_BYPASS_THRESHOLD.
+"""
+import csv
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
 import streamlit as st
-import subprocess, json, re
-from datetime import datetime
-from typing import Optional, Dict, Tuple
+
+if __package__ in (None, ""):
+    # `streamlit run nlp/streamlit_app.py` only puts nlp/ on sys.path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nlp.cache import normalize_utterance, prompt_fingerprint
+from nlp.ollama_client import get_client
+from nlp.param_json import compile_param_json
+from nlp.pipeline import _learned_tier, _model_tier, _regex_tier, batch_concurrency, bypass_threshold
+from nlp.router import backend_health
+from nlp.schema import FIELDS
+from nlp.slot_model import get_slot_model
 
 st.set_page_config(page_title="Room NLU - Demo (Regex bypass)", layout="wide")
 
-# -------------------
-# Prompt builder
-# -------------------
-def build_prompt(utterance: str) -> str:
-    return f"""Task: Extract fields VERBATIM from the input text.
-Fields (lowercase): intent, room, building, date, start, end, booking_id.
-Rules:
-- COPY EXACT SUBSTRINGS from the text (do NOT normalize or paraphrase).
-- If explicit date/time exists (e.g., '11 Sept', '14:00'), PREFER it over relative words.
-- For 'X to Y' / 'X-Y' / 'X-Y' patterns, set X as "start" and Y as "end".
-- Only set "booking_id" if an exact token like BK-1234 appears in the text.
-- Omit any field that is absent.
-- OUTPUT ONE JSON OBJECT ONLY (must start with '{' and end with '}'). No other text.
-
-Text: Book SJT 315 tomorrow 4 to 6 pm
-JSON: {{"intent":"book","room":"SJT 315","date":"tomorrow","start":"4 pm","end":"6 pm"}}
-
-Text: Reserve TT 101 11 Sept 14:00 to 16:00
-JSON: {{"intent":"book","room":"TT 101","date":"11 Sept","start":"14:00","end":"16:00"}}
-
-Text: Cancel booking BK-2021
-JSON: {{"intent":"cancel","booking_id":"BK-2021"}}
-
-Text: Is LH-204 free next Friday 2pm to 3:30pm?
-JSON: {{"intent":"check_availability","room":"LH-204","date":"next Friday","start":"2 pm","end":"3:30 pm"}}
-
-Text: {utterance}
-JSON:
-"""
+STAGES = ("regex", "learned", "model", "compile")
+BULK_MAX_ROWS = 50000
+
 
 # -------------------
-# Ollama runner (subprocess)
+# One utterance through the tiers, with per-stage timings
 # -------------------
-def extract_first_json(text: str) -> Optional[str]:
-    # trim fenced codeblocks
-    if "```" in text:
-        text = text.replace("```json", "```").replace("```JSON", "```")
-        for part in text.split("```"):
-            if "{" in part:
-                text = part
-                break
-    start = text.find("{")
-    if start == -1:
-        return None
-    depth = 0
-    for i, ch in enumerate(text[start:], start=start):
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return text[start:i+1]
-    return None
-
-def kv_fallback(text: str) -> Dict[str,str]:
-    # parse "Intent: book" style lines
-    known = {"intent","room","building","date","start","end","booking_id"}
-    out = {}
-    for line in text.splitlines():
-        if ":" not in line:
-            continue
-        m = re.match(r"^\s*([A-Za-z_ ]+)\s*:\s*(.+?)\s*$", line.strip())
-        if not m: continue
-        key = m.group(1).strip().lower()
-        val = m.group(2).strip()
-        key = key.replace("booking id","booking_id")
-        if key in known and val:
-            out[key] = val
-    return out
-
-def run_ollama(utterance: str, model_name: str = "room-nlu") -> Tuple[Dict, str]:
+class Uncacheable(Exception):
+    """Carries a parse that must not be memoized (a degraded answer)."""
+
+    def __init__(self, parsed: dict):
+        super().__init__(parsed.get("degraded"))
+        self.parsed = parsed
+
+
+@st.cache_data(max_entries=100_000, show_spinner=False)
+def parse_row(utterance: str, model_name: str, threshold: float, force_model: bool,
+              timeout: float, fingerprint: str) -> dict:
     """
-    Returns (parsed_dict_or_empty, raw_output_text)
+    `fingerprint` is only part of the memo key (a prompt change re-parses).
+    Raises on model errors, and Uncacheable on degraded answers, so neither
+    is memoized.
     """
-    prompt = build_prompt(utterance)
+    timings = dict.fromkeys(STAGES, 0.0)
+    t0 = time.perf_counter()
+    answer, partial = _regex_tier(utterance, threshold, force_model)
+    timings["regex"] = time.perf_counter() - t0
+    regex_out = answer["result"] if answer is not None else partial[0]
+    if answer is None:
+        t0 = time.perf_counter()
+        answer = _learned_tier([utterance], [partial], force_model)[0]
+        timings["learned"] = time.perf_counter() - t0
+    if answer is None:
+        t0 = time.perf_counter()
+        # the pool below bounds concurrency, so skip the admission gate like bulk_parse
+        answer = _model_tier(utterance, model_name, partial, force_model,
+                             deadline=time.monotonic() + timeout, gated=False)
+        timings["model"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    param_json = compile_param_json(answer["result"])
+    timings["compile"] = time.perf_counter() - t0
+    parsed = {"regex": regex_out, "result": answer["result"], "tier": answer["tier"],
+              "confidence": answer["confidence"], "degraded": answer.get("degraded"),
+              "param_json": param_json, "timings": timings}
+    if parsed["degraded"]:
+        raise Uncacheable(parsed)
+    return parsed
+
+
+def parse_safe(utterance: str, settings: dict) -> dict:
     try:
-        res = subprocess.run(
-            ["ollama", "run", model_name],
-            input=prompt.encode("utf-8"),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            timeout=30
-        )
-    except FileNotFoundError:
-        raise RuntimeError("ollama not found on PATH. Install Ollama or put it on PATH.")
-    except subprocess.CalledProcessError as e:
-        raw = e.stdout.decode("utf-8","ignore") + "\n\nERR:\n" + e.stderr.decode("utf-8","ignore")
-        raise RuntimeError(f"ollama run failed:\n{raw}")
+        return parse_row(utterance, **settings)
+    except Uncacheable as e:
+        return e.parsed
     except Exception as e:
-        raise RuntimeError(f"Error running ollama: {e}")
-
-    raw = res.stdout.decode("utf-8", "ignore").strip()
-    # try JSON
-    blob = extract_first_json(raw)
-    if blob:
-        try:
-            parsed = json.loads(blob)
-            return parsed, raw
-        except Exception:
-            # fall through to kv fallback
-            pass
-    # kv fallback
-    kv = kv_fallback(raw)
-    return kv, raw
+        return {"error": f"{type(e).__name__}: {e}"}
 
-# -------------------
-# Regex parser (deterministic first-pass)
-# -------------------
-ROOM_RE = re.compile(r"\b([A-Z]{2,}-?\s?\d{2,3})\b")
-DATE_LONG_RE = re.compile(r"\b(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec))\b", re.I)
-DATE_SLASH_RE = re.compile(r"\b(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b")
-RELATIVE_DATE_RE = re.compile(r"\b(today|tomorrow|day after tomorrow|next\s+\w+)\b", re.I)
-TIME_RANGE_RE = re.compile(r"\b((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\s*(?:-|–|to)\s*((?:[01]?\d|2[0-3])(?::[0-5]\d)?\s?(?:am|pm)?)\b", re.I)
-BK_RE = re.compile(r"\b(BK-\d+)\b", re.I)
-
-def regex_parse(text: str) -> Dict[str,str]:
-    out = {}
-    lower = text.lower()
-    # intent keywords
-    if any(w in lower for w in ["book", "reserve", "schedule"]):
-        out["intent"] = "book"
-    elif any(w in lower for w in ["cancel", "delete"]):
-        out["intent"] = "cancel"
-    elif any(w in lower for w in ["available", "free", "vacant"]):
-        out["intent"] = "check_availability"
-
-    m = ROOM_RE.search(text)
-    if m:
-        out["room"] = m.group(1).strip()
-
-    m = DATE_LONG_RE.search(text) or DATE_SLASH_RE.search(text) or RELATIVE_DATE_RE.search(text)
-    if m:
-        out["date"] = m.group(1).strip()
-
-    m = TIME_RANGE_RE.search(text)
-    if m:
-        out["start"] = m.group(1).strip()
-        out["end"] = m.group(2).strip()
-
-    m = BK_RE.search(text)
-    if m:
-        out["booking_id"] = m.group(1).upper()
-
-    return out
 
-# -------------------
-# Sanitize / guardrails (explicit spans override; kill hallucinated booking ids)
-# -------------------
-def prefer_explicit(original: str, model_out: Dict[str,str]) -> Dict[str,str]:
-    out = dict(model_out) if model_out else {}
-    # booking id must literally appear
-    bk = BK_RE.search(original)
-    if bk:
-        out["booking_id"] = bk.group(1).upper()
-    else:
-        out.pop("booking_id", None)
-    # explicit date overrides
-    m = DATE_LONG_RE.search(original) or DATE_SLASH_RE.search(original)
-    if m:
-        out["date"] = m.group(1).strip()
-    # explicit time range overrides
-    m = TIME_RANGE_RE.search(original)
-    if m:
-        out["start"], out["end"] = m.group(1).strip(), m.group(2).strip()
-    # explicit room overrides
-    m = ROOM_RE.search(original)
-    if m:
-        out["room"] = m.group(1).strip()
-    else:
-        # if model suggested a room not literally in original, drop it
-        if "room" in out and out["room"] not in original:
-            out.pop("room", None)
-    return out
+def table_row(utterance: str, parsed: dict) -> dict:
+    row = {"utterance": utterance, "tier": parsed.get("tier"), "confidence": parsed.get("confidence")}
+    row.update({f: (parsed.get("result") or {}).get(f) for f in FIELDS})
+    total = 0.0
+    for stage, seconds in (parsed.get("timings") or {}).items():
+        row[f"{stage}_ms"] = round(seconds * 1000, 2)
+        total += seconds
+    row["total_ms"] = round(total * 1000, 2)
+    row["degraded"] = parsed.get("degraded")
+    row["error"] = parsed.get("error")
+    return row
+
 
 # -------------------
-# Compile/normalize to Param-JSON (simple)
+# Bulk upload
 # -------------------
-MONTHS = {m.lower(): i for i,m in enumerate(["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"], start=1)}
-
-def parse_time(tok: Optional[str]) -> Optional[str]:
-    if not tok: return None
-    tok = tok.strip().lower()
-    m = re.match(r"^(\d{1,2})(?::(\d{2}))?\s*(am|pm)?$", tok)
-    if not m:
-        return None
-    hh = int(m.group(1)); mm = int(m.group(2) or 0); ap = m.group(3)
-    if ap == "pm" and hh < 12: hh += 12
-    if ap == "am" and hh == 12: hh = 0
-    if 0 <= hh < 24 and 0 <= mm < 60:
-        return f"{hh:02d}:{mm:02d}"
-    return None
-
-def parse_date(tok: Optional[str], now: datetime) -> Optional[str]:
-    if not tok: return None
-    s = tok.strip().lower()
-    if s in ("today","tomorrow","day after tomorrow"):
-        delta = {"today":0,"tomorrow":1,"day after tomorrow":2}[s]
-        return (now.date() + timedelta(days=delta)).isoformat()
-    m = re.match(r"^(\d{1,2})\s*([a-z]{3,})$", s, re.I)
-    if m:
-        d = int(m.group(1)); mon = m.group(2)[:3].lower()
-        if mon in MONTHS:
-            year = now.year
+@st.cache_data(show_spinner=False)
+def load_upload(data: bytes, name: str) -> tuple[list[dict], list[str]]:
+    """Rows and column names of an uploaded CSV or JSONL (one object or string per line)."""
+    text = data.decode("utf-8-sig", errors="replace")
+    if name.lower().endswith((".jsonl", ".ndjson", ".json")):
+        rows = []
+        for line in text.splitlines():
             try:
-                return datetime(year, MONTHS[mon], d).date().isoformat()
-            except:
-                return None
-    m = re.match(r"^(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?$", s)
-    if m:
-        d = int(m.group(1)); mon = int(m.group(2)); year = int(m.group(3) or now.year)
-        try:
-            return datetime(year, mon, d).date().isoformat()
-        except:
-            return None
-    return None
-
-def compile_param_json(chosen: Dict[str,str], now: datetime) -> Dict:
-    room_id = None
-    if chosen.get("room"):
-        room_id = chosen["room"].strip().lower().replace(" ", "-")
-    date_iso = parse_date(chosen.get("date"), now) if chosen.get("date") else None
-    start_iso = parse_time(chosen.get("start")) if chosen.get("start") else None
-    end_iso = parse_time(chosen.get("end")) if chosen.get("end") else None
-
-    template_map = {"book":"book_v1","check_availability":"check_v1","cancel":"cancel_v1","modify":"modify_v1"}
-    template = template_map.get(chosen.get("intent","").lower(), "noop")
-
-    args = {
-        "room_id": room_id,
-        "date": date_iso,
-        "start": start_iso,
-        "end": end_iso,
-        "purpose": None,
-        "equip": [],
-        "capacity": None,
-        "recurrence": None
-    }
-    warnings = []
-    if template == "book_v1":
-        if not room_id: warnings.append("missing_room_id")
-        if not date_iso: warnings.append("missing_date")
-        if not start_iso or not end_iso: warnings.append("missing_time_range")
-        if start_iso and end_iso and start_iso >= end_iso: warnings.append("invalid_time_range")
-
-    return {"template": template, "args": args, "warnings": warnings}
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            rows.append(rec if isinstance(rec, dict) else {"utterance": rec})
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    columns = list(dict.fromkeys(k for r in rows[:1000] for k in r))
+    return rows[:BULK_MAX_ROWS], columns
+
+
+def run_bulk(utterances: list[str], settings: dict, workers: int) -> tuple[list[dict], float]:
+    """Parse concurrently (duplicates once) with a live progress bar; rows in input order."""
+    unique = list(dict.fromkeys(utterances))
+    results: dict[str, dict] = {}
+    bar = st.progress(0.0, text=f"0 / {len(unique)} unique utterances")
+    t0 = last = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(parse_safe, u, settings): u for u in unique}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            now = time.perf_counter()
+            if now - last > 0.2 or done == len(unique):
+                last = now
+                rate = done / max(now - t0, 1e-9)
+                bar.progress(done / len(unique),
+                             text=f"{done} / {len(unique)} unique utterances ({rate:.1f}/s)")
+    return [table_row(u, results[u]) for u in utterances], time.perf_counter() - t0
+
+
+def percentile(values: list[float], q: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))] if s else 0.0
+
+
+def summarize(rows: list[dict], wall: float) -> dict:
+    tiers: dict[str, int] = {}
+    for r in rows:
+        key = "error" if r["error"] else r["tier"]
+        tiers[key] = tiers.get(key, 0) + 1
+    stages = {}
+    for stage in (*STAGES, "total"):
+        values = [r[f"{stage}_ms"] for r in rows if r.get(f"{stage}_ms")]
+        if values:
+            stages[stage] = {"rows": len(values), "p50_ms": percentile(values, 0.5),
+                             "p95_ms": percentile(values, 0.95), "max_ms": max(values)}
+    return {"rows": len(rows), "wall_s": round(wall, 2), "rows_per_s": round(len(rows) / max(wall, 1e-9), 1),
+            "tiers": tiers, "degraded": sum(bool(r["degraded"]) for r in rows), "stages_ms": stages}
+
+
+def to_csv(rows: list[dict]) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
 
 # -------------------
 # Streamlit UI
@@ -263,70 +191,81 @@ This demo runs a local TinyLlama (Ollama) extractor **and** a deterministic rege
 Regex has priority (bypass) for explicit spans — useful when you want provable deterministic behavior.
 """)
 
-col1, col2 = st.columns([1,1])
-
-with col1:
-    utterance = st.text_area("Utterance", value="Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed", height=120)
+with st.sidebar:
     model_name = st.text_input("Model name (ollama)", value="room-nlu")
     use_regex_first = st.checkbox("Regex-first (bypass) (recommended)", value=True)
     force_model = st.checkbox("Always call model (ignore bypass)", value=False)
-    run = st.button("Parse")
-
-with col2:
-    st.write("Instructions")
+    threshold = st.slider("Bypass threshold (regex confidence)", 0.0, 6.0, min(bypass_threshold(), 6.0), 0.25,
+                          disabled=not use_regex_first)
+    timeout = st.number_input("Model timeout per utterance (s)", 1.0, 300.0, 30.0, 1.0)
     st.markdown("""
-    - Ensure `ollama` is installed and available on PATH.
+    - Ensure `ollama serve` is running (set `OLLAMA_HOST` if it is not on 127.0.0.1:11434).
     - If you created a custom model with `Modelfile`, use `room-nlu`. Otherwise use `tinyllama`.
-    - This demo shows: **Regex parse**, **Model parse**, **Sanitized/merged**, and **Compiled Param-JSON**.
-    - Use this to demo a deterministic bypass to stakeholders.
     """)
-
-if run:
-    now = datetime.now()
-    # 1) regex
-    regex_out = regex_parse(utterance)
-    # decide if regex is confident enough: at least intent+room+date or intent+room+start+end
-    conf = 0
-    for k in ("intent","room","date"): 
-        if k in regex_out: conf += 1
-    for k in ("start","end"):
-        if k in regex_out: conf += 1
-    regex_confident = conf >= 3
-
-    st.subheader("Regex parse (pre-parser)")
-    st.json(regex_out)
-
-    model_out = {}
-    raw_model_text = ""
-    if (use_regex_first and regex_confident and not force_model):
-        st.info("Regex is confident — skipping model call (bypass active).")
-    else:
-        st.info("Calling model (Ollama/TinyLlama)...")
-        try:
-            model_out, raw_model_text = run_ollama(utterance, model_name=model_name)
-            # st.subheader("Raw model text (debug)")
-            # st.code(raw_model_text[:2000] + ("..." if len(raw_model_text)>2000 else ""))
-            st.subheader("Model parsed output")
-            st.json(model_out)
-        except Exception as e:
-            st.error(f"Model call failed: {e}")
-            model_out = {}
-
-    # 3) merge: regex overrides model
-    merged = dict(model_out or {})
-    # overlay regex (regex wins)
-    for k,v in regex_out.items():
-        merged[k] = v
-
-    # 4) sanitize deterministic overrides
-    sanitized = prefer_explicit(utterance, merged)
-
-    st.subheader("Sanitized / Final selection (regex wins)")
-    st.json(sanitized)
-
-    # 5) compiled param-json
-    compiled = compile_param_json(sanitized, now)
-    st.subheader("Compiled Param-JSON (normalized)")
-    st.json(compiled)
-
-    # st.markdown("**Notes:** Regex bypass ensures explicit tokens in the user's text always win. Model is used to help fill gaps when regex can't find fields.")
+    backend = backend_health(get_client())
+    if backend is not None and not backend["healthy"]:
+        st.warning("No healthy Ollama replica.")
+    if get_slot_model() is not None:
+        st.caption("Learned tier: on (PARSE_LEARNED_MODEL)")
+
+settings = {
+    "model_name": model_name,
+    "threshold": threshold if use_regex_first else float("inf"),
+    "force_model": force_model,
+    "timeout": float(timeout),
+    "fingerprint": prompt_fingerprint(),
+}
+
+single, bulk = st.tabs(["Single utterance", "Bulk upload"])
+
+with single:
+    utterance = st.text_area("Utterance", value="Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed",
+                             height=120)
+    if st.button("Parse") and utterance.strip():
+        with st.spinner("Parsing..."):
+            parsed = parse_safe(normalize_utterance(utterance), settings)
+        if "error" in parsed:
+            st.error(f"Model call failed: {parsed['error']}")
+        else:
+            label = {"regex": "Regex is confident — model skipped (bypass active).",
+                     "learned": "Answered by the learned tier — model skipped."}
+            st.info(label.get(parsed["tier"], f"Answered by the {parsed['tier']} tier."))
+            if parsed["degraded"]:
+                st.warning(f"Model skipped ({parsed['degraded']}); regex answer only.")
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                st.subheader("Regex parse (pre-parser)")
+                st.json(parsed["regex"])
+                st.subheader("Sanitized / Final selection (regex wins)")
+                st.json(parsed["result"])
+            with col2:
+                st.subheader("Compiled Param-JSON (normalized)")
+                st.json(parsed["param_json"])
+                st.subheader("Stage latency (ms)")
+                st.json({k: round(v * 1000, 2) for k, v in parsed["timings"].items()})
+
+with bulk:
+    upload = st.file_uploader("Utterances (CSV with a header row, or JSONL)", type=["csv", "jsonl", "ndjson", "json"])
+    if upload is not None:
+        rows, columns = load_upload(upload.getvalue(), upload.name)
+        if not rows:
+            st.error("No rows found in the upload.")
+        else:
+            default = columns.index("utterance") if "utterance" in columns else 0
+            column = st.selectbox("Utterance column", columns, index=default)
+            workers = st.slider("Concurrent requests", 1, 32, batch_concurrency(),
+                                help="Match the Ollama server's OLLAMA_NUM_PARALLEL.")
+            utterances = [normalize_utterance(str(r.get(column) or "")) for r in rows]
+            utterances = [u for u in utterances if u]
+            st.caption(f"{len(utterances)} utterances ({len(set(utterances))} unique)")
+            if st.button("Parse all"):
+                out, wall = run_bulk(utterances, settings, workers)
+                st.session_state["bulk"] = (upload.name, out, summarize(out, wall))
+        # results survive the reruns triggered by the download button
+        if st.session_state.get("bulk", (None,))[0] == upload.name:
+            _, out, summary = st.session_state["bulk"]
+            st.subheader("Summary")
+            st.json(summary)
+            st.caption("Repeated utterances show the stage timings of their first (memoized) parse.")
+            st.dataframe(out, use_container_width=True)
+            st.download_button("Download CSV", to_csv(out), file_name="parsed.csv", mime="text/csv")
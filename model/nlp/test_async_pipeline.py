@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import pytest
+
+from bench.fake_ollama import serve, server_url
+from nlp.async_client import async_client_for
+from nlp.async_pipeline import AsyncParser
+
+
+@pytest.fixture
+def server():
+    srv = serve(latency=0.3)
+    yield srv
+    srv.shutdown()
+
+
+def test_timed_out_flight_frees_the_gate_and_skips_the_call(server):
+    async def main():
+        parser = AsyncParser(async_client_for(server_url(server)))
+        parser.gate.slots = 1
+        async with parser.gate.admit():  # every slot busy: the flights queue
+            outs = await asyncio.gather(*(
+                parser.parse(f"book something {i}", deadline=time.monotonic() + 0.05) for i in range(10)))
+            assert [o["degraded"] for o in outs] == ["deadline"] * 10
+            await asyncio.sleep(0)  # let the cancelled flights unwind
+            assert parser.gate.snapshot()["queued"] == 0
+        await asyncio.sleep(0.1)
+        assert parser.gate.snapshot()["busy"] == 0
+        assert len(parser.flights) == 0
+        assert parser.flights.stats["abandoned"] == 10
+        await parser.close()
+
+    asyncio.run(main())
+    assert server.calls == 0
+
+
+def test_followers_extend_the_flight_deadline(server):
+    async def main():
+        parser = AsyncParser(async_client_for(server_url(server)))
+        outs = await asyncio.gather(*(
+            parser.parse("book nothing yet", deadline=time.monotonic() + d) for d in (0.1, 2.0)))
+        await parser.close()
+        return outs
+
+    first, second = asyncio.run(main())
+    assert first["degraded"] == "deadline"
+    assert second["tier"] == "model" and not second.get("degraded")
+    assert server.calls == 1
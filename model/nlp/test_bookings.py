@@ -0,0 +1,93 @@
+import pytest
+
+from nlp.bookings import (MAX_BOOKING_ID, BookingConflict, BookingError, BookingIndex, execute,
+                          parse_booking_id)
+
+DAY = "2025-09-12"
+
+
+@pytest.fixture
+def index():
+    ix = BookingIndex(["lh-204", "sjt-315"])
+    ix.book("lh-204", DAY, "09:00", "10:00")   # BK-0001
+    ix.book("lh-204", DAY, "12:00", "13:30")   # BK-0002
+    ix.book("lh-204", DAY, "15:00", "16:00")   # BK-0003
+    return ix
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    ("08:00", "09:00", []),                    # ends as BK-0001 starts
+    ("10:00", "12:00", []),                    # the gap, touching both sides
+    ("08:00", "09:01", ["BK-0001"]),
+    ("09:59", "12:01", ["BK-0001", "BK-0002"]),
+    ("13:00", "15:30", ["BK-0002", "BK-0003"]),
+    ("00:00", "24:00", ["BK-0001", "BK-0002", "BK-0003"]),
+    ("16:00", "24:00", []),
+])
+def test_conflicts_bisect_on_end(index, start, end, expected):
+    assert index.conflicts("lh-204", DAY, start, end) == expected
+    assert index.is_free("lh-204", DAY, start, end) == (not expected)
+
+
+def test_book_conflict_leaves_index_unchanged(index):
+    with pytest.raises(BookingConflict) as e:
+        index.book("lh-204", DAY, "09:30", "12:30")
+    assert e.value.conflicts == ["BK-0001", "BK-0002"]
+    assert len(index) == 3
+    assert [b["booking_id"] for b in index.bookings("lh-204", DAY)] == ["BK-0001", "BK-0002", "BK-0003"]
+
+
+def test_free_rooms(index):
+    assert index.free_rooms(DAY, "09:30", "10:30") == ["sjt-315"]
+    assert index.free_rooms(DAY, "10:00", "12:00") == ["lh-204", "sjt-315"]
+    assert index.free_rooms("2025-09-13", "09:00", "10:00") == ["lh-204", "sjt-315"]
+
+
+def test_reschedule_moves_booking(index):
+    moved = index.reschedule("BK-0002", start="10:00", end="11:00", room="sjt-315")
+    assert moved == {"booking_id": "BK-0002", "room_id": "sjt-315", "date": DAY,
+                     "start": "10:00", "end": "11:00"}
+    assert index.is_free("lh-204", DAY, "12:00", "13:30")
+    assert index.conflicts("sjt-315", DAY, "10:30", "12:00") == ["BK-0002"]
+
+
+def test_reschedule_conflict_rolls_back(index):
+    before = index.bookings("lh-204", DAY)
+    with pytest.raises(BookingConflict):
+        index.reschedule("BK-0002", start="14:30", end="15:30")
+    assert index.bookings("lh-204", DAY) == before
+    assert index.get("BK-0002")["start"] == "12:00"
+
+
+def test_cancel(index):
+    assert index.cancel("BK-0001")["start"] == "09:00"
+    assert index.is_free("lh-204", DAY, "09:00", "10:00")
+    with pytest.raises(BookingError):
+        index.cancel("BK-0001")
+
+
+def test_bulk_load_skips_overlaps():
+    ix = BookingIndex()
+    skipped = ix.bulk_load([("r", DAY, "10:00", "11:00"), ("r", DAY, "09:00", "10:00"),
+                            ("r", DAY, "10:30", "12:00"), ("r", DAY, "11:00", "12:00", "BK-0042")])
+    assert skipped == 1
+    assert [b["booking_id"] for b in ix.bookings("r", DAY)] == ["BK-0002", "BK-0001", "BK-0042"]
+    assert ix.book("r", DAY, "13:00", "14:00") == "BK-0043"
+
+
+def test_booking_id_range():
+    assert parse_booking_id("bk-0007") == 7
+    with pytest.raises(BookingError):
+        parse_booking_id(f"BK-{MAX_BOOKING_ID + 1}")
+    ix = BookingIndex()
+    with pytest.raises(BookingError):
+        ix.bulk_load([("r", DAY, "10:00", "11:00", MAX_BOOKING_ID + 1)])
+    assert len(ix) == 0 and ix.bookings("r", DAY) == []
+
+
+def test_execute_uses_an_empty_index():
+    ix = BookingIndex()
+    out = execute({"template": "book_v1",
+                   "args": {"room_id": "r", "date": DAY, "start": "10:00", "end": "11:00"}}, ix)
+    assert out == {"ok": True, "booking_id": "BK-0001"}
+    assert len(ix) == 1
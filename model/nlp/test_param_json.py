@@ -0,0 +1,32 @@
+import pytest
+
+from nlp.normalize import normalize_range
+from nlp.param_json import compile_many, compile_param_json
+from nlp.regex_parser import regex_parse
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    ("4", "6 pm", ("16:00", "18:00")),
+    ("10", "11am", ("10:00", "11:00")),
+    ("11", "1 pm", ("11:00", "13:00")),
+    ("10", "11pm", ("22:00", "23:00")),
+    ("9 am", "5 pm", ("09:00", "17:00")),
+    ("14:00", "6pm", ("14:00", "18:00")),
+    ("4", "6", ("04:00", "06:00")),
+    ("noon", "2 pm", ("12:00", "14:00")),
+    (None, "6 pm", (None, "18:00")),
+])
+def test_normalize_range(start, end, expected):
+    assert normalize_range(start, end) == expected
+
+
+@pytest.mark.parametrize("utterance, start, end", [
+    ("book SJT 315 tomorrow 4 to 6 pm", "16:00", "18:00"),
+    ("book SJT 315 tomorrow 10 to 11am", "10:00", "11:00"),
+    ("book SJT 315 tomorrow 11 to 1 pm", "11:00", "13:00"),
+])
+def test_compile_borrows_end_meridiem(utterance, start, end):
+    fields = regex_parse(utterance)
+    for compiled in (compile_param_json(fields), compile_many([fields])[0]):
+        assert (compiled["args"]["start"], compiled["args"]["end"]) == (start, end)
+        assert "invalid_time_range" not in compiled["warnings"]
@@ -0,0 +1,37 @@
+import pytest
+
+from nlp.pipeline import _regex_tier, bypass_threshold, merge
+from nlp.regex_parser import confidence, extract_spans, regex_parse
+
+
+@pytest.mark.parametrize("utterance, intent", [
+    ("Cancel booking BK-2021", "cancel"),
+    ("book BK-12", None),
+    ("move BK-12 to friday", "modify"),
+    ("move my booking to friday", "modify"),
+    ("please move the reservation to 3 pm", "modify"),
+    ("move the meeting to room B", None),
+    ("move on", None),
+    ("book a room and then move on", "book"),
+    ("is SJT 315 free tomorrow", "check_availability"),
+])
+def test_intent(utterance, intent):
+    assert regex_parse(utterance).get("intent") == intent
+
+
+def test_force_model_keeps_confident_regex_intent():
+    utterance = "Cancel booking BK-2021"
+    answer, partial = _regex_tier(utterance, bypass_threshold(), force_model=True)
+    assert answer is None  # forced past the bypass
+    regex_out, score, spans = partial
+    assert score >= bypass_threshold()
+    merged = merge(utterance, regex_out, {"intent": "book", "booking_id": "BK-2021"}, spans)
+    assert merged == {"intent": "cancel", "booking_id": "BK-2021"}
+
+
+def test_model_intent_wins_below_threshold():
+    utterance = "book something for the team"
+    regex_out = regex_parse(utterance)
+    assert regex_out == {"intent": "book"} and confidence(regex_out) < bypass_threshold()
+    merged = merge(utterance, regex_out, {"intent": "check_availability"}, extract_spans(utterance))
+    assert merged["intent"] == "check_availability"
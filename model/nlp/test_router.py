@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from bench.fake_ollama import serve, server_url
+from nlp.admission import AsyncModelGate, ModelGate
+from nlp.ollama_client import OllamaTimeout, client_for
+from nlp.router import Replica, ReplicaRouter, backend_capacity
+
+
+@pytest.fixture
+def servers():
+    fast, hung = serve(), serve(latency=1.0)
+    yield fast, hung
+    fast.shutdown()
+    hung.shutdown()
+
+
+def router_for(*servers, **kwargs) -> ReplicaRouter:
+    replicas = [Replica(client_for(server_url(s), retries=0, read_timeout=0.2)) for s in servers]
+    return ReplicaRouter(replicas, probe_interval=0, **kwargs)
+
+
+def test_hanging_replica_is_ejected(servers):
+    fast, hung = servers
+    router = router_for(hung, fail_threshold=2, hang_seconds=0.1)
+    for _ in range(2):
+        with pytest.raises(OllamaTimeout):
+            router.generate("p", "room-nlu")
+    assert not router.replicas[0].healthy
+    assert router.replicas[0].down_reason == "errors"
+
+
+def test_deadline_cut_timeout_does_not_count(servers):
+    fast, hung = servers
+    router = router_for(hung, fail_threshold=1, hang_seconds=0.5)
+    with pytest.raises(OllamaTimeout):
+        router.generate("p", "room-nlu", timeout=0.1)
+    assert router.replicas[0].healthy
+
+
+def test_gate_slots_follow_healthy_replicas(servers):
+    router = router_for(*servers)
+    router.replicas[1].weight = 2.0
+    gate, agate = (cls(4, scale=backend_capacity(router)) for cls in (ModelGate, AsyncModelGate))
+    assert gate.slots == agate.slots == 12
+    router.replicas[1].healthy = False
+    assert gate.slots == agate.slots == 4
+    router.replicas[0].healthy = False  # everything down: the router still tries them all
+    assert gate.slots == 12
+    assert ModelGate(4, scale=backend_capacity(client_for("http://127.0.0.1:1"))).slots == 4
+
+
+def test_async_gate_admits_into_new_capacity():
+    capacity = [1.0]
+    gate = AsyncModelGate(1, scale=lambda: capacity[0])
+
+    async def main():
+        admitted = []
+
+        async def worker(i):
+            async with gate.admit():
+                admitted.append(i)
+                await asyncio.sleep(0.05)
+
+        async with gate.admit():
+            tasks = [asyncio.ensure_future(worker(i)) for i in range(2)]
+            await asyncio.sleep(0)
+            assert gate.snapshot()["queued"] == 2
+            capacity[0] = 3.0
+        await asyncio.sleep(0.01)
+        assert sorted(admitted) == [0, 1]  # both run together once the slot is freed
+        await asyncio.gather(*tasks)
+        assert gate.snapshot()["busy"] == 0
+
+    asyncio.run(main())
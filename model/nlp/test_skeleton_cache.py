@@ -0,0 +1,61 @@
+import re
+
+from nlp import skeleton_cache
+from nlp.skeleton_cache import SkeletonCache, fill, skeletonize, to_template
+
+RESERVE = "Reserve SJT 315 11 Sept 14:00 to 16:00 projector needed"
+RESERVE_OTHER = "Reserve TT 101 3 Oct 9:00 to 10:00 projector needed"
+ANSWER = {"intent": "book", "room": "SJT 315", "date": "11 Sept", "start": "14:00", "end": "16:00",
+          "equipment": "projector", "purpose": None}
+
+
+def test_same_shape_same_skeleton():
+    a, b = skeletonize(RESERVE), skeletonize(RESERVE_OTHER)
+    assert a.text == b.text == "Reserve <ROOM1> <DATE1> <TIME1> to <TIME2> projector needed"
+    assert a.values == {"<ROOM1>": "SJT 315", "<DATE1>": "11 Sept", "<TIME1>": "14:00", "<TIME2>": "16:00"}
+    assert skeletonize("hello there") is None
+
+
+def test_template_round_trip():
+    template = to_template(ANSWER, skeletonize(RESERVE))
+    assert template["room"] == "<ROOM1>" and template["end"] == "<TIME2>"
+    assert template["equipment"] == "projector"  # literal text stays
+    assert fill(template, skeletonize(RESERVE)) == ANSWER
+    assert fill(template, skeletonize(RESERVE_OTHER)) == {
+        **ANSWER, "room": "TT 101", "date": "3 Oct", "start": "9:00", "end": "10:00"}
+
+
+def test_uncacheable_values():
+    sk = skeletonize(RESERVE)
+    assert to_template({"room": "SJT"}, sk) is None  # part of a span
+    assert to_template({"date": "2025-09-11"}, sk) is None  # derived from a span
+    assert to_template({"start": "afternoon"}, sk) == {"start": "afternoon"}  # inferred from wording
+
+
+def test_overlap_earlier_span_wins():
+    # ROOM_RE takes "TT 11" before DATE_LONG_RE's "11 Sept" can
+    sk = skeletonize("book TT 11 Sept")
+    assert sk.text == "book <ROOM1> Sept"
+    assert sk.values == {"<ROOM1>": "TT 11"}
+
+
+def test_overlap_same_start_longer_wins(monkeypatch):
+    monkeypatch.setattr(skeleton_cache, "SLOT_PATTERNS",
+                        (("A", re.compile(r"(ab)")), ("B", re.compile(r"(abc)"))))
+    assert skeletonize("x abc y ab") == ("x <B1> y <A1>", {"<B1>": "abc", "<A1>": "ab"})
+
+
+def test_cache_hit_refills_and_lru_evicts():
+    cache = SkeletonCache(max_entries=2, ttl=0)
+    sk, other = skeletonize(RESERVE), skeletonize(RESERVE_OTHER)
+    assert cache.get("k1", sk) is None
+    assert cache.put("k1", sk, ANSWER)
+    assert cache.get("k1", other)["room"] == "TT 101"
+    assert not cache.put("k2", sk, {"room": "SJT"})
+    cache.put("k2", sk, ANSWER)
+    cache.get("k1", sk)  # k1 is now the most recent
+    cache.put("k3", sk, ANSWER)
+    assert cache.get("k2", sk) is None and cache.get("k1", sk) is not None
+    snap = cache.snapshot()
+    assert (snap["size"], snap["evictions"], snap["uncacheable"]) == (2, 1, 1)
+    assert snap["top"][0]["hits"] == 3 and snap["top"][0]["misses"] == 2
@@ -0,0 +1,200 @@
+"""
+Model warm-up and keep-alive for the API servers.
+
+Without it the first /parse after a restart, or after Ollama unloaded the
+model, pays the whole weight load. `Warmup` runs on a background thread at
+startup: every model in WARMUP_MODELS gets one real prompt with
+num_predict=1 on every backend host, which loads the weights and leaves the
+static prompt prefix in the server's cache. /healthz reports "warming"
+(503) until all of them answered, so a load balancer holds traffic back
+until then. A host that is not up yet is retried every WARMUP_RETRY seconds.
+
+The client's keep_alive (OLLAMA_KEEP_ALIVE, default 30m) tells Ollama how
+long to hold the model after each call. With WARMUP_REFRESH set, a load-only
+request (empty prompt) is sent that often as well, so the model stays
+resident through quiet periods longer than the keep-alive.
+
+Startup timings are kept on the `Warmup` object for /healthz and exported
+as nlu_startup_seconds: import (process start to app constructed), warmup
+(time spent loading), ready (process start to ready) and first_request
+(latency of the first /parse).
+
+Configuration (environment, all optional):
+    WARMUP            1         (0: ready at once, no preload)
+    WARMUP_MODELS     room-nlu  (comma-separated)
+    WARMUP_RETRY      5         (seconds between attempts)
+    WARMUP_REFRESH    0         (seconds; 0 leaves it to keep_alive)
+    WARMUP_TIMEOUT    120       (seconds for one load)
+"""
+import os
+import threading
+import time
+
+from .metrics import MODEL_LOAD_SECONDS, STARTUP_SECONDS
+from .ollama_client import OllamaClient, OllamaError, client_for
+from .prompt import build_prompt
+
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+
+
+def _process_started() -> float:
+    """perf_counter() value at process start (from /proc), else now."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.perf_counter() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter()
+
+
+PROCESS_STARTED = _process_started()
+
+# any utterance will do; the point is the template prefix in front of it
+WARMUP_UTTERANCE = "Book SJT 315 tomorrow 10:00 to 11:00"
+
+
+def backend_clients(client) -> list[OllamaClient]:
+    """One sync client per backend host (the async ones cannot be used from a thread)."""
+    replicas = getattr(client, "replicas", None)
+    if replicas is not None:
+        return [r.probe_client for r in replicas]
+    if isinstance(client, OllamaClient):
+        return [client]
+    return [client_for(client.host, pool_size=1, retries=0)]
+
+
+class Warmup:
+    def __init__(self, client, models: list[str], retry: float = 5.0, refresh: float = 0.0,
+                 timeout: float = 120.0, enabled: bool = True, started: float | None = None,
+                 imported: float | None = None):
+        self.clients = backend_clients(client)
+        self.models = models
+        self.retry = retry
+        self.refresh = refresh
+        self.timeout = timeout
+        self.enabled = enabled
+        self.started = PROCESS_STARTED if started is None else started
+        self.state = STARTING
+        self.attempts = 0
+        self.last_error: str | None = None
+        self.loads: dict[str, dict] = {}  # "model@host" -> seconds, load_seconds
+        self.timings: dict[str, float | None] = {
+            # `imported`: when the app was constructed, if that was before the warm-up
+            "import_seconds": round((imported or time.perf_counter()) - self.started, 4),
+            "warmup_seconds": None, "ready_after_seconds": None,
+            "first_request_seconds": None,
+        }
+        self.first_request_after_ready: bool | None = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        STARTUP_SECONDS.set(self.timings["import_seconds"], phase="import")
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self) -> "Warmup":
+        """Warm up on a daemon thread; returns at once."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _mark_ready(self, warmup_seconds: float | None) -> None:
+        ready_after = round(time.perf_counter() - self.started, 4)
+        with self._lock:
+            self.state = READY
+            self.timings["warmup_seconds"] = warmup_seconds
+            self.timings["ready_after_seconds"] = ready_after
+        if warmup_seconds is not None:
+            STARTUP_SECONDS.set(warmup_seconds, phase="warmup")
+        STARTUP_SECONDS.set(ready_after, phase="ready")
+        self._ready.set()
+
+    def _run(self) -> None:
+        if not self.enabled or not self.models:
+            self._mark_ready(None)
+            return
+        self.state = WARMING
+        t0 = time.perf_counter()
+        pending = [(m, c) for m in self.models for c in self.clients]
+        while pending and not self._stop.is_set():
+            self.attempts += 1
+            pending = [(m, c) for m, c in pending if not self.warm_one(m, c)]
+            if pending:
+                self._stop.wait(self.retry)
+        if self._stop.is_set():
+            return
+        self._mark_ready(round(time.perf_counter() - t0, 4))
+        if self.refresh > 0:
+            self._refresh_loop()
+
+    def warm_one(self, model: str, client: OllamaClient) -> bool:
+        """Load `model` on `client`'s host and prime the prompt prefix; False on failure."""
+        t0 = time.perf_counter()
+        try:
+            res = client.generate(build_prompt(WARMUP_UTTERANCE), model,
+                                  options={"num_predict": 1}, timeout=self.timeout)
+        except (OllamaError, ValueError) as e:
+            self.last_error = f"{model}@{client.host}: {e}"
+            return False
+        seconds = time.perf_counter() - t0
+        load = res.get("load_duration", 0) / 1e9
+        with self._lock:
+            self.loads[f"{model}@{client.host}"] = {"seconds": round(seconds, 4),
+                                                    "load_seconds": round(load, 4)}
+        MODEL_LOAD_SECONDS.set(load, model=model, host=client.host)
+        return True
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh):
+            for model in self.models:
+                for client in self.clients:
+                    try:
+                        # empty prompt: Ollama (re)loads the model and renews keep_alive
+                        client.generate("", model, timeout=self.timeout)
+                    except (OllamaError, ValueError) as e:
+                        self.last_error = f"refresh {model}@{client.host}: {e}"
+
+    def observe_request(self, seconds: float) -> None:
+        """Record the latency of the first /parse this process served."""
+        with self._lock:
+            if self.timings["first_request_seconds"] is not None:
+                return
+            self.timings["first_request_seconds"] = round(seconds, 4)
+            self.first_request_after_ready = self.ready
+        STARTUP_SECONDS.set(seconds, phase="first_request")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state, "models": list(self.models), "attempts": self.attempts,
+                "last_error": self.last_error, "loads": dict(self.loads),
+                **self.timings, "first_request_after_ready": self.first_request_after_ready,
+            }
+
+
+def warmup_from_env(client, started: float | None = None, imported: float | None = None) -> Warmup:
+    env = os.environ
+    models = [m.strip() for m in env.get("WARMUP_MODELS", "room-nlu").split(",") if m.strip()]
+    return Warmup(
+        client, models,
+        retry=float(env.get("WARMUP_RETRY", "5")),
+        refresh=float(env.get("WARMUP_REFRESH", "0")),
+        timeout=float(env.get("WARMUP_TIMEOUT", "120")),
+        enabled=env.get("WARMUP", "1") != "0",
+        started=started,
+        imported=imported,
+    )